@@ -6,7 +6,7 @@
 提供股票分析数据的RESTful API接口
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import logging
 import sys
@@ -23,6 +23,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.analysis.market_analyzer import MarketAnalyzer
 from src.data.data_fetcher import StockDataFetcher
+from src.data.market_snapshot import current_snapshot
+from src.monitoring.metrics import get_request_metrics
 from config.config import LOG_CONFIG
 
 app = Flask(__name__)
@@ -89,6 +91,11 @@ def apply_momentum_gate(stock: dict) -> dict:
     return stock
 
 
+def _round_price(value):
+    """价格保留两位小数, 缺失时为None"""
+    return round(value, 2) if value else None
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -99,6 +106,13 @@ def health_check():
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """上游请求指标 (Prometheus 文本格式): 按主机的请求/重试/错误/流量计数和延迟分布"""
+    return Response(get_request_metrics().render_prometheus(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/api/stocks/recommend', methods=['GET'])
 def get_recommended_stocks():
     """
@@ -193,8 +207,10 @@ def get_stock_detail(stock_code):
     try:
         logger.info(f"收到股票详情请求: {stock_code}")
 
-        fetcher = StockDataFetcher()
-        stock_data = fetcher.get_stock_data(stock_code)
+        # 只请求这一只股票 (已有未过期的全市场快照时直接读取, 不为单只股票触发全市场扫描)
+        code = stock_code[-6:]
+        snapshot = current_snapshot()
+        stock_data = StockDataFetcher().get_stock_quote_data(code)
 
         if not stock_data:
             return jsonify({
@@ -203,22 +219,27 @@ def get_stock_detail(stock_code):
                 'data': None
             }), 404
 
-        # 格式化股票详情
+        # 格式化股票详情 (缺失字段为None时按0处理)
+        price = stock_data.get('price') or 0
+        previous_close = stock_data.get('prev_close') or 0
         detail = {
             'code': stock_data.get('code', ''),
             'name': stock_data.get('name', ''),
-            'price': round(stock_data.get('price', 0), 2),
-            'changePct': round(stock_data.get('change_pct', 0), 2),
-            'changeAmount': round(stock_data.get('change_amount', 0), 2),
-            'volume': stock_data.get('volume', 0),
-            'turnover': stock_data.get('turnover', 0),
-            'turnoverRate': round(stock_data.get('turnover_rate', 0), 2),
-            'peRatio': round(stock_data.get('pe_ratio', 0), 2),
-            'pbRatio': round(stock_data.get('pb_ratio', 0), 2),
-            'high': round(stock_data.get('high', 0), 2),
-            'low': round(stock_data.get('low', 0), 2),
-            'open': round(stock_data.get('open', 0), 2),
-            'previousClose': round(stock_data.get('previous_close', 0), 2),
+            'price': round(price, 2),
+            'changePct': round(stock_data.get('change_pct') or 0, 2),
+            'changeAmount': round(price - previous_close if previous_close else 0, 2),
+            'volume': stock_data.get('volume') or 0,
+            'turnover': stock_data.get('turnover') or 0,
+            'turnoverRate': round(stock_data.get('turnover_rate') or 0, 2),
+            'peRatio': round(stock_data.get('pe_ratio') or 0, 2),
+            'pbRatio': round(stock_data.get('pb_ratio') or 0, 2),
+            # 开盘前或停牌时行情中没有开盘价和最高最低价, 返回None而不是0
+            'high': _round_price(stock_data.get('high')),
+            'low': _round_price(stock_data.get('low')),
+            'open': _round_price(stock_data.get('open')),
+            'previousClose': round(previous_close, 2),
+            'snapshotTime': (snapshot.taken_at.isoformat(timespec='seconds')
+                             if snapshot is not None and code in snapshot else None),
         }
 
         return jsonify({
@@ -464,6 +485,7 @@ if __name__ == '__main__':
     print("  - GET  /api/stocks/detail/:code 获取股票详情")
     print("  - GET  /api/market/overview     获取市场概览")
     print("  - GET  /api/analysis/history    获取历史分析")
+    print("  - GET  /api/metrics             上游请求指标(Prometheus)")
     print("=" * 60)
 
     # 开发环境使用debug模式,生产环境请关闭
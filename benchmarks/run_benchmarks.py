@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段性能基准
+
+对本地替身服务器 (stub_server) 分别测量盘后分析流水线的各个阶段:
+行情获取 (AsyncStockDataFetcher.get_quote_table)、行情解析、K线解析、动量计算、StockFilter.select_top_stocks、
+报告渲染(Markdown + 邮件HTML)、分析结果JSON持久化。
+
+每次运行的结果追加到 benchmarks/results/history.jsonl (一行一次运行)。
+与同一台机器最近几次运行的中位数相比, 任一阶段变慢超过阈值即视为性能回退, 进程以状态码1退出。
+
+用法:
+    python -m benchmarks.run_benchmarks                         # 300/1000/5000只
+    python -m benchmarks.run_benchmarks --sizes 300 --repeat 5
+    python -m benchmarks.run_benchmarks --no-save               # 只比较, 不写入历史
+"""
+
+import os
+import sys
+import json
+import time
+import copy
+import asyncio
+import logging
+import argparse
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List
+
+# 添加项目根路径
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.stub_server import start_stub_server, synthetic_codes, host_map
+from config.config import DATA_CONFIG, STOCK_FILTER_CONFIG
+from src.data.http_transport import AsyncHttpTransport, FakeTransport
+from src.data.async_data_fetcher import AsyncStockDataFetcher
+from src.data.history_cache import HistoryCache
+from src.data.tencent_parser import parse_quote_records, parse_kline_payload, kline_url
+from src.data.universe import to_symbols
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [300, 1000, 5000]
+DEFAULT_HISTORY = os.path.join(ROOT_DIR, 'benchmarks', 'results', 'history.jsonl')
+STAGES = ['fetch', 'quote_parse', 'kline_parse', 'momentum', 'select_top_stocks', 'report', 'persist']
+
+KLINE_BARS = 60  # 与获取器首次请求的K线数量一致 (30天 * 2)
+
+
+def _measure(func: Callable, repeat: int, setup: Callable = None) -> Dict:
+    """重复执行并返回耗时统计 (setup 的耗时不计入)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        result = func(arg) if setup else func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'runs': len(timings),
+        'result': result,
+    }
+
+
+async def _fetch_quote_table(base_url: str, codes: List[str], concurrency: int):
+    """通过 AsyncStockDataFetcher.get_quote_table 获取全部行情 (批量请求、并发窗口和表格解析都走生产路径)"""
+    fetcher = AsyncStockDataFetcher(max_concurrent=concurrency, history_cache=HistoryCache(),
+                                    transport=AsyncHttpTransport(host_map=host_map(base_url)))
+    async with fetcher.transport.create_session(limit=concurrency, limit_per_host=concurrency) as session:
+        return await fetcher.get_quote_table(session, codes, include_fundamental=True, use_snapshot=False)
+
+
+async def _download_bodies(base_url: str, codes: List[str], concurrency: int):
+    """下载全部行情批次和K线的原始响应 (解析阶段的输入, 不计时), 返回 (行情响应列表, {symbol: K线响应})"""
+    transport = AsyncHttpTransport(host_map=host_map(base_url))
+    batch_size = DATA_CONFIG.get('quote_batch_size', 100)
+    symbols = to_symbols(codes)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get(session, url):
+        async with semaphore:
+            return await transport.get_text(session, url, timeout=30)
+
+    async with transport.create_session(limit=concurrency, limit_per_host=concurrency) as session:
+        quote_urls = [f"https://qt.gtimg.cn/q={','.join(symbols[i:i + batch_size])}"
+                      for i in range(0, len(symbols), batch_size)]
+        quotes = await asyncio.gather(*(get(session, url) for url in quote_urls))
+        klines = await asyncio.gather(*(get(session, kline_url(symbol, KLINE_BARS)) for symbol in symbols))
+
+    return [q for q in quotes if q], dict(zip(symbols, klines))
+
+
+def _analysis_result(selected: List[Dict], total: int, analyzer) -> Dict:
+    market_overview = {'rising_ratio': 55.0, 'avg_change_pct': 0.4, 'total_stocks': total}
+    return {
+        'analysis_date': '2025-11-14',
+        'analysis_time': '16:00:00',
+        'market_overview': market_overview,
+        'selected_stocks': selected,
+        'total_analyzed': total,
+        'selection_criteria': STOCK_FILTER_CONFIG,
+        'summary': analyzer._generate_analysis_summary(selected, market_overview),
+    }
+
+
+def run_size(size: int, base_url: str, repeat: int, concurrency: int) -> Dict[str, Dict]:
+    """对指定股票数量测量所有阶段, 返回 {阶段: 耗时统计}"""
+    from src.data.data_fetcher import StockDataFetcher
+    from src.analysis.stock_filter import StockFilter
+    from src.analysis.market_analyzer import MarketAnalyzer
+    from src.notification.email_sender import EmailSender
+
+    codes = synthetic_codes(size)
+    results = {}
+
+    # 1. 行情获取 (先下载解析阶段用的原始响应, 同时预热替身服务器的数据生成缓存, 不计入)
+    quote_bodies, kline_bodies = asyncio.run(_download_bodies(base_url, codes, concurrency))
+    fetch = _measure(lambda: asyncio.run(_fetch_quote_table(base_url, codes, concurrency)), repeat)
+    fetch.pop('result')
+    results['fetch'] = fetch
+
+    # 2. 行情解析
+    def parse_quotes():
+        records = {}
+        for body in quote_bodies:
+            records.update(parse_quote_records(body, include_fundamental=True))
+        return records
+
+    quote_stage = _measure(parse_quotes, repeat)
+    records = quote_stage.pop('result')
+    results['quote_parse'] = quote_stage
+
+    # 3. K线解析
+    kline_stage = _measure(
+        lambda: {symbol: parse_kline_payload(body, symbol) for symbol, body in kline_bodies.items() if body},
+        repeat)
+    frames = kline_stage.pop('result')
+    results['kline_parse'] = kline_stage
+
+    # 4. 动量计算
+    fetcher = StockDataFetcher(history_cache=HistoryCache(), transport=FakeTransport({}))
+    momentum_stage = _measure(
+        lambda: {symbol[2:]: fetcher.calculate_momentum(frame, days=20) for symbol, frame in frames.items()},
+        repeat)
+    momentum = momentum_stage.pop('result')
+    results['momentum'] = momentum_stage
+
+    stocks = []
+    for code in codes:
+        record = records.get(code)
+        if record:
+            stocks.append(dict(record, industry='未知行业', momentum_20d=momentum.get(code, 0)))
+
+    # 5. 筛选 (select_top_stocks 会修改输入字典, 每轮使用新的副本)
+    stock_filter = StockFilter()
+    select_stage = _measure(stock_filter.select_top_stocks, repeat, setup=lambda: copy.deepcopy(stocks))
+    selected = select_stage.pop('result')
+    results['select_top_stocks'] = select_stage
+
+    # 6. 报告渲染: Markdown报告 + 邮件HTML
+    analyzer = MarketAnalyzer(use_async=False)
+    analysis_result = _analysis_result(selected, len(stocks), analyzer)
+    email_sender = EmailSender()
+
+    def render():
+        analyzer._generate_markdown_report(analysis_result)
+        return email_sender._generate_html_content(analysis_result)
+
+    report_stage = _measure(render, repeat)
+    report_stage.pop('result')
+    results['report'] = report_stage
+
+    # 7. JSON持久化 (分析结果中附带全部股票数据, 与结果规模成正比)
+    analysis_result['all_stocks'] = stocks
+    persist_stage = _measure(lambda: analyzer._save_analysis_result(analysis_result), repeat)
+    persist_stage.pop('result')
+    results['persist'] = persist_stage
+
+    logger.info(f"{size} 只: 行情 {len(records)} 条, K线 {len(frames)} 组, 入选 {len(selected)} 只")
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ''
+
+
+def _machine() -> str:
+    """机器标识: 只和同一环境的历史结果比较"""
+    return f"{platform.node()}|{platform.machine()}|py{platform.python_version()}"
+
+
+def load_history(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(run: Dict, history: List[Dict], threshold: float, window: int,
+                     min_delta: float) -> List[Dict]:
+    """
+    与同一机器、相同模拟延迟下最近 window 次运行的中位数比较
+
+    Args:
+        threshold: 允许的相对变慢比例 (0.3 = 30%)
+        min_delta: 允许的绝对变慢秒数, 避免极短阶段的计时抖动被误判
+
+    Returns:
+        回退的阶段列表
+    """
+    previous = [h for h in history
+                if h.get('machine') == run['machine'] and h.get('latency') == run['latency']][-window:]
+    regressions = []
+    for size, stages in run['results'].items():
+        for stage, timing in stages.items():
+            baseline_values = [h['results'][size][stage]['median'] for h in previous
+                               if stage in h.get('results', {}).get(size, {})]
+            if not baseline_values:
+                continue
+            baseline = statistics.median(baseline_values)
+            current = timing['median']
+            if current > baseline * (1 + threshold) and current - baseline > min_delta:
+                regressions.append({'size': size, 'stage': stage, 'baseline': baseline, 'current': current})
+    return regressions
+
+
+def print_table(run: Dict):
+    sizes = list(run['results'].keys())
+    print(f"\n{'阶段':<20}" + ''.join(f"{size + '只':>14}" for size in sizes))
+    print('-' * (20 + 14 * len(sizes)))
+    for stage in STAGES:
+        cells = []
+        for size in sizes:
+            timing = run['results'][size].get(stage)
+            cells.append(f"{timing['median'] * 1000:>12.1f}ms" if timing else f"{'-':>14}")
+        print(f"{stage:<20}" + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分阶段性能基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='股票数量')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数 (取中位数)')
+    parser.add_argument('--concurrency', type=int, default=64, help='HTTP获取的并发数')
+    parser.add_argument('--latency', type=float, default=0.0, help='替身服务器每个请求的模拟延迟(秒)')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='历史结果文件 (JSONL)')
+    parser.add_argument('--threshold', type=float, default=0.3, help='判定回退的相对变慢比例')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='判定回退的最小绝对变慢(秒)')
+    parser.add_argument('--window', type=int, default=5, help='基线取最近几次运行')
+    parser.add_argument('--no-save', action='store_true', help='不把本次结果写入历史')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    history_path = os.path.abspath(args.history)
+    server, base_url = start_stub_server(latency=args.latency)
+
+    # 报告、分析结果和K线存储都写到临时目录, 不影响项目数据
+    workdir = tempfile.mkdtemp(prefix='stock_bench_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = {}
+        for size in args.sizes:
+            logger.info(f"测量 {size} 只股票...")
+            results[str(size)] = {stage: {k: round(v, 6) if isinstance(v, float) else v
+                                          for k, v in timing.items()}
+                                  for stage, timing in run_size(size, base_url, args.repeat,
+                                                                args.concurrency).items()}
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'machine': _machine(),
+        'repeat': args.repeat,
+        'latency': args.latency,
+        'results': results,
+    }
+    print_table(run)
+
+    regressions = find_regressions(run, load_history(history_path), args.threshold, args.window, args.min_delta)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+        with open(history_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + '\n')
+        print(f"\n结果已追加到: {history_path}")
+
+    if regressions:
+        print("\n❌ 性能回退:")
+        for r in regressions:
+            print(f"  {r['size']}只 {r['stage']}: {r['baseline'] * 1000:.1f}ms -> {r['current'] * 1000:.1f}ms "
+                  f"(+{(r['current'] / r['baseline'] - 1):.0%})")
+        sys.exit(1)
+
+    print("\n✅ 未发现性能回退")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+腾讯行情/K线接口的本地替身服务器
+
+按股票代码确定性地生成行情记录和前复权日K线 (同一代码每次生成的数据相同),
+路径格式与真实接口一致, 配合传输层的 host_map 即可让获取器离线运行:
+- /q=sh600000,sz000001                                      实时行情 (支持批量)
+- /appstock/app/fqkline/get?param=sh600000,day,,,60,qfq      日K线
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# K线最后一根的日期固定, 保证每次运行的数据一致
+LAST_BAR_DATE = '2025-11-14'
+
+
+def synthetic_codes(count: int) -> List[str]:
+    """生成测试用股票代码: 一半沪市(600000起), 一半深市(000001起)"""
+    sh = count - count // 2
+    return [f'{600000 + i:06d}' for i in range(sh)] + [f'{1 + i:06d}' for i in range(count - sh)]
+
+
+@lru_cache(maxsize=None)
+def quote_record(code: str) -> str:
+    """单只股票的行情记录 (字段位置与腾讯接口一致, 见 tencent_parser)"""
+    r = random.Random(f'quote:{code}')
+    parts = [''] * 60
+    price = round(r.uniform(3, 200), 2)
+    prev_close = round(price / (1 + r.uniform(-0.05, 0.05)), 2)
+    parts[0] = '1'
+    parts[1] = f'股票{code}'
+    parts[2] = code
+    parts[3] = str(price)
+    parts[4] = parts[5] = str(prev_close)
+    parts[6] = str(r.randint(10 ** 4, 10 ** 7))                      # 成交量
+    parts[7] = str(r.randint(10 ** 7, 10 ** 9))                      # 成交额
+    parts[14] = parts[15] = str(round(r.uniform(-10, 60), 2))        # 市盈率
+    parts[16] = str(round(r.uniform(0.3, 8), 2))                     # 市净率
+    parts[22] = str(round(r.uniform(3, 60), 2))                      # 市盈率(TTM)
+    parts[23] = str(round(r.uniform(1e5, 5e7), 2))                   # 总市值
+    parts[25] = str(round(r.uniform(1e4, 1e6), 2))                   # 总股本
+    parts[27] = parts[56] = str(round(r.uniform(0.1, 8), 2))         # 换手率
+    parts[32] = str(round((price / prev_close - 1) * 100, 2))        # 涨跌幅
+    parts[39] = str(round(r.uniform(3, 60), 2))
+    parts[46] = str(round(r.uniform(0.3, 8), 2))
+    parts[53] = str(round(r.uniform(0, 15), 3))                      # 每10股派息
+    open_ = float(parts[5])
+    parts[33] = str(round(max(price, open_) * (1 + r.uniform(0, 0.02)), 2))  # 最高
+    parts[34] = str(round(min(price, open_) * (1 - r.uniform(0, 0.02)), 2))  # 最低
+    return '~'.join(parts)
+
+
+def quote_body(symbols: List[str]) -> str:
+    return ''.join(f'v_{symbol}="{quote_record(symbol[2:])}";\n' for symbol in symbols)
+
+
+@lru_cache(maxsize=8)
+def _bar_dates(bars: int) -> Tuple[str, ...]:
+    return tuple(d.strftime('%Y-%m-%d') for d in pd.bdate_range(end=LAST_BAR_DATE, periods=bars))
+
+
+@lru_cache(maxsize=None)
+def kline_body(symbol: str, bars: int) -> str:
+    """前复权日K线响应 (随机游走, 列: 日期/开/收/高/低/量)"""
+    r = random.Random(f'kline:{symbol}')
+    close = float(quote_record(symbol[2:]).split('~')[3])
+    rows = []
+    for day in reversed(_bar_dates(bars)):
+        change = r.gauss(0, 0.02)
+        open_ = close / (1 + change)
+        high = max(open_, close) * (1 + abs(r.gauss(0, 0.005)))
+        low = min(open_, close) * (1 - abs(r.gauss(0, 0.005)))
+        rows.append([day, f'{open_:.2f}', f'{close:.2f}', f'{high:.2f}', f'{low:.2f}',
+                     str(r.randint(10 ** 4, 10 ** 6))])
+        close = open_
+    rows.reverse()
+    return 'kline_dayqfq=' + json.dumps({'code': 0, 'data': {symbol: {'qfqday': rows}}})
+
+
+def respond(path: str):
+    """按请求路径生成响应文本, 无法识别的路径返回None"""
+    parts = urlsplit(path)
+    if parts.path.startswith('/q='):
+        symbols = [s for s in parts.path[3:].split(',') if len(s) == 8]
+        return quote_body(symbols)
+    if parts.path.endswith('/fqkline/get'):
+        param = parse_qs(parts.query).get('param', [''])[0].split(',')
+        if len(param) >= 5 and param[4].isdigit():
+            return kline_body(param[0], int(param[4]))
+    return None
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+    """
+    在后台线程启动替身服务器
+
+    Args:
+        port: 监听端口 (0表示自动分配)
+        latency: 每个请求额外的模拟延迟(秒)
+
+    Returns:
+        (server, base_url), 结束时调用 server.shutdown()
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, 与真实接口的连接复用方式一致
+
+        def do_GET(self):
+            text = respond(self.path)
+            if latency:
+                time.sleep(latency)
+            if text is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = text.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256  # 默认的5在高并发下会丢连接, 客户端要等TCP重传
+
+    server = Server((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://{host}:{server.server_address[1]}'
+    logger.info(f"替身服务器已启动: {base_url}")
+    return server, base_url
+
+
+def host_map(base_url: str) -> dict:
+    """把腾讯行情和K线主机映射到替身服务器"""
+    return {'qt.gtimg.cn': base_url, 'web.ifzq.gtimg.cn': base_url}
@@ -19,7 +19,8 @@ BACKTEST_SAMPLE_CONFIG = {
     'sample_size': 300,          # 采样数量：300只（全部沪深300成分股）
     'random_seed': 42,           # 固定随机种子，确保可重复性
     'use_cache': True,           # 启用缓存加速
-    'cache_expire_days': 7       # 缓存过期天数
+    'cache_expire_days': 7,      # 缓存过期天数
+    'history_dir': './cache/history'  # 每只股票一个日线文件, 按区间补齐
 }
 
 # 回测输出配置
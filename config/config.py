@@ -25,7 +25,36 @@ STOCK_FILTER_CONFIG = {
 DATA_CONFIG = {
     'akshare_timeout': 30,
     'retry_times': 3,
-    'cache_dir': './data_cache'
+    'cache_dir': './data_cache',
+    'kline_store_dir': './data_cache/kline',  # 本地日K线存储(每只股票一个npz, 增量更新)
+    'factor_store_dir': './data_cache/factors',  # 每日盘后分析保存的时点因子快照(回测按日期读取)
+    'factor_max_age_days': 7,  # 回测某日时可使用的最旧因子快照(天), 更早的快照视为缺失
+    'history_cache_max_entries': 20000,  # 进程内历史K线缓存最大条目数
+    'history_cache_max_mb': 256,  # 进程内历史K线缓存内存上限(MB)
+    'history_cache_ttl': 3600,  # 历史K线缓存过期时间(秒)
+    'adaptive_concurrency': True,  # 异步获取器按延迟和错误率自动调整并发窗口(AIMD)
+    'concurrency_min': 4,  # 自适应并发窗口下限
+    'concurrency_max': 64,  # 自适应并发窗口上限
+    'sync_max_workers': 8,  # 同步获取器的并行线程数(1为逐只顺序获取)
+    'quote_batch_size': 100,  # 批量行情每个请求包含的股票数(腾讯接口支持逗号拼接,建议60-800)
+    'breadth_batch_size': 500,  # 全市场涨跌统计每个行情请求包含的股票数(各批并发)
+    'snapshot_refresh_interval': 60,  # 连续竞价时全市场行情快照的刷新间隔(秒), 间隔内各处共用同一次扫描
+    'quote_cache_ttl': 60,  # 连续竞价时单只股票行情的缓存时间(秒), 收盘后缓存到下一次开盘 (不经过全市场快照的逐只查询)
+    'overview_cache_ttl': 300,  # 连续竞价时市场概况缓存文件的有效期(秒)
+    'market_hours_ttl': True,  # 按交易时段决定行情/概况/K线缓存有效期: 收盘后缓存到下一次开盘, 集合竞价不缓存
+    'close_settle_seconds': 60,  # 15:00收盘后收盘价仍可能更新的时长(秒), 期间不缓存
+    'universe_cache_file': './data_cache/a_share_list.json',  # A股列表的本地缓存(每天更新一次)
+    'overview_cache_file': './cache/market_overview.json'  # 市场概况缓存(供其他进程读取)
+}
+
+# 限流配置 (令牌桶, 按主机名): rate=每秒请求数, burst=允许的瞬时突发请求数
+RATE_LIMIT_CONFIG = {
+    'default': {'rate': 5, 'burst': 10},
+    'hosts': {
+        'qt.gtimg.cn': {'rate': 10, 'burst': 20},  # 腾讯实时行情
+        'web.ifzq.gtimg.cn': {'rate': 8, 'burst': 16},  # 腾讯日K线
+        'push2.eastmoney.com': {'rate': 3, 'burst': 5},  # 东方财富(akshare个股信息)
+    },
 }
 
 # 调度配置
@@ -42,3 +71,18 @@ LOG_CONFIG = {
     'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     'file': './logs/stock_analyzer.log'
 }
+
+# 运行监控配置
+MONITORING_CONFIG = {
+    'trace_enabled': True,  # 记录盘后分析各阶段的耗时trace
+    'trace_dir': './logs/traces',
+    'trace_keep': 50,  # 最多保留的trace文件数
+    'metrics_dir': './logs/metrics',  # 命令行运行结束时导出的请求指标
+}
+
+# 盘中实时排名配置 (main.py --mode live)
+LIVE_RANKING_CONFIG = {
+    'poll_interval': 5,  # 行情轮询间隔(秒)
+    'top_k': 10,  # 维护排名并推送变化事件的前K名
+    'batch_size': 500,  # 每个行情请求包含的股票数(各批并发)
+}
@@ -25,6 +25,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from src.scheduler.task_scheduler import TaskScheduler
 from src.analysis.market_analyzer import MarketAnalyzer
 from src.notification.email_sender import EmailSender
+from src.data.replay import add_fixture_arguments, activate_from_args
+from src.monitoring.metrics import dump_request_metrics
 from config.config import LOG_CONFIG
 
 def setup_logging():
@@ -46,11 +48,15 @@ def main():
     logger = logging.getLogger(__name__)
 
     parser = argparse.ArgumentParser(description='股票量化分析系统')
-    parser.add_argument('--mode', choices=['daemon', 'analysis', 'email', 'test'],
+    parser.add_argument('--mode', choices=['daemon', 'analysis', 'live', 'email', 'test'],
                        default='daemon', help='运行模式')
+    parser.add_argument('--interval', type=float, help='live模式的行情轮询间隔(秒)')
+    parser.add_argument('--top', type=int, help='live模式维护排名的前K名')
     parser.add_argument('--config', help='配置文件路径')
+    add_fixture_arguments(parser)
 
     args = parser.parse_args()
+    activate_from_args(args)
 
     try:
         logger.info(f"股票分析系统启动 - 模式: {args.mode}")
@@ -156,6 +162,28 @@ def main():
             else:
                 print("分析失败，请检查日志")
 
+        elif args.mode == 'live':
+            # 盘中实时排名模式 - 轮询全市场行情, 推送前K名的排名变化
+            import asyncio
+            from src.analysis.live_ranking import LiveRanker
+
+            ranker = LiveRanker(top_k=args.top)
+            ranker.listeners.append(lambda event: print(f"{event.time:%H:%M:%S} {event.describe()}"))
+
+            print("=" * 60)
+            print(f"盘中实时排名已启动 (前{ranker.top_k}名), 按 Ctrl+C 停止")
+            print("=" * 60)
+
+            try:
+                asyncio.run(ranker.run(interval=args.interval))
+            except KeyboardInterrupt:
+                logger.info("收到停止信号，正在关闭...")
+                print("\n当前排名:")
+                for stock in ranker.ranking():
+                    print(f"#{stock['rank']} {stock['name']} ({stock['code']}) "
+                          f"强势分数 {stock['strength_score']} 评级 {stock['strength_grade']}")
+                print("\n程序已停止")
+
         elif args.mode == 'email':
             # 邮件发送模式
             logger.info("发送邮件...")
@@ -219,6 +247,9 @@ def main():
         logger.error(f"程序执行失败: {e}")
         print(f"错误: {e}")
         sys.exit(1)
+    finally:
+        # 本次运行的上游请求统计 (请求/重试/超时/流量/延迟分位)
+        dump_request_metrics()
 
 if __name__ == '__main__':
     main()
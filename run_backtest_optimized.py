@@ -6,6 +6,8 @@
 用法:
   单日回测: python run_backtest_optimized.py --mode single --date 2025-09-25 --hold 1
   多日回测: python run_backtest_optimized.py --mode multi --start 2025-09-23 --end 2025-09-27 --hold 1
+  面板引擎: python run_backtest_optimized.py --mode multi --start 2024-01-02 --end 2025-09-30 --engine panel
+  多进程:   python run_backtest_optimized.py --mode multi --start 2025-06-02 --end 2025-09-30 --workers 0
 """
 
 import sys
@@ -19,17 +21,26 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 import akshare as ak
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 import json
 import time
 import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # 添加项目路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.data.data_fetcher import StockDataFetcher
+from src.data.universe import get_universe
+from src.data.replay import add_fixture_arguments, activate_from_args
+from src.monitoring.metrics import dump_request_metrics
 from src.analysis.stock_filter import StockFilter
+from src.analysis.panel_backtest import PricePanel, PanelBacktest, history_span, LOOKBACK_DAYS
+from src.data.history_store import HistoryStore
+from src.data.factor_store import FactorStore
+from src.data.trading_calendar import get_trading_calendar
 from config.backtest_config import BACKTEST_FILTER_CONFIG, BACKTEST_SAMPLE_CONFIG
 
 # 设置日志
@@ -42,9 +53,15 @@ logger = logging.getLogger(__name__)
 class OptimizedBacktest:
     """优化回测系统 - 使用宽松配置"""
 
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         self.data_fetcher = StockDataFetcher()
+        self.use_cache = use_cache  # 录制/回放时关闭本地pickle缓存, 保证每次都走上游(或归档)
         self.stock_filter = StockFilter(config=BACKTEST_FILTER_CONFIG)
+        # 每只股票一个日线文件, 按区间补齐; 任意 (股票, 日期) 查询都直接读本地
+        self.history_store = HistoryStore(persist=use_cache)
+        # 每日盘后分析保存的时点因子 (PE/PB/ROE等), 回测某日只使用该日及之前的快照
+        self.factor_store = FactorStore()
+        self._factor_panel = None
         self.cache_dir = './cache'
         os.makedirs(self.cache_dir, exist_ok=True)
         self.stock_name_cache = {}
@@ -55,6 +72,8 @@ class OptimizedBacktest:
         return os.path.join(self.cache_dir, f"{cache_key}.pkl")
 
     def load_from_cache(self, cache_key):
+        if not self.use_cache:
+            return None
         cache_file = self.get_cache_file(cache_key)
         if os.path.exists(cache_file):
             try:
@@ -67,6 +86,8 @@ class OptimizedBacktest:
         return None
 
     def save_to_cache(self, cache_key, data):
+        if not self.use_cache:
+            return
         cache_file = self.get_cache_file(cache_key)
         try:
             with open(cache_file, 'wb') as f:
@@ -77,6 +98,11 @@ class OptimizedBacktest:
     def get_stock_name(self, stock_code: str):
         if stock_code in self.stock_name_cache:
             return self.stock_name_cache[stock_code]
+        # 沪深300成分股的名称在股票池注册表中, 不需要逐只请求
+        stock_name = get_universe().name(stock_code)
+        if stock_name:
+            self.stock_name_cache[stock_code] = stock_name
+            return stock_name
         try:
             info = ak.stock_individual_info_em(symbol=stock_code)
             if not info.empty:
@@ -101,22 +127,13 @@ class OptimizedBacktest:
 
         stocks = []
         try:
-            logger.info("正在获取沪深300成分股列表（方法1：akshare）...")
-            csi300 = ak.index_stock_cons(symbol="000300")
-            stocks = csi300['品种代码'].tolist()
-            for i, code in enumerate(stocks):
-                name = csi300[csi300['品种代码'] == code]['品种名称'].values
-                if len(name) > 0:
-                    self.stock_name_cache[code] = str(name[0])
+            # 股票池注册表: 本地成分股文件, 不存在时依次尝试 index_stock_cons / index_stock_cons_csindex
+            csi300 = get_universe().csi300_frame()
+            stocks = csi300['code'].tolist()
+            self.stock_name_cache.update(zip(csi300['code'], csi300['name']))
             logger.info(f"✅ 成功获取 {len(stocks)} 只沪深300成分股")
         except Exception as e:
-            logger.warning(f"⚠️ 方法1失败: {e}")
-            try:
-                csi300 = ak.index_stock_cons_csindex(symbol="000300")
-                stocks = csi300['成分券代码'].tolist()
-                logger.info(f"✅ 方法2成功获取 {len(stocks)} 只股票")
-            except Exception as e2:
-                logger.error(f"❌ 所有方法均失败: {e2}")
+            logger.error(f"❌ 获取沪深300成分股失败: {e}")
 
         if not stocks:
             return []
@@ -125,34 +142,30 @@ class OptimizedBacktest:
         self.save_to_cache(cache_key, cache_data)
         return stocks
 
-    def get_stock_data_for_date(self, stock_code: str, date: str, pe_ratio: float = None, purpose: str = "buy"):
-        cache_key = f"stock_{stock_code}_{date}_{purpose}"
-        cached_data = self.load_from_cache(cache_key)
-        if cached_data:
-            if pe_ratio is not None and pe_ratio > 0:
-                cached_data['pe_ratio'] = pe_ratio
-            return cached_data
+    def get_stock_data_for_date(self, stock_code: str, date: str, pe_ratio: float = None, purpose: str = "buy",
+                                factors: dict = None):
+        """
+        某只股票截至某日的回测数据
 
+        Args:
+            pe_ratio: 当前PE (没有时点快照时使用)
+            factors: 该日的时点因子快照 (FactorPanel.records 的值); PE为正时优先于 pe_ratio,
+                     PB/ROE/净利润增长率/股息率直接写入记录
+        """
         try:
-            end_date = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=5)).strftime('%Y%m%d')
-            start_date = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=35)).strftime('%Y%m%d')
-
-            df = ak.stock_zh_a_hist(symbol=stock_code, period="daily",
-                                   start_date=start_date, end_date=end_date, adjust="qfq")
-            if df.empty:
-                return None
-
-            df['日期'] = pd.to_datetime(df['日期'])
-            target_date = pd.to_datetime(date)
-            df_on_date = df[df['日期'] <= target_date]
+            # 本地未覆盖 [date-35天, date] 时才下载 (与已有区间合并)
+            df_on_date = self.history_store.window(stock_code, date, LOOKBACK_DAYS)
             if df_on_date.empty:
                 return None
 
             row = df_on_date.iloc[-1]
             stock_name = self.get_stock_name(stock_code)
 
+            factors = factors or {}
             final_pe_ratio = 20.0
-            if pe_ratio is not None and pe_ratio > 0:
+            if factors.get('pe_ratio', 0) > 0:
+                final_pe_ratio = factors['pe_ratio']
+            elif pe_ratio is not None and pe_ratio > 0:
                 final_pe_ratio = pe_ratio
             elif '市盈率' in row:
                 try:
@@ -173,77 +186,122 @@ class OptimizedBacktest:
                 'name': stock_name,
                 'price': float(row['收盘']),
                 'change_pct': float(row['涨跌幅']),
+                'turnover_rate': float(row['换手率']),  # 附加筛选按换手率过滤, 缺少该字段时所有股票都会被排除
                 'volume': int(row['成交量']),
                 'turnover': float(row['成交额']),
                 'pe_ratio': final_pe_ratio,
                 'momentum_20d': momentum_20d,
                 'strength_score': 0
             }
-            self.save_to_cache(cache_key, data)
+            # 换手率和动量由当日K线计算, 其余基本面因子来自快照
+            for field in ('pb_ratio', 'roe', 'profit_growth', 'dividend_yield'):
+                if field in factors:
+                    data[field] = factors[field]
             return data
 
         except Exception as e:
             logger.debug(f"获取 {stock_code} 数据失败: {e}")
             return None
 
+    def prefetch_histories(self, stock_codes: list, start_date: str, end_date: str):
+        """每只股票一次下载覆盖整个回测区间的日线 (本地已覆盖的不访问网络, 限速只作用于真正的下载)"""
+        downloads = 0
+        for i, code in enumerate(stock_codes):
+            if i % 50 == 0:
+                logger.info(f"⏳ 日线加载进度: {i+1}/{len(stock_codes)}")
+            if self.history_store.ensure(code, start_date, end_date):
+                downloads += 1
+        logger.info(f"✅ 日线就绪: {len(stock_codes)} 只股票, 本次下载 {downloads} 只")
+
     def get_next_trading_day(self, date: str, days: int = 1):
+        """date 之后的第 days 个交易日 (按交易日历跳过周末和节假日)"""
         try:
-            current = datetime.strptime(date, '%Y-%m-%d')
-            for i in range(1, 15):
-                next_date = current + timedelta(days=i*days)
-                if next_date.weekday() < 5:
-                    return next_date.strftime('%Y-%m-%d')
-            return (current + timedelta(days=days)).strftime('%Y-%m-%d')
-        except:
+            return get_trading_calendar().next_trading_day(date, days).strftime('%Y-%m-%d')
+        except Exception:
             return date
 
     def fetch_pe_ratios_batch(self, stock_codes: list) -> dict:
         pe_dict = {}
         logger.info("📊 正在获取PE数据...")
-        success_count = 0
-        for i, code in enumerate(stock_codes):
-            try:
-                stock_data = self.data_fetcher.get_stock_realtime_data(code)
-                if stock_data and stock_data.get('pe_ratio'):
-                    pe_dict[code] = stock_data['pe_ratio']
-                    success_count += 1
-                if (i + 1) % 50 == 0:
-                    logger.info(f"   进度: {i+1}/{len(stock_codes)}")
-            except:
-                pass
-        logger.info(f"✅ 成功获取 {success_count}/{len(stock_codes)} 只股票的PE数据")
+        try:
+            # 批量行情: 每个请求包含多只股票
+            table = self.data_fetcher.get_quote_table(stock_codes, include_fundamental=False)
+            if not table.empty:
+                pe_dict = {code: float(pe) for code, pe in table['pe_ratio'].items() if pd.notna(pe) and pe}
+        except Exception as e:
+            logger.warning(f"批量获取PE数据失败: {e}")
+        logger.info(f"✅ 成功获取 {len(pe_dict)}/{len(stock_codes)} 只股票的PE数据")
         return pe_dict
 
-    def backtest_single_day(self, analysis_date: str, hold_days: int = 1):
-        logger.info(f"\n{'='*70}")
-        logger.info(f"📅 回测日期: {analysis_date} | 持有{hold_days}天")
-        logger.info(f"{'='*70}")
-
+    def load_factor_panel(self):
+        """时点因子面板 (每个实例加载一次, 内存映射); 没有快照时为None"""
+        if self._factor_panel is None:
+            self._factor_panel = self.factor_store.load() or False
+        return self._factor_panel or None
+
+    def point_in_time_factors(self, date: str, stock_codes: list) -> dict:
+        """某个回测日的时点因子: 股票代码 -> {因子: 值}; 没有可用快照时为空"""
+        panel = self.load_factor_panel()
+        if panel is None:
+            return {}
+        return panel.records(date, stock_codes)
+
+    def fallback_pe_ratios(self, trading_days: list, stock_codes: list) -> dict:
+        """没有时点快照的回测日只能使用当前PE (存在前视偏差); 全部日期都有快照时不再请求行情"""
+        panel = self.load_factor_panel()
+        uncovered = [date for date in trading_days if panel is None or not panel.covers(date)]
+        if not uncovered:
+            logger.info(f"📊 时点因子: {len(trading_days)} 个回测日全部使用当日快照")
+            return {}
+        logger.warning(f"⚠️  {len(uncovered)}/{len(trading_days)} 个回测日没有时点因子快照, 使用当前PE (存在前视偏差)")
+        return self.fetch_pe_ratios_batch(stock_codes)
+
+    def get_sampled_stocks(self):
+        """按采样配置从沪深300成分股中抽取回测股票 (固定随机种子, 每次结果相同)"""
         stock_list = self.get_csi300_stocks()
         if not stock_list:
             logger.error("无法获取沪深300成分股列表")
-            return None
+            return []
 
         sample_size = BACKTEST_SAMPLE_CONFIG['sample_size']
         if sample_size >= len(stock_list):
-            sampled_stocks = stock_list
-        else:
-            import random
-            random.seed(BACKTEST_SAMPLE_CONFIG['random_seed'])
-            sampled_stocks = random.sample(stock_list, min(sample_size, len(stock_list)))
+            return stock_list
+        import random
+        random.seed(BACKTEST_SAMPLE_CONFIG['random_seed'])
+        return random.sample(stock_list, min(sample_size, len(stock_list)))
+
+    def backtest_single_day(self, analysis_date: str, hold_days: int = 1,
+                            sampled_stocks: list = None, pe_ratios: dict = None):
+        """
+        单日回测
+
+        Args:
+            analysis_date: 回测日期
+            hold_days: 持有天数
+            sampled_stocks: 回测股票 (多日回测时由调用方统一获取, 默认按采样配置获取)
+            pe_ratios: 股票代码 -> 当前PE (同上; 默认在当天没有时点快照时批量获取)
+        """
+        logger.info(f"\n{'='*70}")
+        logger.info(f"📅 回测日期: {analysis_date} | 持有{hold_days}天")
+        logger.info(f"{'='*70}")
+
+        if sampled_stocks is None:
+            sampled_stocks = self.get_sampled_stocks()
+        if not sampled_stocks:
+            return None
 
         logger.info(f"📊 分析股票数: {len(sampled_stocks)} 只")
-        pe_ratios = self.fetch_pe_ratios_batch(sampled_stocks)
+        factors = self.point_in_time_factors(analysis_date, sampled_stocks)
+        if pe_ratios is None:
+            pe_ratios = self.fallback_pe_ratios([analysis_date], sampled_stocks)
 
         stock_data = []
         for i, code in enumerate(sampled_stocks):
             if i % 20 == 0:
                 logger.info(f"⏳ 数据获取进度: {i+1}/{len(sampled_stocks)}")
-            data = self.get_stock_data_for_date(code, analysis_date, pe_ratios.get(code), "buy")
+            data = self.get_stock_data_for_date(code, analysis_date, pe_ratios.get(code), "buy", factors.get(code))
             if data:
                 stock_data.append(data)
-            if i % 20 == 19:
-                time.sleep(0.3)
 
         logger.info(f"✅ 成功获取 {len(stock_data)} 只股票数据")
 
@@ -416,28 +474,110 @@ class OptimizedBacktest:
             logger.info(f"   → 过滤负动量股票，理论可提升均收益约 "
                         f"{sum(pos)/len(pos) - sum(neg)/len(neg):+.2f}%")
 
-    def backtest_multi_days(self, start_date: str, end_date: str, hold_days: int = 1):
+    def backtest_panel(self, trading_days: list, hold_days: int = 1):
+        """
+        面板回测: 每只股票下载一次覆盖全部回测日的日线, 所有回测日的选股和收益按矩阵一次算出
+
+        Returns:
+            与 trading_days 一一对应的结果 (结构同 backtest_single_day, 数据不足的日期为None)
+        """
+        sampled_stocks = self.get_sampled_stocks()
+        if not sampled_stocks or not trading_days:
+            return [None] * len(trading_days)
+
+        pe_ratios = self.fallback_pe_ratios(trading_days, sampled_stocks)
+        sell_days = [self.get_next_trading_day(date, hold_days) for date in trading_days]
+        start, end = history_span(trading_days, sell_days)
+        logger.info(f"📊 面板回测: {len(sampled_stocks)} 只股票 × {len(trading_days)} 个交易日 (日线 {start} ~ {end})")
+
+        self.prefetch_histories(sampled_stocks, start, end)
+
+        start_time = time.time()
+        histories = {code: self.history_store.get_range(code, start, end) for code in sampled_stocks}
+        panel = PricePanel.from_histories(histories)
+        names = {code: self.get_stock_name(code) for code in panel.codes}
+        engine = PanelBacktest(panel, self.stock_filter.config, pe_ratios, names, self.load_factor_panel())
+        results = engine.run(trading_days, lambda date: self.get_next_trading_day(date, hold_days), hold_days)
+        logger.info(f"✅ 面板计算完成: {len(panel)} 只股票, 用时 {time.time() - start_time:.2f}秒")
+
+        for result in results:
+            if not result:
+                continue
+            summary = result.get('summary', {})
+            logger.info(f"   {result['analysis_date']}: 选出 {result['selected_count']} 只, "
+                        f"平均收益 {summary.get('avg_return', 0):+.2f}%")
+            for perf_entry in result['performance']:
+                self._factor_records.append({'date': result['analysis_date'], **perf_entry})
+        return results
+
+    def backtest_days_parallel(self, trading_days: list, hold_days: int, sampled_stocks: list,
+                               pe_ratios: dict, workers: int):
+        """
+        把回测日分配到多个进程 (每个回测日相互独立), 按日期顺序合并结果和因子记录
+
+        工作进程以只读方式共享本地日线 (调用前已按整个区间补齐), 通常不再访问网络
+        """
+        logger.info(f"🚀 多进程回测: {workers} 个进程, {len(trading_days)} 个交易日")
+        results = []
+        initargs = (sampled_stocks, pe_ratios, dict(self.stock_name_cache), self.stock_filter.config)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backtest_worker,
+                                 initargs=initargs) as pool:
+            # map 按提交顺序返回, 合并结果与串行回测一致
+            for i, (date, (result, factor_records)) in enumerate(
+                    zip(trading_days, pool.map(_backtest_day_worker, trading_days, repeat(hold_days)))):
+                if result and result['selected_count'] > 0:
+                    logger.info(f"进度: {i+1}/{len(trading_days)} {date}: 选出 {result['selected_count']} 只, "
+                                f"平均收益 {result['summary']['avg_return']:+.2f}%")
+                    results.append(result)
+                else:
+                    logger.info(f"进度: {i+1}/{len(trading_days)} {date}: 无选股")
+                self._factor_records.extend(factor_records)
+        return results
+
+    def backtest_multi_days(self, start_date: str, end_date: str, hold_days: int = 1, engine: str = 'loop',
+                            workers: int = 1):
+        """
+        多日回测
+
+        Args:
+            engine: loop=逐日逐只, panel=日线矩阵一次计算全部回测日
+            workers: loop 引擎的进程数 (1为串行, 0为CPU核数); 不使用本地缓存(录制/回放)时只能串行
+        """
         logger.info(f"\n{'='*70}")
         logger.info(f"📅 多日回测: {start_date} ~ {end_date}")
         logger.info(f"{'='*70}")
 
-        trading_days = []
-        current = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-        while current <= end:
-            if current.weekday() < 5:
-                trading_days.append(current.strftime('%Y-%m-%d'))
-            current += timedelta(days=1)
+        trading_days = [day.strftime('%Y-%m-%d')
+                        for day in get_trading_calendar().trading_days(start_date, end_date)]
 
         logger.info(f"共 {len(trading_days)} 个交易日")
 
         all_results = []
-        for i, date in enumerate(trading_days):
-            logger.info(f"\n进度: {i+1}/{len(trading_days)}")
-            result = self.backtest_single_day(date, hold_days)
-            if result and result['selected_count'] > 0:
-                all_results.append(result)
-            time.sleep(1)
+        if engine == 'panel':
+            all_results = [r for r in self.backtest_panel(trading_days, hold_days)
+                           if r and r['selected_count'] > 0]
+        elif trading_days:
+            sampled_stocks = self.get_sampled_stocks()
+            if not sampled_stocks:
+                return []
+            pe_ratios = self.fallback_pe_ratios(trading_days, sampled_stocks)
+            # 先按整个区间补齐日线, 之后逐日查询都不再访问网络
+            sell_days = [self.get_next_trading_day(date, hold_days) for date in trading_days]
+            self.prefetch_histories(sampled_stocks, *history_span(trading_days, sell_days))
+
+            workers = min(workers or os.cpu_count() or 1, len(trading_days))
+            if workers > 1 and not self.use_cache:
+                logger.warning("⚠️  未使用本地缓存, 工作进程无法共享日线, 改为串行回测")
+                workers = 1
+            if workers > 1:
+                all_results = self.backtest_days_parallel(trading_days, hold_days, sampled_stocks,
+                                                          pe_ratios, workers)
+            else:
+                for i, date in enumerate(trading_days):
+                    logger.info(f"\n进度: {i+1}/{len(trading_days)}")
+                    result = self.backtest_single_day(date, hold_days, sampled_stocks, pe_ratios)
+                    if result and result['selected_count'] > 0:
+                        all_results.append(result)
 
         if all_results:
             all_returns = []
@@ -460,6 +600,32 @@ class OptimizedBacktest:
         return all_results
 
 
+# ── 多进程回测的工作进程 ──────────────────
+_worker_backtest = None
+
+
+def _init_backtest_worker(sampled_stocks: list, pe_ratios: dict, name_cache: dict, filter_config: dict):
+    """每个工作进程创建一次回测实例, 只读共享本地日线"""
+    global _worker_backtest
+    # 逐只进度日志由主进程按日期汇总输出
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_backtest = OptimizedBacktest(use_cache=True)
+    _worker_backtest.history_store = HistoryStore(read_only=True)
+    _worker_backtest.factor_store = FactorStore(read_only=True)
+    _worker_backtest.stock_name_cache = name_cache
+    _worker_backtest.stock_filter.config = filter_config
+    _worker_backtest.sampled_stocks = sampled_stocks
+    _worker_backtest.pe_ratios = pe_ratios
+
+
+def _backtest_day_worker(analysis_date: str, hold_days: int):
+    """单个回测日, 返回 (结果, 当天的因子记录)"""
+    backtest = _worker_backtest
+    backtest._factor_records = []
+    result = backtest.backtest_single_day(analysis_date, hold_days, backtest.sampled_stocks, backtest.pe_ratios)
+    return result, backtest._factor_records
+
+
 def main():
     # ── 命令行参数解析（GitHub Actions 兼容）──────────────────
     parser = argparse.ArgumentParser(description='沪深300策略回测系统')
@@ -473,25 +639,31 @@ def main():
                         help='多日回测结束日期，格式: 2025-09-27')
     parser.add_argument('--hold', type=int, default=1,
                         help='持有天数，默认1天')
+    parser.add_argument('--engine', choices=['loop', 'panel'], default='loop',
+                        help='回测引擎: loop=逐日逐只, panel=日线矩阵一次计算全部回测日')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='多日回测 loop 引擎的进程数，默认1（串行），0=CPU核数')
+    add_fixture_arguments(parser)
     args = parser.parse_args()
+    fixtures = activate_from_args(args)
 
     print("="*70)
     print("📊 沪深300策略回测系统")
     print("="*70)
 
-    backtest = OptimizedBacktest()
+    backtest = OptimizedBacktest(use_cache=fixtures is None)
     os.makedirs('./logs/backtest', exist_ok=True)
 
     if args.mode == 'single':
-        # 未传日期时默认用上一个工作日
+        # 未传日期时默认用上一个交易日
         if args.date is None:
-            today = datetime.today()
-            offset = max(1, (today.weekday() + 6) % 7 - 3)  # 周一取上周五
-            last_workday = today - timedelta(days=offset if today.weekday() == 0 else 1)
-            args.date = last_workday.strftime('%Y-%m-%d')
-            print(f"未指定日期，自动使用上一工作日: {args.date}")
+            args.date = get_trading_calendar().prev_trading_day(datetime.today()).strftime('%Y-%m-%d')
+            print(f"未指定日期，自动使用上一交易日: {args.date}")
 
-        result = backtest.backtest_single_day(args.date, args.hold)
+        if args.engine == 'panel':
+            result = backtest.backtest_panel([args.date], args.hold)[0]
+        else:
+            result = backtest.backtest_single_day(args.date, args.hold)
         if result:
             filename = f"./logs/backtest/backtest_{args.date}_{args.hold}days.json"
             with open(filename, 'w', encoding='utf-8') as f:
@@ -503,13 +675,15 @@ def main():
             print("❌ 多日回测需要指定 --start 和 --end 参数")
             sys.exit(1)
 
-        results = backtest.backtest_multi_days(args.start, args.end, args.hold)
+        results = backtest.backtest_multi_days(args.start, args.end, args.hold, args.engine, args.workers)
         if results:
             filename = f"./logs/backtest/backtest_{args.start}_to_{args.end}.json"
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(results, f, ensure_ascii=False, indent=2)
             logger.info(f"\n✅ 回测结果已保存: {filename}")
 
+    dump_request_metrics()
+
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,7 @@ import json
 
 from src.data.data_fetcher import StockDataFetcher
 from src.analysis.stock_filter import StockFilter
+from src.data.factor_store import get_factor_store
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +64,7 @@ class BacktestAnalyzer:
                     'volume': row['成交量'] if '成交量' in target_data.columns else row.iloc[5],
                     'change_pct': row['涨跌幅'] if '涨跌幅' in target_data.columns else 0,
                     'momentum_20d': momentum,
+                    'turnover_rate': row['换手率'] if '换手率' in target_data.columns else 0,
                     'pe_ratio': 15.0,  # 使用估算值
                     'turnover': row['成交额'] if '成交额' in target_data.columns else row.iloc[6] if len(row) > 6 else 0
                 }
@@ -86,20 +88,24 @@ class BacktestAnalyzer:
                     '600031', '000063', '600048', '002304', '600104'
                 ]
 
+            # 基本面因子: 该日及之前最近一次盘后分析保存的快照
+            factor_panel = get_factor_store().load()
+            factors = factor_panel.records(analysis_date, stock_list) if factor_panel else {}
+            if not factors:
+                logger.warning(f"{analysis_date} 没有时点因子快照, PB/ROE/股息率等按缺失处理")
+
             # 获取所有股票的数据
             stock_data = []
             for code in stock_list:
                 data = self.get_historical_data_for_date(code, analysis_date)
                 if data:
-                    # 计算基本面数据（模拟）
-                    # 注意：在真实回测中，这些数据需要从历史数据中获取
-                    data['roe'] = 12.0 + np.random.uniform(-3, 3)  # 随机ROE
-                    data['profit_growth'] = 15.0 + np.random.uniform(-5, 5)  # 随机利润增长率
-                    data['dividend_yield'] = 2.0 + np.random.uniform(-1, 2)  # 随机股息率
-                    data['turnover_rate'] = 1.5 + np.random.uniform(-1, 2)  # 随机换手率
-                    data['pb_ratio'] = 1.5 + np.random.uniform(-0.5, 1.0)  # 随机PB
-                    data['peg'] = 0.8 + np.random.uniform(-0.3, 0.5)  # 随机PEG
-                    
+                    snapshot = factors.get(code, {})
+                    if snapshot.get('pe_ratio', 0) > 0:
+                        data['pe_ratio'] = snapshot['pe_ratio']
+                    for field in ('pb_ratio', 'roe', 'profit_growth', 'dividend_yield'):
+                        if field in snapshot:
+                            data[field] = snapshot[field]
+
                     stock_data.append(data)
                     logger.info(f"获取到 {code} 的数据: ¥{data['price']:.2f}")
 
@@ -0,0 +1,342 @@
+"""
+盘中实时排名
+
+按 poll_interval 轮询全市场(或指定股票池)的批量行情, 只对行情有变化的股票重新评分
+(列式评分引擎, 规则与 StockFilter 一致), 排名保存在有序索引中增量更新, 不再每轮全量排序;
+每轮比较前K名的变化并产出排名事件 (进入/退出/名次变化)。
+
+20日动量随最新价实时更新: 股票第一次通过筛选条件时取一次历史K线, 记下20日窗口起点的收盘价,
+之后 动量 = (最新价 / 起点收盘价 - 1) * 100, 与收盘后 run_daily_analysis 的计算结果一致。
+没有通过筛选条件的股票不影响排名, 不获取K线。
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import LIVE_RANKING_CONFIG
+from src.analysis.stock_filter import StockFilter
+from src.analysis.scoring_engine import ScoreColumns, ScoringEngine, score_columns
+from src.data.async_data_fetcher import AsyncStockDataFetcher
+from src.data.market_clock import market_now, market_phase, CONTINUOUS, CALL_AUCTION
+from src.data.universe import get_universe
+
+logger = logging.getLogger(__name__)
+
+# 参与评分的行情字段 (任一字段变化即重新评分)
+QUOTE_FIELDS = ('price', 'change_pct', 'turnover_rate', 'pe_ratio', 'pb_ratio',
+                'roe', 'profit_growth', 'dividend_yield')
+
+MOMENTUM_DAYS = 20
+
+
+@dataclass
+class RankEvent:
+    """前K名的一次排名变化"""
+    kind: str  # 'enter' 进入前K / 'exit' 退出前K / 'move' 名次变化
+    code: str
+    name: str
+    rank: Optional[int]  # 新名次 (exit 为None)
+    previous_rank: Optional[int]  # 原名次 (enter 为None)
+    score: int
+    previous_score: Optional[int] = None
+    time: datetime = field(default_factory=market_now)  # 北京时间, 与交易时段判断使用同一时钟
+
+    def describe(self) -> str:
+        label = f"{self.name}({self.code})"
+        if self.kind == 'enter':
+            return f"[进入] #{self.rank} {label} 强势分数 {self.score}"
+        if self.kind == 'exit':
+            return f"[退出] {label} 原第{self.previous_rank}名, 强势分数 {self.score}"
+        arrow = '↑' if self.rank < self.previous_rank else '↓'
+        return f"[{arrow}] #{self.previous_rank} -> #{self.rank} {label} 强势分数 {self.previous_score} -> {self.score}"
+
+
+class RankIndex:
+    """
+    有序排名索引: 按 (总分降序, 股票池位置升序) 排列
+
+    同分时按股票池顺序排列, 与 StockFilter 的稳定排序一致。
+    更新单只股票和查询名次都是二分查找, 不需要重新排序全部股票。
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []  # (-总分, 位置)
+        self._scores: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, position: int) -> bool:
+        return position in self._scores
+
+    def update(self, position: int, score: int):
+        previous = self._scores.get(position)
+        if previous == score:
+            return
+        if previous is not None:
+            del self._keys[bisect_left(self._keys, (-previous, position))]
+        insort(self._keys, (-score, position))
+        self._scores[position] = score
+
+    def discard(self, position: int):
+        previous = self._scores.pop(position, None)
+        if previous is not None:
+            del self._keys[bisect_left(self._keys, (-previous, position))]
+
+    def rank(self, position: int) -> Optional[int]:
+        """名次 (从1开始), 不在索引中返回None"""
+        score = self._scores.get(position)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score, position)) + 1
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        """前k名的 (位置, 总分)"""
+        return [(position, -neg_score) for neg_score, position in self._keys[:k]]
+
+
+def momentum_anchor(history: pd.DataFrame, today=None) -> float:
+    """
+    20日动量窗口起点的收盘价 (今天之前的第19根K线)
+
+    收盘后的动量取最近20根K线(含当天)首尾收盘价之比, 盘中用最新价代替当天收盘价即可。
+
+    Returns:
+        收盘价; K线不足时返回NaN (动量按0处理, 与盘后分析一致)
+    """
+    if history.empty:
+        return np.nan
+    today = today or market_now().date()
+    prior = history.loc[history['date'].dt.date < today, 'close']
+    if len(prior) < MOMENTUM_DAYS - 1:
+        return np.nan
+    return float(prior.iloc[-(MOMENTUM_DAYS - 1)])
+
+
+class LiveRanker:
+    """盘中实时排名: 轮询行情 -> 增量评分 -> 排名事件"""
+
+    def __init__(self, stock_codes: List[str] = None, fetcher: AsyncStockDataFetcher = None,
+                 stock_filter: StockFilter = None, top_k: int = None, batch_size: int = None):
+        """
+        Args:
+            stock_codes: 股票池 (默认全部A股)
+            fetcher: 异步数据获取器 (默认新建)
+            stock_filter: 提供筛选和评分参数 (默认 STOCK_FILTER_CONFIG)
+            top_k: 维护排名并推送事件的前K名 (默认 LIVE_RANKING_CONFIG['top_k'])
+            batch_size: 每个行情请求包含的股票数 (默认 LIVE_RANKING_CONFIG['batch_size'])
+        """
+        self.fetcher = fetcher or AsyncStockDataFetcher()
+        self.stock_filter = stock_filter or StockFilter()
+        self.engine = ScoringEngine(self.stock_filter.config)
+        self.top_k = top_k or LIVE_RANKING_CONFIG.get('top_k', 10)
+        self.batch_size = batch_size or LIVE_RANKING_CONFIG.get('batch_size', 500)
+        self.listeners: List[Callable[[RankEvent], None]] = []
+        self.index = RankIndex()
+        self.polls = 0
+        self.last_poll: Optional[datetime] = None
+        self._set_codes(list(dict.fromkeys(stock_codes)) if stock_codes else None)
+
+    def _set_codes(self, codes: Optional[List[str]]):
+        self.codes = codes
+        if codes is None:
+            return
+        count = len(codes)
+        self._positions = pd.Index(codes)
+        self._names = np.array([''] * count, dtype=object)
+        self._quotes = np.full((count, len(QUOTE_FIELDS)), np.nan)
+        self._seen = np.zeros(count, dtype=bool)
+        self._anchors = np.full(count, np.nan)
+        self._anchor_loaded = np.zeros(count, dtype=bool)
+        self._anchor_date = market_now().date()
+        self._momentum = np.zeros(count)
+        self._totals = np.zeros(count, dtype=np.int64)
+        self._grades = np.array(['D'] * count, dtype=object)
+        self._top: Dict[int, Tuple[int, int]] = {}
+
+    # ---------- 轮询 ----------
+
+    async def poll_once(self, session) -> List[RankEvent]:
+        """
+        获取一轮行情并更新排名
+
+        Returns:
+            本轮前K名的排名变化事件 (同时推送给 listeners)
+        """
+        if self.codes is None:
+            self._set_codes(get_universe().a_share_codes())
+        self._roll_anchors()
+
+        start = time.perf_counter()
+        table = await self.fetcher.get_quote_table(session, self.codes, batch_size=self.batch_size,
+                                                   include_fundamental=True, use_snapshot=False)
+        fetched = time.perf_counter()
+        changed = self._apply_quotes(table)
+        if len(changed):
+            await self._rescore(session, changed)
+        events = self._diff_top()
+
+        self.polls += 1
+        self.last_poll = market_now()
+        logger.info(f"实时排名第{self.polls}轮: 行情 {len(table)}/{len(self.codes)} 只 ({fetched - start:.2f}秒), "
+                    f"变化 {len(changed)} 只, 排名内 {len(self.index)} 只, 事件 {len(events)} 个 "
+                    f"(评分 {time.perf_counter() - fetched:.3f}秒)")
+
+        for event in events:
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.error(f"排名事件处理失败: {e}")
+        return events
+
+    def _roll_anchors(self):
+        """跨交易日后清空动量起点 (20日窗口随日期后移, 需要重新获取)"""
+        today = market_now().date()
+        if today == self._anchor_date:
+            return
+        self._anchors[:] = np.nan
+        self._anchor_loaded[:] = False
+        self._anchor_date = today
+        logger.info(f"日期变为 {today}, 重新获取动量起点")
+
+    def _apply_quotes(self, table: pd.DataFrame) -> np.ndarray:
+        """保存本轮行情, 返回行情有变化的股票位置 (本轮没有获取到的股票保持上一轮状态)"""
+        if table.empty:
+            return np.array([], dtype=np.int64)
+
+        positions = self._positions.get_indexer(table['code'])
+        found = positions >= 0
+        positions = positions[found]
+        quotes = np.column_stack([
+            pd.to_numeric(table[name], errors='coerce').to_numpy(dtype=np.float64)[found]
+            if name in table.columns else np.full(len(positions), np.nan)
+            for name in QUOTE_FIELDS
+        ])
+
+        previous = self._quotes[positions]
+        same = (quotes == previous) | (np.isnan(quotes) & np.isnan(previous))
+        changed = ~same.all(axis=1) | ~self._seen[positions]
+
+        changed_positions = positions[changed]
+        self._quotes[changed_positions] = quotes[changed]
+        self._names[changed_positions] = table['name'].to_numpy()[found][changed]
+        self._seen[changed_positions] = True
+        return changed_positions
+
+    def _columns(self, positions: np.ndarray) -> ScoreColumns:
+        values = {name: self._quotes[positions, i] for i, name in enumerate(QUOTE_FIELDS)}
+        values['momentum_20d'] = self._momentum[positions]
+        return ScoreColumns(values, {name: np.isnan(column) for name, column in values.items()})
+
+    async def _rescore(self, session, positions: np.ndarray):
+        """对行情变化的股票重新计算动量和评分, 并更新排名索引"""
+        cols = self._columns(positions)
+        eligible = self.engine.pe_mask(cols) & self.engine.additional_mask(cols)
+
+        # 第一次通过筛选的股票获取历史K线, 确定动量窗口起点
+        pending = positions[eligible & ~self._anchor_loaded[positions]]
+        if len(pending):
+            await self._load_anchors(session, pending)
+
+        price = self._quotes[positions, QUOTE_FIELDS.index('price')]
+        anchors = self._anchors[positions]
+        valid = (anchors > 0) & (price > 0)
+        self._momentum[positions] = np.where(valid, (price / np.where(valid, anchors, 1) - 1) * 100, 0.0)
+
+        cols.values['momentum_20d'] = self._momentum[positions]
+        scores = score_columns(cols)
+        self._totals[positions] = scores['total']
+        self._grades[positions] = scores['grade']
+
+        ranked = eligible & (scores['total'] >= self.stock_filter.config.get('min_strength_score', 45))
+        for position, total, keep in zip(positions.tolist(), scores['total'].tolist(), ranked.tolist()):
+            if keep:
+                self.index.update(position, total)
+            else:
+                self.index.discard(position)
+
+    async def _load_anchors(self, session, positions: np.ndarray):
+        today = self._anchor_date
+        histories = await asyncio.gather(*[
+            self.fetcher.get_stock_historical_data(session, self.codes[position], days=30)
+            for position in positions.tolist()
+        ])
+        for position, history in zip(positions.tolist(), histories):
+            self._anchors[position] = momentum_anchor(history, today)
+        self._anchor_loaded[positions] = True
+        logger.info(f"获取动量起点: {int((~np.isnan(self._anchors[positions])).sum())}/{len(positions)} 只")
+
+    def _diff_top(self) -> List[RankEvent]:
+        """比较前K名与上一轮的差异"""
+        current = {position: (rank, score)
+                   for rank, (position, score) in enumerate(self.index.top(self.top_k), start=1)}
+        events = []
+        for position, (rank, score) in current.items():
+            previous = self._top.get(position)
+            if previous is None:
+                events.append(RankEvent('enter', self.codes[position], self._names[position], rank, None, score))
+            elif previous[0] != rank:
+                events.append(RankEvent('move', self.codes[position], self._names[position],
+                                        rank, previous[0], score, previous[1]))
+        for position, (rank, score) in self._top.items():
+            if position not in current:
+                events.append(RankEvent('exit', self.codes[position], self._names[position],
+                                        None, rank, int(self._totals[position]), score))
+        self._top = current
+        return events
+
+    # ---------- 查询 ----------
+
+    def ranking(self, k: int = None) -> List[Dict]:
+        """当前前k名 (默认 top_k), 字段与盘后分析的推荐股票一致"""
+        if self.codes is None:
+            return []
+        result = []
+        for rank, (position, score) in enumerate(self.index.top(k or self.top_k), start=1):
+            quote = {name: (None if np.isnan(value) else value)
+                     for name, value in zip(QUOTE_FIELDS, self._quotes[position].tolist())}
+            result.append(dict(
+                quote,
+                rank=rank,
+                code=self.codes[position],
+                name=self._names[position],
+                momentum_20d=float(self._momentum[position]),
+                strength_score=score,
+                strength_grade=self._grades[position],
+            ))
+        return result
+
+    # ---------- 运行 ----------
+
+    async def run(self, interval: float = None, max_polls: int = None):
+        """
+        持续轮询, 直到 max_polls 轮或被取消
+
+        集合竞价和连续竞价时段每 interval 秒一轮; 休市期间行情不变, 等到下一时段开始再轮询。
+        """
+        interval = interval or LIVE_RANKING_CONFIG.get('poll_interval', 5)
+        async with self.fetcher.transport.create_session(total_timeout=30, read_timeout=10) as session:
+            while max_polls is None or self.polls < max_polls:
+                start = time.monotonic()
+                phase, end = market_phase()
+                if self.polls and phase not in (CONTINUOUS, CALL_AUCTION):
+                    wait = max(interval, (end - market_now()).total_seconds())
+                    logger.info(f"休市中, {end:%m-%d %H:%M} 恢复轮询")
+                    await asyncio.sleep(wait)
+                    continue
+
+                await self.poll_once(session)
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - start)))
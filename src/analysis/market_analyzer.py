@@ -7,8 +7,14 @@ import json
 import os
 
 from src.data.data_fetcher import StockDataFetcher
-from src.data.async_data_fetcher import batch_get_stock_data_sync, get_market_overview_sync
+from src.data.async_data_fetcher import (
+    batch_get_stock_data_sync, get_market_overview_sync, get_market_snapshot_sync
+)
+from src.data.history_cache import get_history_cache
+from src.data.universe import get_universe
+from src.data.factor_store import get_factor_store, snapshot_date
 from src.analysis.stock_filter import StockFilter
+from src.monitoring.tracing import trace, span, current_span
 from config.config import STOCK_FILTER_CONFIG, DATA_CONFIG
 
 logger = logging.getLogger(__name__)
@@ -21,102 +27,94 @@ class MarketAnalyzer:
         Args:
             use_async: 是否使用异步数据获取器 (默认True,大幅提升性能)
         """
-        self.data_fetcher = StockDataFetcher()
+        self.history_cache = get_history_cache()  # 与数据获取器共享, 重复分析时复用K线
+        self.data_fetcher = StockDataFetcher(history_cache=self.history_cache)
         self.stock_filter = StockFilter()
         self.analysis_results = {}
         self.use_async = use_async
 
     def _load_csi300_stocks(self) -> pd.DataFrame:
-        """加载沪深300成分股列表 - 优先使用本地缓存"""
+        """加载沪深300成分股列表 - 股票池注册表 (优先本地文件, 不存在时在线获取并保存)"""
         try:
-            # 方法1: 从本地JSON文件加载(快速)
-            local_file = './data/csi300_stocks.json'
-            if os.path.exists(local_file):
-                logger.info("从本地文件加载沪深300成分股列表...")
-                with open(local_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    stocks = data['stocks']
-                    logger.info(f"成功从本地加载 {len(stocks)} 只沪深300成分股 (更新日期: {data.get('update_date', '未知')})")
-                    return pd.DataFrame(stocks)
-
-            # 方法2: 使用akshare在线获取(慢速,作为备用)
-            logger.warning("本地文件不存在,尝试在线获取沪深300成分股列表(可能较慢)...")
-            import akshare as ak
-            csi300_stocks = ak.index_stock_cons(symbol="000300")
-            if not csi300_stocks.empty:
-                logger.info(f"在线获取成功: {len(csi300_stocks)} 只")
-                # 保存到本地以便下次使用
-                result = pd.DataFrame({
-                    'code': csi300_stocks['品种代码'].tolist(),
-                    'name': csi300_stocks['品种名称'].tolist()
-                })
-                # 保存到本地
-                os.makedirs('./data', exist_ok=True)
-                save_data = {
-                    'update_date': datetime.now().strftime('%Y-%m-%d'),
-                    'note': '沪深300成分股列表 - 自动生成',
-                    'stocks': result.to_dict('records')
-                }
-                with open(local_file, 'w', encoding='utf-8') as f:
-                    json.dump(save_data, f, ensure_ascii=False, indent=2)
-                logger.info(f"已保存到本地文件: {local_file}")
-                return result
-
-            logger.error("无法获取沪深300成分股列表")
-            return pd.DataFrame()
+            result = get_universe().csi300_frame()
+            if result.empty:
+                logger.error("无法获取沪深300成分股列表")
+            return result
 
         except Exception as e:
             logger.error(f"加载沪深300成分股列表失败: {e}")
             return pd.DataFrame()
 
     def run_daily_analysis(self) -> Dict:
-        """执行每日盘后分析"""
+        """执行每日盘后分析 (各阶段耗时写入trace文件, 见 src/monitoring/tracing.py)"""
         logger.info("开始执行盘后分析...")
 
+        with trace('run_daily_analysis', mode='async' if self.use_async else 'sync'):
+            return self._run_daily_analysis()
+
+    def _run_daily_analysis(self) -> Dict:
         try:
             # 1. 获取沪深300成分股列表（优先使用本地缓存）
-            a_share_list = self._load_csi300_stocks()
+            with span('universe') as s:
+                a_share_list = self._load_csi300_stocks()
+                s.set(count=len(a_share_list))
             if a_share_list.empty:
                 logger.error("无法获取沪深300成分股列表")
                 return {}
 
             logger.info(f"开始分析沪深300成分股，共 {len(a_share_list)} 只")
 
+            # 2. 全市场行情快照: 下面的行情阶段和市场概况都直接读取, 不再分别请求
+            with span('market_snapshot') as s:
+                snapshot = get_market_snapshot_sync() if self.use_async else self.data_fetcher.get_market_snapshot()
+                s.set(count=len(snapshot))
+
             # 3. 批量获取股票数据
             stock_codes = a_share_list['code'].tolist()
 
-            if self.use_async:
-                # 使用异步获取器 - 大幅提升性能
-                logger.info("使用异步批量获取模式 (性能优化)")
-                all_stock_data = batch_get_stock_data_sync(
-                    stock_codes,
-                    calculate_momentum=True,
-                    include_fundamental=True,
-                    max_concurrent=20  # 可以调整并发数
-                )
-            else:
-                # 使用原有的同步方式 - 兼容模式
-                logger.info("使用同步批量获取模式 (兼容模式)")
-                batch_size = 100
-                all_stock_data = []
-
-                for i in range(0, len(stock_codes), batch_size):
-                    batch = stock_codes[i:i+batch_size]
-                    logger.info(f"处理第 {i//batch_size + 1} 批股票，共 {len(batch)} 只")
-
-                    batch_data = self.data_fetcher.batch_get_stock_data(batch)
-                    all_stock_data.extend(batch_data)
+            # 行情、基本面、历史K线在获取器内部按流水线并发执行, 各自的累计耗时汇总在这个span下
+            with span('stock_data', requested=len(stock_codes)) as s:
+                if self.use_async:
+                    # 使用异步获取器 - 大幅提升性能
+                    logger.info("使用异步批量获取模式 (性能优化)")
+                    all_stock_data = batch_get_stock_data_sync(
+                        stock_codes,
+                        calculate_momentum=True,
+                        include_fundamental=True,
+                        max_concurrent=20,  # 可以调整并发数
+                        history_cache=self.history_cache
+                    )
+                else:
+                    # 使用同步方式 - 兼容模式 (线程池并行, 不依赖aiohttp)
+                    max_workers = DATA_CONFIG.get('sync_max_workers', 8)
+                    logger.info(f"使用同步批量获取模式 (兼容模式, 线程数: {max_workers})")
+                    all_stock_data = self.data_fetcher.batch_get_stock_data(
+                        stock_codes, max_workers=max_workers
+                    )
+                s.set(count=len(all_stock_data))
 
             logger.info(f"成功获取 {len(all_stock_data)} 只股票的数据")
+            cache_stats = self.history_cache.stats()
+            logger.info(f"历史K线缓存: {cache_stats['entries']} 条, 命中率 {cache_stats['hit_rate']:.1%}")
+
+            # 收盘后保存当天的因子快照, 供回测按历史日期读取 (盘中行情尚未定格, 不保存)
+            with span('factor_snapshot') as s:
+                day = snapshot_date()
+                if day:
+                    get_factor_store().record(day, all_stock_data)
+                s.set(date=day or '')
 
             # 4. 筛选股票
-            selected_stocks = self.stock_filter.select_top_stocks(all_stock_data)
+            with span('scoring', count=len(all_stock_data)) as s:
+                selected_stocks = self.stock_filter.select_top_stocks(all_stock_data)
+                s.set(selected=len(selected_stocks))
 
             # 5. 获取市场概况
-            if self.use_async:
-                market_overview = get_market_overview_sync()
-            else:
-                market_overview = self.data_fetcher.get_market_overview()
+            with span('market_overview'):
+                if self.use_async:
+                    market_overview = get_market_overview_sync()
+                else:
+                    market_overview = self.data_fetcher.get_market_overview()
 
             # 6. 生成分析结果
             analysis_result = {
@@ -130,10 +128,12 @@ class MarketAnalyzer:
             }
 
             # 7. 保存分析结果
-            self._save_analysis_result(analysis_result)
+            with span('save_json'):
+                self._save_analysis_result(analysis_result)
 
             # 8. 自动生成Markdown报告
-            self._generate_markdown_report(analysis_result)
+            with span('markdown_report'):
+                self._generate_markdown_report(analysis_result)
 
             logger.info("盘后分析完成")
             return analysis_result
@@ -225,6 +225,7 @@ class MarketAnalyzer:
             filename = f"./logs/analysis/analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+            current_span().set(bytes=os.path.getsize(filename))
 
             logger.info(f"分析结果已保存到: {filename}")
             return True
@@ -269,7 +270,7 @@ class MarketAnalyzer:
             selected_stocks = latest_analysis.get('selected_stocks', [])
             current_data = []
 
-            # 获取当前价格
+            # 获取当前价格 (逐只请求入选股票; 已有未过期的全市场快照时直接读取, 不触发全市场扫描)
             for stock in selected_stocks:
                 current_stock_data = self.data_fetcher.get_stock_realtime_data(stock['code'])
                 if current_stock_data:
@@ -477,6 +478,7 @@ class MarketAnalyzer:
             output_file = f"./reports/{date_cn}沪深300分析结果.md"
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(md_content)
+            current_span().set(bytes=os.path.getsize(output_file))
 
             logger.info(f"Markdown报告已生成: {output_file}")
             return True
@@ -0,0 +1,278 @@
+"""
+面板回测引擎
+
+一次加载 日期 × 股票 的日线矩阵 (收盘价、涨跌幅、换手率、成交量、成交额), 对全部回测日同时计算
+动量、评分、选股和持有期收益, 不再逐日逐只下载K线、构造字典和重新筛选。
+
+结果与逐日回测 (run_backtest_optimized.py 的 backtest_single_day) 一致:
+- 某日的数据取该日及之前 LOOKBACK_DAYS 天内的最后一根K线, 窗口内没有K线的股票当天缺失
+- 动量: 窗口内K线不少于20根时取最近20根首尾收盘价之比, 否则取窗口首尾之比
+- 评分、筛选和排名使用列式评分引擎 (与 StockFilter 规则一致), 同分按股票顺序排列
+- 传入时点因子面板时, 每个回测日使用当日快照的PE/PB/ROE/净利润增长率/股息率 (快照缺失时同逐日回测的默认值)
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.scoring_engine import ScoreColumns, ScoringEngine, score_columns, score_details
+from src.data.factor_store import FactorPanel
+
+logger = logging.getLogger(__name__)
+
+LOOKBACK_DAYS = 35  # 逐日回测每次下载K线的回看天数
+MOMENTUM_BARS = 20
+DEFAULT_PE_RATIO = 20.0  # 没有PE数据时逐日回测使用的默认值
+MIN_STOCKS = 10  # 当天有数据的股票少于该数时不选股
+
+# akshare stock_zh_a_hist 列名 -> 面板字段
+HISTORY_COLUMNS = {
+    '收盘': 'close',
+    '涨跌幅': 'change_pct',
+    '换手率': 'turnover_rate',
+    '成交量': 'volume',
+    '成交额': 'amount',
+}
+
+
+class PricePanel:
+    """
+    日线面板: 每只股票的K线按各自的交易日存放 (停牌日不占位置), 按日期查询时逐列二分查找
+    """
+
+    def __init__(self, codes: List[str], dates: List[np.ndarray], values: Dict[str, np.ndarray]):
+        """
+        Args:
+            codes: 股票代码
+            dates: 每只股票的K线日期 (datetime64[D], 升序)
+            values: 字段 -> (最大K线数 × 股票数) 矩阵, 不足部分为NaN
+        """
+        self.codes = codes
+        self.dates = dates
+        self.values = values
+        self.lengths = np.array([len(d) for d in dates], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_histories(cls, histories: Dict[str, pd.DataFrame]) -> 'PricePanel':
+        """
+        由每只股票的日线构建面板
+
+        Args:
+            histories: 股票代码 -> akshare stock_zh_a_hist 格式的DataFrame (日期/收盘/涨跌幅/换手率/成交量/成交额)
+        """
+        codes = [code for code, frame in histories.items() if frame is not None and not frame.empty]
+        frames = [histories[code].sort_values('日期') for code in codes]
+        rows = max((len(frame) for frame in frames), default=0)
+
+        dates = [pd.to_datetime(frame['日期']).to_numpy().astype('datetime64[D]') for frame in frames]
+        values = {}
+        for column, name in HISTORY_COLUMNS.items():
+            matrix = np.full((rows, len(codes)), np.nan)
+            for j, frame in enumerate(frames):
+                if column in frame.columns:
+                    matrix[:len(frame), j] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+            values[name] = matrix
+        return cls(codes, dates, values)
+
+    def locate(self, days: List[str]):
+        """
+        各回测日在每只股票K线中的位置
+
+        Returns:
+            (last, window): 日期 × 股票 矩阵; last 为该日及之前最后一根K线的下标,
+            window 为 [该日 - LOOKBACK_DAYS, 该日] 内的K线数 (0表示当天缺失)
+        """
+        query = np.array(days, dtype='datetime64[D]')
+        window_start = query - np.timedelta64(LOOKBACK_DAYS, 'D')
+        last = np.empty((len(query), len(self.codes)), dtype=np.int64)
+        window = np.empty_like(last)
+        for j, dates in enumerate(self.dates):
+            end = np.searchsorted(dates, query, side='right')
+            last[:, j] = end - 1
+            window[:, j] = end - np.searchsorted(dates, window_start, side='left')
+        return last, window
+
+    def take(self, field: str, index: np.ndarray) -> np.ndarray:
+        """按 (日期 × 股票) 的K线下标取字段值, 下标为负时为NaN"""
+        matrix = self.values[field]
+        columns = np.broadcast_to(np.arange(len(self.codes)), index.shape)
+        result = matrix[np.clip(index, 0, None), columns]
+        return np.where(index >= 0, result, np.nan)
+
+    def as_of(self, days: List[str]) -> Dict[str, np.ndarray]:
+        """
+        各回测日每只股票的行情和动量 (日期 × 股票 矩阵)
+
+        Returns:
+            {'present', 'price', 'change_pct', 'turnover_rate', 'volume', 'amount', 'momentum_20d'}
+        """
+        last, window = self.locate(days)
+        present = window > 0
+
+        close = self.take('close', last)
+        # 窗口内K线足够时取最近20根的首根, 否则取窗口首根
+        first = np.where(window >= MOMENTUM_BARS, last - (MOMENTUM_BARS - 1), last - window + 1)
+        base = self.take('close', np.where(window >= 2, first, -1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            momentum = np.where(window >= 2, (close / base - 1) * 100, 0.0)
+
+        return {
+            'present': present,
+            'price': close,
+            'change_pct': self.take('change_pct', last),
+            'turnover_rate': self.take('turnover_rate', last),
+            'volume': self.take('volume', last),
+            'amount': self.take('amount', last),
+            'momentum_20d': momentum,
+        }
+
+
+class PanelBacktest:
+    """在价格面板上对多个回测日同时选股并计算持有期收益"""
+
+    def __init__(self, panel: PricePanel, config: Dict, pe_ratios: Dict[str, float] = None,
+                 names: Dict[str, str] = None, factors: FactorPanel = None):
+        """
+        Args:
+            panel: 价格面板 (股票顺序即同分时的排序顺序)
+            config: 筛选配置 (同 StockFilter)
+            pe_ratios: 股票代码 -> 当前PE; 缺失或不为正时使用 DEFAULT_PE_RATIO
+            names: 股票代码 -> 名称
+            factors: 时点因子面板; 快照中的PE为正时优先于 pe_ratios
+        """
+        self.panel = panel
+        self.engine = ScoringEngine(config)
+        self.names = names or {}
+        self.factors = factors
+        pe_ratios = pe_ratios or {}
+        self.pe = np.array([pe_ratios.get(code) or DEFAULT_PE_RATIO for code in panel.codes], dtype=np.float64)
+        self.pe[~(self.pe > 0)] = DEFAULT_PE_RATIO
+
+    def _columns(self, quotes: Dict[str, np.ndarray], fundamentals: Dict[str, np.ndarray] = None) -> ScoreColumns:
+        """把 日期 × 股票 矩阵展开为一张评分表 (回测记录中没有的字段按0处理, 与逐日回测的字典一致)"""
+        shape = quotes['price'].shape
+        pe = np.broadcast_to(self.pe, shape)
+        if fundamentals is not None:
+            pe = np.where(fundamentals['pe_ratio'] > 0, fundamentals['pe_ratio'], pe)
+        values = {
+            'price': quotes['price'].ravel(),
+            'change_pct': quotes['change_pct'].ravel(),
+            'momentum_20d': quotes['momentum_20d'].ravel(),
+            'turnover_rate': quotes['turnover_rate'].ravel(),
+            'pe_ratio': pe.ravel(),
+        }
+        for name in ('pb_ratio', 'roe', 'profit_growth', 'dividend_yield'):
+            if fundamentals is not None:
+                values[name] = np.nan_to_num(fundamentals[name], nan=0.0).ravel()
+            else:
+                values[name] = np.zeros(values['price'].shape)
+        # 逐日回测的字典由K线行直接转换, 不含None; 当天缺失的股票由 present 排除
+        return ScoreColumns(values, {name: np.zeros(column.shape, dtype=bool) for name, column in values.items()})
+
+    def run(self, days: List[str], sell_day: Callable[[str], str], hold_days: int = 1) -> List[Optional[Dict]]:
+        """
+        对每个回测日选股并计算收益
+
+        Args:
+            days: 回测日期 (YYYY-MM-DD)
+            sell_day: 回测日 -> 卖出日
+            hold_days: 持有天数 (写入结果)
+
+        Returns:
+            与回测日一一对应的结果, 结构与 backtest_single_day 相同; 当天数据不足时为None
+        """
+        if not days:
+            return []
+        count = len(self.panel)
+        buy = self.panel.as_of(days)
+        sell_days = [sell_day(day) for day in days]
+        sell = self.panel.as_of(sell_days)
+
+        fundamentals = self.factors.take(days, self.panel.codes) if self.factors is not None else None
+        cols = self._columns(buy, fundamentals)
+        pe = cols.values['pe_ratio'].reshape(buy['price'].shape)
+        scores = pd.DataFrame(score_columns(cols))
+        eligible = self.engine.pe_mask(cols) & self.engine.additional_mask(cols) & buy['present'].ravel()
+
+        results = []
+        for i, day in enumerate(days):
+            present = buy['present'][i]
+            if present.sum() < MIN_STOCKS:
+                logger.warning(f"{day}: 有数据的股票只有 {int(present.sum())} 只, 跳过")
+                results.append(None)
+                continue
+
+            rows = slice(i * count, (i + 1) * count)
+            day_scores = scores.iloc[rows].reset_index(drop=True)
+            selected = self.engine.rank(day_scores, eligible[rows])[:self.engine.config['max_stocks']]
+            if len(selected) == 0:
+                results.append({'analysis_date': day, 'selected_count': 0, 'performance': []})
+                continue
+
+            performance = []
+            for position, detail in zip(selected.tolist(), score_details(day_scores, selected)):
+                if not sell['present'][i, position]:
+                    continue
+                buy_price = float(buy['price'][i, position])
+                sell_price = float(sell['price'][i, position])
+                momentum = float(buy['momentum_20d'][i, position])
+                breakdown = detail['breakdown']
+                performance.append({
+                    'code': self.panel.codes[position],
+                    'name': self.names.get(self.panel.codes[position], f'股票{self.panel.codes[position]}'),
+                    'buy_price': buy_price,
+                    'sell_price': sell_price,
+                    'return_pct': (sell_price / buy_price - 1) * 100,
+                    'pe_ratio': float(pe[i, position]),
+                    'strength_score': detail['total'],
+                    'momentum_20d': momentum,
+                    'momentum_positive': momentum >= 0,
+                    'score_technical': breakdown['technical'],
+                    'score_valuation': breakdown['valuation'],
+                    'score_profitability': breakdown['profitability'],
+                    'score_safety': breakdown['safety'],
+                    'score_dividend': breakdown['dividend'],
+                })
+            results.append(summarize_day(day, sell_days[i], hold_days, len(selected), performance))
+        return results
+
+
+def summarize_day(analysis_date: str, sell_date: str, hold_days: int, selected_count: int,
+                  performance: List[Dict]) -> Dict:
+    """单个回测日的结果 (结构与 backtest_single_day 相同)"""
+    avg_return = max_return = min_return = win_rate = win_count = 0
+    if performance:
+        returns = [p['return_pct'] for p in performance]
+        avg_return = sum(returns) / len(returns)
+        max_return = max(returns)
+        min_return = min(returns)
+        win_count = len([r for r in returns if r > 0])
+        win_rate = win_count / len(returns) * 100
+    return {
+        'analysis_date': analysis_date,
+        'sell_date': sell_date,
+        'hold_days': hold_days,
+        'selected_count': selected_count,
+        'performance': performance,
+        'summary': {
+            'avg_return': avg_return,
+            'max_return': max_return,
+            'min_return': min_return,
+            'win_rate': win_rate,
+            'win_count': win_count,
+            'total_count': len(performance)
+        }
+    }
+
+
+def history_span(days: List[str], sell_days: List[str]) -> Tuple[str, str]:
+    """覆盖全部回测日和卖出日所需的K线日期范围 (YYYYMMDD, 含回看窗口)"""
+    start = datetime.strptime(min(days), '%Y-%m-%d') - timedelta(days=LOOKBACK_DAYS)
+    end = datetime.strptime(max(sell_days), '%Y-%m-%d')
+    return start.strftime('%Y%m%d'), end.strftime('%Y%m%d')
@@ -0,0 +1,220 @@
+"""
+列式评分引擎
+
+与 StockFilter.calculate_strength_score 的逐只评分规则完全一致, 但对整个股票池按列计算:
+每个子项都是分箱查表 (np.searchsorted), 筛选条件是布尔掩码, 最后一次稳定排序得到排名。
+全市场5000+只股票评分只需几毫秒; 评分与筛选参数无关, 换参数重新筛选时可复用评分结果。
+
+缺失值语义与逐只评分相同: 字典中的None(或DataFrame中的NaN)视为缺失,
+涨跌幅或动量缺失时逐只评分会抛出异常并记0分, 这里同样记0分、评级D。
+"""
+
+import logging
+import numbers
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SCORE_FIELDS = ('change_pct', 'momentum_20d', 'turnover_rate', 'pe_ratio', 'pb_ratio',
+                'roe', 'profit_growth', 'dividend_yield', 'price')
+BREAKDOWN_KEYS = ('technical', 'valuation', 'profitability', 'safety', 'dividend')
+
+_GRADE_THRESHOLDS = (85, 75, 65, 55, 45)
+_GRADES = ('A+', 'A', 'B+', 'B', 'C')
+
+# PR在这些分界点附近时按Python round()重新取整, 保证与逐只评分的分箱结果一致
+_PR_EDGES = np.array([0.0, 0.8, 1.0, 1.2])
+
+
+class ScoreColumns:
+    """评分所需的各列: 数值数组(缺失为NaN) + 缺失掩码"""
+
+    def __init__(self, values: Dict[str, np.ndarray], missing: Dict[str, np.ndarray]):
+        self.values = values
+        self.missing = missing
+
+    def __len__(self) -> int:
+        return len(self.values['price'])
+
+    @classmethod
+    def from_records(cls, stocks: List[Dict]) -> Optional['ScoreColumns']:
+        """
+        从股票字典列表构建 (键不存在时按0处理, 与逐只评分的 dict.get(key, 0) 一致)
+
+        Returns:
+            ScoreColumns; 存在非数值字段(如字符串)时返回None, 由调用方改用逐只评分
+        """
+        values, missing = {}, {}
+        for field in SCORE_FIELDS:
+            column = [stock.get(field, 0) for stock in stocks]
+            types = set(map(type, column))
+            if not all(t is type(None) or issubclass(t, numbers.Real) for t in types):
+                return None
+            # None 转换后为NaN; 只有出现None时才需要逐个区分缺失值和真正的NaN
+            values[field] = np.array(column, dtype=np.float64)
+            if type(None) in types:
+                missing[field] = np.array([v is None for v in column], dtype=bool)
+            else:
+                missing[field] = np.zeros(len(column), dtype=bool)
+        return cls(values, missing)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'ScoreColumns':
+        """从列式行情表构建 (NaN视为缺失, 与 quote_table_to_records 转成None后的结果一致; 没有的列按0处理)"""
+        values, missing = {}, {}
+        for field in SCORE_FIELDS:
+            if field in frame.columns:
+                column = pd.to_numeric(frame[field], errors='coerce').to_numpy(dtype=np.float64)
+            else:
+                column = np.zeros(len(frame))
+            values[field] = column
+            missing[field] = np.isnan(column)
+        return cls(values, missing)
+
+
+def _points_above(x: np.ndarray, thresholds, points) -> np.ndarray:
+    """x 大于 thresholds[i] 时得 points[i] (thresholds 升序, 取满足的最高档), NaN得0分"""
+    table = np.array((0,) + tuple(points), dtype=np.int64)
+    result = table[np.searchsorted(np.asarray(thresholds, dtype=np.float64), x, side='left')]
+    result[np.isnan(x)] = 0
+    return result
+
+
+def _points_between(x: np.ndarray, edges, points) -> np.ndarray:
+    """edges[i-1] <= x < edges[i] 时得 points[i-1]; 只有 x > 0 才得分 (与 `x and ...` 判断一致)"""
+    table = np.array((0,) + tuple(points) + (0,), dtype=np.int64)
+    result = table[np.searchsorted(np.asarray(edges, dtype=np.float64), x, side='right')]
+    result[~(x > 0)] = 0
+    return result
+
+
+def pr_ratio(pe: np.ndarray, roe: np.ndarray) -> np.ndarray:
+    """市赚率 PR = PE / (100 * ROE), 保留3位小数; PE或ROE不为正时为0 (同 StockFilter.calculate_pr_ratio)"""
+    valid = (pe > 0) & (roe > 0)
+    raw = np.zeros(len(pe))
+    raw[valid] = pe[valid] / (100 * roe[valid])
+    pr = np.round(raw, 3)
+
+    # np.round 与 Python round() 在极少数 .xxx5 的值上结果不同, 只有分界点附近的值会影响得分
+    near = valid & (np.abs(raw[:, None] - _PR_EDGES[None, :]) <= 6e-4).any(axis=1)
+    for i in np.flatnonzero(near):
+        pr[i] = round(float(raw[i]), 3)
+    return pr
+
+
+def score_columns(cols: ScoreColumns) -> Dict[str, np.ndarray]:
+    """
+    计算各子项得分、总分和评级
+
+    Returns:
+        {'technical', 'valuation', 'profitability', 'safety', 'dividend', 'total': int数组, 'grade': 字符串数组}
+    """
+    v = cols.values
+    change, momentum, turnover = v['change_pct'], v['momentum_20d'], v['turnover_rate']
+    pe, pb, roe, growth, div = v['pe_ratio'], v['pb_ratio'], v['roe'], v['profit_growth'], v['dividend_yield']
+
+    # 1. 技术面 (30分): 涨跌幅 + 动量 + 流动性(换手率)
+    change_points = _points_above(change, (-2, 0, 2, 5), (2, 4, 7, 10))
+    technical = (change_points
+                 + _points_above(momentum, (0, 5, 10, 15), (4, 8, 12, 15))
+                 + _points_between(turnover, (0.5, 1, 3, 5, 8), (2, 5, 4, 3, 1)))
+
+    # 2. 估值 (25分): PE + PB + PR
+    valuation = (_points_between(pe, (0, 10, 20, 30), (10, 7, 4))
+                 + _points_between(pb, (0, 2, 4, 7, 10), (10, 8, 5, 2))
+                 + _points_between(pr_ratio(pe, roe), (0, 0.8, 1, 1.2), (5, 3, 2)))
+
+    # 3. 盈利质量 (30分): ROE + 净利润增长率
+    profitability = (_points_above(roe, (5, 10, 15, 20), (4, 8, 12, 15))
+                     + _points_above(growth, (0, 10, 20, 30), (4, 8, 12, 15)))
+
+    # 4. 安全性 (10分): PB安全边际 + 股息率稳定性 + 换手率波动性
+    safety = (_points_between(pb, (0, 1.0, 1.5, 2.5), (3, 2, 1))
+              + _points_above(div, (1, 3, 5), (1, 2, 3))
+              + _points_between(turnover, (0, 2, 5, 10), (4, 3, 1)))
+
+    # 5. 分红 (5分)
+    dividend = _points_above(div, (0.5, 1, 2, 3, 5), (1, 2, 3, 4, 5))
+
+    total = technical + valuation + profitability + safety + dividend
+
+    # 涨跌幅/动量缺失: 逐只评分在比较时抛出异常, 总分记0; 此前已累计的子项保留
+    change_missing = cols.missing['change_pct']
+    momentum_missing = cols.missing['momentum_20d'] & ~change_missing
+    failed = change_missing | momentum_missing
+    technical = np.where(change_missing, 0, np.where(momentum_missing, change_points, technical))
+    for part in (valuation, profitability, safety, dividend):
+        part[failed] = 0
+    total[failed] = 0
+
+    grade = np.select([total >= t for t in _GRADE_THRESHOLDS], _GRADES, default='D')
+    return {
+        'technical': technical,
+        'valuation': valuation,
+        'profitability': profitability,
+        'safety': safety,
+        'dividend': dividend,
+        'total': total,
+        'grade': grade,
+    }
+
+
+class ScoringEngine:
+    """按列评分、筛选和排名 (规则与 StockFilter 的逐只方法一致)"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+
+    def score(self, cols: ScoreColumns) -> pd.DataFrame:
+        """各子项得分、总分和评级 (每只股票一行, 与输入顺序一致)"""
+        return pd.DataFrame(score_columns(cols))
+
+    def pe_mask(self, cols: ScoreColumns) -> np.ndarray:
+        """同 filter_by_pe_ratio: 0 < PE <= max_pe_ratio"""
+        pe = cols.values['pe_ratio']
+        return (pe > 0) & (pe <= self.config['max_pe_ratio'])
+
+    def additional_mask(self, cols: ScoreColumns) -> np.ndarray:
+        """同 apply_additional_filters: 排除停牌、低价、低换手和跌停股票"""
+        v, missing = cols.values, cols.missing
+        price, turnover, change = v['price'], v['turnover_rate'], v['change_pct']
+        min_turnover_rate = self.config.get('min_turnover_rate', 0.5)
+
+        suspended = (change == 0) & (missing['turnover_rate'] | (turnover < 0.1))
+        excluded = (suspended
+                    | missing['price'] | (price < self.config['min_price'])
+                    | missing['turnover_rate'] | (turnover < min_turnover_rate)
+                    | missing['change_pct'] | (change <= -9.8))
+        return ~excluded
+
+    def rank(self, scores: pd.DataFrame, eligible: np.ndarray) -> np.ndarray:
+        """
+        通过筛选且总分不低于 min_strength_score 的股票, 按总分从高到低排列
+
+        Returns:
+            股票位置的数组; 同分时保持输入顺序 (与逐只筛选的稳定排序一致)
+        """
+        total = scores['total'].to_numpy()
+        candidates = np.flatnonzero(eligible & (total >= self.config.get('min_strength_score', 45)))
+        return candidates[np.argsort(-total[candidates], kind='stable')]
+
+    def select(self, cols: ScoreColumns, scores: pd.DataFrame = None) -> np.ndarray:
+        """完整的筛选排名流程, 返回前 max_stocks 只股票的位置 (scores 可传入已计算的评分, 用于参数扫描)"""
+        scores = self.score(cols) if scores is None else scores
+        eligible = self.pe_mask(cols) & self.additional_mask(cols)
+        return self.rank(scores, eligible)[:self.config['max_stocks']]
+
+
+def score_details(scores: pd.DataFrame, positions) -> List[Dict]:
+    """指定股票的评分明细 (结构与 calculate_strength_score 的返回值相同)"""
+    positions = np.asarray(positions, dtype=np.int64)
+    totals = scores['total'].to_numpy()[positions].tolist()
+    grades = scores['grade'].to_numpy()[positions].tolist()
+    parts = {key: scores[key].to_numpy()[positions].tolist() for key in BREAKDOWN_KEYS}
+    return [
+        {'total': total, 'breakdown': {key: parts[key][i] for key in BREAKDOWN_KEYS}, 'grade': grade}
+        for i, (total, grade) in enumerate(zip(totals, grades))
+    ]
@@ -4,6 +4,7 @@ import logging
 from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 from config.config import STOCK_FILTER_CONFIG
+from src.analysis.scoring_engine import ScoreColumns, ScoringEngine, score_details
 
 logger = logging.getLogger(__name__)
 
@@ -302,22 +303,14 @@ class StockFilter:
             stocks_data = list(unique_stocks.values())
             logger.info(f"去重后股票数量: {len(stocks_data)}")
 
-            # 1. 首先按PE筛选
-            pe_filtered = self.filter_by_pe_ratio(stocks_data)
+            cols = ScoreColumns.from_records(stocks_data)
+            if cols is None:
+                # 存在非数值字段时按原有逐只流程筛选
+                final_selection = self._select_top_stocks_per_stock(stocks_data)
+            else:
+                final_selection = self._select_top_stocks_columnar(stocks_data, cols)
 
-            # 2. 应用额外筛选条件
-            additional_filtered = self.apply_additional_filters(pe_filtered)
-
-            # 3. 按强势筛选并排序
-            strength_filtered = self.filter_by_strength(additional_filtered)
-
-            # 4. 直接按分数排序，不限制行业
-            strength_filtered.sort(key=lambda x: x['strength_score'], reverse=True)
-
-            # 5. 选择前N只股票
-            final_selection = strength_filtered[:self.config['max_stocks']]
-
-            # 6. 添加选择理由和排名
+            # 添加选择理由和排名
             for i, stock in enumerate(final_selection):
                 stock['rank'] = i + 1
                 stock['selection_reason'] = self._generate_selection_reason(stock)
@@ -329,6 +322,36 @@ class StockFilter:
             logger.error(f"股票选择失败: {e}")
             return []
 
+    def _select_top_stocks_columnar(self, stocks_data: List[Dict], cols: ScoreColumns) -> List[Dict]:
+        """列式评分引擎: 一次计算全部股票的评分和筛选掩码, 结果与逐只流程一致"""
+        engine = ScoringEngine(self.config)
+        scores = engine.score(cols)
+
+        pe_mask = engine.pe_mask(cols)
+        logger.info(f"PE筛选后剩余 {int(pe_mask.sum())} 只股票")
+        eligible = pe_mask & engine.additional_mask(cols)
+        logger.info(f"附加筛选后剩余 {int(eligible.sum())} 只股票")
+
+        # 与 filter_by_strength 相同, 通过筛选的股票都保存评分
+        positions = np.flatnonzero(eligible)
+        for position, score_result in zip(positions, score_details(scores, positions)):
+            stock = stocks_data[position]
+            stock['strength_score_detail'] = score_result
+            stock['strength_score'] = score_result['total']
+            stock['strength_grade'] = score_result['grade']
+
+        ranked = engine.rank(scores, eligible)
+        logger.info(f"强势筛选后剩余 {len(ranked)} 只股票")
+        return [stocks_data[position] for position in ranked[:self.config['max_stocks']]]
+
+    def _select_top_stocks_per_stock(self, stocks_data: List[Dict]) -> List[Dict]:
+        """逐只筛选流程: PE -> 附加条件 -> 强势评分排序"""
+        pe_filtered = self.filter_by_pe_ratio(stocks_data)
+        additional_filtered = self.apply_additional_filters(pe_filtered)
+        strength_filtered = self.filter_by_strength(additional_filtered)
+        strength_filtered.sort(key=lambda x: x['strength_score'], reverse=True)
+        return strength_filtered[:self.config['max_stocks']]
+
     def _generate_selection_reason(self, stock: Dict) -> str:
         """生成选择理由 - 包含基本面指标"""
         reasons = []
@@ -0,0 +1,206 @@
+"""
+自适应并发控制
+
+AIMD(加性增/乘性减)并发窗口, 可直接替代 asyncio.Semaphore 使用 (async with limiter)。
+每积累一组请求样本做一次决策:
+- 错误率(超时/非200)超过阈值: 窗口乘以回退系数
+- 中位延迟相对基线明显变大: 窗口小幅收缩
+- 延迟和错误率正常: 窗口加性扩大
+
+get_adaptive_limiter() 返回进程内共享的限制器, 每次 asyncio.run 新建的获取器沿用已经学到的窗口。
+"""
+
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD自适应并发限制器"""
+
+    def __init__(self, initial_limit: int = 20, min_limit: int = 4, max_limit: int = 64,
+                 sample_size: int = 20, latency_tolerance: float = 2.0,
+                 error_threshold: float = 0.05, increase_step: int = 2,
+                 backoff_factor: float = 0.7, name: str = 'async_fetcher'):
+        """
+        Args:
+            initial_limit: 初始并发窗口
+            min_limit: 最小并发窗口
+            max_limit: 最大并发窗口
+            sample_size: 每次决策使用的请求样本数
+            latency_tolerance: 中位延迟超过基线的倍数时视为拥塞
+            error_threshold: 错误率超过该值时乘性回退
+            increase_step: 每次加性增加的窗口大小
+            backoff_factor: 乘性回退系数
+            name: 日志中的名称
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.sample_size = sample_size
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.increase_step = increase_step
+        self.backoff_factor = backoff_factor
+        self.name = name
+
+        # 每个事件循环各自的 [条件变量, 进行中请求数] (窗口大小在各循环之间共享)
+        self._loops = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        self._samples: List[tuple] = []  # (latency, ok)
+        self.baseline_p50: Optional[float] = None
+        self.last_p50: Optional[float] = None
+        self.total_requests = 0
+        self.total_errors = 0
+        self.cuts = 0  # 窗口收缩次数
+        self.decisions = deque(maxlen=100)
+
+    @property
+    def limit(self) -> int:
+        """当前并发窗口"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(state[1] for state in self._loops.values())
+
+    def _loop_state(self) -> list:
+        # 每次 asyncio.run 都是新的事件循环, 窗口大小保留, 同步原语按循环创建
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = self._loops[loop] = [asyncio.Condition(), 0]
+        return state
+
+    async def acquire(self):
+        state = self._loop_state()
+        async with state[0]:
+            await state[0].wait_for(lambda: state[1] < self.limit)
+            state[1] += 1
+
+    async def release(self):
+        state = self._loop_state()
+        async with state[0]:
+            state[1] -= 1
+            state[0].notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def record(self, latency: float, ok: bool):
+        """
+        记录一次请求结果
+
+        Args:
+            latency: 请求耗时(秒)
+            ok: 是否成功 (超时、异常、非200均为失败)
+        """
+        with self._lock:
+            self.total_requests += 1
+            if not ok:
+                self.total_errors += 1
+            self._samples.append((latency, ok))
+            if len(self._samples) >= self.sample_size:
+                self._adjust()
+
+    def _adjust(self):
+        samples, self._samples = self._samples, []
+        latencies = sorted(latency for latency, ok in samples if ok)
+        error_rate = 1 - len(latencies) / len(samples)
+        p50 = latencies[len(latencies) // 2] if latencies else None
+        self.last_p50 = p50
+
+        old_limit = self.limit
+        if error_rate > self.error_threshold or p50 is None:
+            self._limit = max(self.min_limit, self._limit * self.backoff_factor)
+            reason = 'errors'
+        else:
+            # 基线取观察到的最低中位延迟, 并缓慢上浮以适应网络整体变慢
+            if self.baseline_p50 is None or p50 < self.baseline_p50:
+                self.baseline_p50 = p50
+            else:
+                self.baseline_p50 *= 1.02
+
+            if p50 > self.baseline_p50 * self.latency_tolerance:
+                self._limit = max(self.min_limit, self._limit * 0.9)
+                reason = 'latency'
+            else:
+                self._limit = min(self.max_limit, self._limit + self.increase_step)
+                reason = 'healthy'
+
+        new_limit = self.limit
+        if new_limit < old_limit:
+            self.cuts += 1
+        self.decisions.append({
+            'time': time.time(),
+            'reason': reason,
+            'old_limit': old_limit,
+            'new_limit': new_limit,
+            'p50': p50,
+            'error_rate': error_rate,
+        })
+
+        # 收缩说明上游出现压力, 用info级别记录; 扩大只在debug级别记录
+        p50_text = f"{p50 * 1000:.0f}ms" if p50 is not None else "-"
+        message = (f"[{self.name}] 并发窗口 {old_limit} -> {new_limit} "
+                   f"({reason}, p50 {p50_text}, 错误率 {error_rate:.1%})")
+        if new_limit < old_limit:
+            logger.info(message)
+        else:
+            logger.debug(message)
+
+    def snapshot(self) -> Dict:
+        """当前状态, 用于日志和监控"""
+        return {
+            'name': self.name,
+            'limit': self.limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'in_flight': self.in_flight,
+            'baseline_p50': self.baseline_p50,
+            'last_p50': self.last_p50,
+            'total_requests': self.total_requests,
+            'total_errors': self.total_errors,
+            'cuts': self.cuts,
+            'recent_decisions': list(self.decisions)[-10:],
+        }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_adaptive_limiter(name: str = 'async_fetcher', **kwargs) -> AdaptiveConcurrencyLimiter:
+    """
+    获取进程内共享的并发限制器 (同名的只创建一次, AIMD窗口在多次调用之间保留)
+
+    Args:
+        name: 限制器名称
+        **kwargs: 首次创建时传给 AdaptiveConcurrencyLimiter 的参数, 之后忽略
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = AdaptiveConcurrencyLimiter(name=name, **kwargs)
+                _limiters[name] = limiter
+    return limiter
+
+
+def adaptive_limiter_stats() -> Dict[str, Dict]:
+    """所有共享限制器的状态"""
+    return {name: limiter.snapshot() for name, limiter in list(_limiters.items())}
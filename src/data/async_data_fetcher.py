@@ -1,10 +1,8 @@
 import asyncio
 import aiohttp
 import pandas as pd
-import numpy as np
 import time
 import logging
-import random
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import sys
@@ -13,37 +11,63 @@ import json
 
 # 添加config路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from config.dividend_override import get_manual_dividend_yield, has_manual_override
+from config.config import DATA_CONFIG
+from src.data.tencent_parser import (
+    parse_quote_table, parse_quote_records,
+    empty_fundamental_data, calculate_financial_health, FUNDAMENTAL_COLUMNS,
+    kline_url, parse_kline_payload
+)
+from src.data.kline_store import KlineStore
+from src.data.history_cache import HistoryCache, get_history_cache, quote_cache_key, quote_cache_base_ttl
+from src.data.adaptive_limiter import AdaptiveConcurrencyLimiter, get_adaptive_limiter
+from src.data.http_transport import AsyncHttpTransport, default_async_transport
+from src.data.market_breadth import INDEX_SYMBOLS
+from src.data.market_snapshot import MarketSnapshot, get_snapshot_cache, current_snapshot
+from src.data.market_clock import cache_ttl, market_now
+from src.data.universe import get_universe, to_symbol, to_symbols
+from src.monitoring.tracing import record as trace_record
 
 logger = logging.getLogger(__name__)
 
 class AsyncStockDataFetcher:
     """异步股票数据获取器 - 大幅提升性能"""
 
-    def __init__(self, max_concurrent: int = 20):
+    def __init__(self, max_concurrent: int = 20, quote_batch_size: int = None,
+                 kline_store: KlineStore = None, history_cache: HistoryCache = None,
+                 adaptive_concurrency: bool = None, transport: AsyncHttpTransport = None):
         """
         初始化异步数据获取器
 
         Args:
-            max_concurrent: 最大并发请求数 (默认20,可以根据网络情况调整)
+            max_concurrent: 初始并发请求数 (默认20; 开启自适应时为进程内共享的窗口, 只在首次创建时生效)
+            quote_batch_size: 批量行情请求每次包含的股票数 (默认读取 DATA_CONFIG['quote_batch_size'])
+            kline_store: 本地日K线存储 (默认使用 DATA_CONFIG['kline_store_dir'])
+            history_cache: 历史K线缓存 (默认使用进程内共享缓存)
+            adaptive_concurrency: 是否自适应调整并发窗口 (默认读取 DATA_CONFIG['adaptive_concurrency'])
+            transport: HTTP传输层 (默认 AsyncHttpTransport; 测试和基准可传入 AsyncFakeTransport)
         """
         self.max_concurrent = max_concurrent
-        self.semaphore = None  # 将在异步上下文中初始化
+        self.quote_batch_size = quote_batch_size or DATA_CONFIG.get('quote_batch_size', 100)
+
+        # 并发控制: 自适应时窗口在 [concurrency_min, concurrency_max] 内按AIMD调整, 否则固定为 max_concurrent;
+        # 自适应窗口进程内共享, 同步封装每次新建获取器也不会丢失已经学到的窗口
+        if adaptive_concurrency is None:
+            adaptive_concurrency = DATA_CONFIG.get('adaptive_concurrency', True)
+        if adaptive_concurrency:
+            self.limiter = get_adaptive_limiter(
+                'async_fetcher',
+                initial_limit=max_concurrent,
+                min_limit=min(DATA_CONFIG.get('concurrency_min', 4), max_concurrent),
+                max_limit=max(DATA_CONFIG.get('concurrency_max', 64), max_concurrent),
+            )
+        else:
+            self.limiter = AdaptiveConcurrencyLimiter(
+                initial_limit=max_concurrent, min_limit=max_concurrent, max_limit=max_concurrent
+            )
         self.failed_stocks = []
-        self._hist_cache = {}  # 历史数据缓存
-
-        # User-Agent池
-        self.user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
-        ]
-
-    def _get_random_user_agent(self) -> str:
-        """随机获取User-Agent"""
-        return random.choice(self.user_agents)
+        self.history_cache = history_cache if history_cache is not None else get_history_cache()  # 进程内共享的历史数据缓存
+        self.kline_store = kline_store or KlineStore()
+        self.transport = transport or default_async_transport()
 
     async def _fetch_with_retry(self, session: aiohttp.ClientSession, url: str,
                                 max_retries: int = 3, timeout: int = 10) -> Optional[str]:
@@ -59,384 +83,247 @@ class AsyncStockDataFetcher:
         Returns:
             响应文本或None
         """
-        headers = {
-            'User-Agent': self._get_random_user_agent(),
-            'Accept': '*/*',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Connection': 'keep-alive',
-            'Referer': 'https://gu.qq.com/'
-        }
-
-        for attempt in range(max_retries):
-            try:
-                async with session.get(url, headers=headers, timeout=timeout) as response:
-                    if response.status == 200:
-                        return await response.text()
-
-                    # 如果状态码不是200,等待后重试
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(0.5 * (2 ** attempt))
-
-            except asyncio.TimeoutError:
-                logger.debug(f"请求超时 (尝试 {attempt + 1}/{max_retries}): {url[:80]}...")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(0.5 * (2 ** attempt))
-            except Exception as e:
-                logger.debug(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(0.5 * (2 ** attempt))
-
-        return None
+        # 每次尝试的耗时和结果反馈给自适应并发窗口
+        return await self.transport.get_text(
+            session, url, timeout=timeout, max_retries=max_retries,
+            on_attempt=lambda timing: self.limiter.record(timing.latency, timing.ok)
+        )
 
     async def get_stock_realtime_data(self, session: aiohttp.ClientSession,
                                      stock_code: str) -> Dict:
         """异步获取股票实时数据"""
-        # 使用信号量控制并发
-        async with self.semaphore:
+        snapshot = current_snapshot()
+        if snapshot is not None and stock_code in snapshot:
+            trace_record('snapshot_hits', count=1)
+            return snapshot.record(stock_code, include_fundamental=False)
+
+        cache_key = quote_cache_key(stock_code, include_fundamental=False)
+        cached = self.history_cache.get(cache_key)
+        if cached is not None:
+            trace_record('quotes', cache_hits=1)
+            return dict(cached)
+
+        # 使用自适应并发窗口控制并发
+        async with self.limiter:
             try:
                 # 构造腾讯财经API请求
-                if stock_code.startswith('6'):
-                    symbol = f"sh{stock_code}"
-                else:
-                    symbol = f"sz{stock_code}"
-
-                url = f"https://qt.gtimg.cn/q={symbol}"
+                url = f"https://qt.gtimg.cn/q={to_symbol(stock_code)}"
 
                 content = await self._fetch_with_retry(session, url, max_retries=3, timeout=10)
 
                 if content and 'v_' in content:
-                    data_str = content.split('"')[1]
-                    data_parts = data_str.split('~')
-
-                    if len(data_parts) > 35:
-                        name = data_parts[1]
-                        price = float(data_parts[3]) if data_parts[3] and data_parts[3] != '' else 0
-                        prev_close = float(data_parts[4]) if data_parts[4] and data_parts[4] != '' else 0
-                        change_pct = float(data_parts[32]) if data_parts[32] and data_parts[32] != '' else 0
-                        volume = int(float(data_parts[6])) if data_parts[6] and data_parts[6] != '' else 0
-                        turnover = int(float(data_parts[7])) if data_parts[7] and data_parts[7] != '' else 0
-
-                        # 获取总市值和总股本
-                        market_cap = None
-                        total_shares = None
-
-                        if len(data_parts) > 23 and data_parts[23]:
-                            try:
-                                market_cap = float(data_parts[23])
-                            except ValueError:
-                                pass
-
-                        if len(data_parts) > 25 and data_parts[25]:
-                            try:
-                                total_shares = float(data_parts[25])
-                            except ValueError:
-                                pass
-
-                        # 获取换手率
-                        turnover_rate = None
-                        if len(data_parts) > 27 and data_parts[27]:
-                            try:
-                                turnover_rate = float(data_parts[27])
-                            except ValueError:
-                                pass
-
-                        # 获取PE值 - 按优先级
-                        pe_ratio = None
-                        pe_fields = [
-                            data_parts[39] if len(data_parts) > 39 else None,  # 基本面PE
-                            data_parts[22] if len(data_parts) > 22 else None,  # TTM PE
-                            data_parts[15] if len(data_parts) > 15 else None,  # 静态PE
-                            data_parts[14] if len(data_parts) > 14 else None   # 动态PE
-                        ]
-
-                        for pe_str in pe_fields:
-                            if pe_str and pe_str != '':
-                                try:
-                                    pe_value = float(pe_str)
-                                    if 0 < pe_value < 1000:
-                                        pe_ratio = pe_value
-                                        break
-                                except ValueError:
-                                    continue
-
-                        # 获取PB值
-                        pb_ratio = None
-                        if len(data_parts) > 16 and data_parts[16]:
-                            try:
-                                pb_value = float(data_parts[16])
-                                if 0 < pb_value < 100:
-                                    pb_ratio = pb_value
-                            except ValueError:
-                                pass
-
-                        return {
-                            'code': stock_code,
-                            'name': name,
-                            'price': price,
-                            'prev_close': prev_close,
-                            'change_pct': change_pct,
-                            'pe_ratio': pe_ratio,
-                            'pb_ratio': pb_ratio,
-                            'market_cap': market_cap,
-                            'total_shares': total_shares,
-                            'volume': volume,
-                            'turnover': turnover,
-                            'turnover_rate': turnover_rate
-                        }
+                    record = parse_quote_records(content, include_fundamental=False).get(stock_code, {})
+                    if record:
+                        self.history_cache.put(cache_key, dict(record), ttl=cache_ttl(quote_cache_base_ttl()))
+                    return record
 
             except Exception as e:
                 logger.debug(f"获取股票 {stock_code} 实时数据失败: {e}")
 
             return {}
 
+    async def _get_quote_batch(self, session: aiohttp.ClientSession, stock_codes: List[str],
+                               include_fundamental: bool = True, use_snapshot: bool = True) -> pd.DataFrame:
+        """一次请求获取多只股票的行情, 解析为列式表格 (当前快照中已有的股票不再请求)"""
+        snapshot = current_snapshot() if use_snapshot else None
+        if snapshot is not None:
+            hits, stock_codes = snapshot.lookup(stock_codes)
+            if len(hits):
+                trace_record('snapshot_hits', count=len(hits))
+            if not stock_codes:
+                return hits.reset_index(drop=True)
+            missing = await self._get_quote_batch(session, stock_codes, include_fundamental, use_snapshot=False)
+            return pd.concat([hits.reset_index(drop=True), missing], ignore_index=True)
+
+        content = await self._fetch_quote_content(session, stock_codes)
+        if not content:
+            return pd.DataFrame()
+        start = time.perf_counter()
+        table = parse_quote_table(content, include_fundamental)
+        trace_record('fundamentals' if include_fundamental else 'quote_parse',
+                     time.perf_counter() - start, count=len(table))
+        return table
+
+    async def _get_quote_records(self, session: aiohttp.ClientSession, stock_codes: List[str],
+                                 include_fundamental: bool = True) -> List[Dict]:
+        """一次请求获取多只股票的行情字典 (逐条解析, 当前快照中已有的股票不再请求), 按输入顺序"""
+        records = {}
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            hits = snapshot.records(stock_codes, include_fundamental)
+            if hits:
+                trace_record('snapshot_hits', count=len(hits))
+            records = {record['code']: record for record in hits}
+
+        missing = [code for code in stock_codes if code not in records]
+        if missing:
+            content = await self._fetch_quote_content(session, missing)
+            if content:
+                start = time.perf_counter()
+                parsed = parse_quote_records(content, include_fundamental)
+                trace_record('fundamentals' if include_fundamental else 'quote_parse',
+                             time.perf_counter() - start, count=len(parsed))
+                records.update(parsed)
+        return [records[code] for code in dict.fromkeys(stock_codes) if code in records]
+
+    async def _fetch_quote_content(self, session: aiohttp.ClientSession, stock_codes: List[str]) -> Optional[str]:
+        """一次请求下载多只股票的行情响应, 失败时返回None"""
+        async with self.limiter:
+            url = f"https://qt.gtimg.cn/q={','.join(to_symbols(stock_codes))}"
+
+            try:
+                start = time.perf_counter()
+                content = await self._fetch_with_retry(session, url, max_retries=3, timeout=15)
+                trace_record('quotes', time.perf_counter() - start, count=len(stock_codes), bytes=len(content or ''))
+                if content and 'v_' in content:
+                    return content
+            except Exception as e:
+                logger.debug(f"批量获取行情失败 ({len(stock_codes)}只): {e}")
+
+            return None
+
+    async def get_quote_table(self, session: aiohttp.ClientSession, stock_codes: List[str],
+                              batch_size: Optional[int] = None,
+                              include_fundamental: bool = True,
+                              use_snapshot: bool = True) -> pd.DataFrame:
+        """
+        批量获取行情并返回列式表格 (每批一个请求, 各批并发; use_snapshot 时先读当前的全市场快照)
+
+        Returns:
+            以股票代码为索引、按输入顺序排列的DataFrame, 获取失败的股票不包含在内
+        """
+        batch_size = max(1, batch_size or self.quote_batch_size)
+        batches = [stock_codes[i:i + batch_size] for i in range(0, len(stock_codes), batch_size)]
+
+        tables = await asyncio.gather(
+            *[self._get_quote_batch(session, batch, include_fundamental, use_snapshot) for batch in batches]
+        )
+        tables = [t for t in tables if not t.empty]
+        if not tables:
+            return pd.DataFrame()
+
+        table = pd.concat(tables, ignore_index=True)
+        table = table.drop_duplicates('code', keep='last').set_index('code', drop=False)
+        wanted = [code for code in dict.fromkeys(stock_codes) if code in table.index]
+        table = table.loc[wanted]
+
+        logger.info(f"批量行情: {len(batches)} 个请求获取 {len(table)}/{len(stock_codes)} 只股票 (每批 {batch_size} 只)")
+        return table
+
+    async def get_stocks_realtime_data_batch(self, session: aiohttp.ClientSession,
+                                             stock_codes: List[str],
+                                             batch_size: Optional[int] = None,
+                                             include_fundamental: bool = False) -> List[Dict]:
+        """
+        批量异步获取股票实时数据 - 每个请求打包多只股票
+
+        Args:
+            session: aiohttp会话
+            stock_codes: 股票代码列表
+            batch_size: 每个请求包含的股票数 (默认使用初始化时的 quote_batch_size)
+            include_fundamental: 是否从同一条行情记录中同时解析基本面数据 (不增加请求)
+
+        Returns:
+            与 get_stock_realtime_data 相同结构的字典列表, 按输入顺序排列, 获取失败的股票不包含在内
+        """
+        # 调用方需要字典, 逐条解析 (不经过列式表格, 见 tencent_parser 模块说明)
+        batch_size = max(1, batch_size or self.quote_batch_size)
+        batches = [stock_codes[i:i + batch_size] for i in range(0, len(stock_codes), batch_size)]
+        results = await asyncio.gather(
+            *[self._get_quote_records(session, batch, include_fundamental) for batch in batches]
+        )
+        records = {record['code']: record for batch_records in results for record in batch_records}
+        found = [records[code] for code in dict.fromkeys(stock_codes) if code in records]
+
+        logger.info(f"批量行情: {len(batches)} 个请求获取 {len(found)}/{len(stock_codes)} 只股票 (每批 {batch_size} 只)")
+        return found
+
     async def get_stock_fundamental_data(self, session: aiohttp.ClientSession,
                                         stock_code: str) -> Dict:
         """异步获取股票基本面数据"""
-        async with self.semaphore:
-            try:
-                # 确定市场代码
-                if stock_code.startswith('6') or stock_code.startswith('688'):
-                    market = 'sh'
-                else:
-                    market = 'sz'
+        snapshot = current_snapshot()
+        if snapshot is not None and stock_code in snapshot:
+            trace_record('snapshot_hits', count=1)
+            record = snapshot.record(stock_code)
+            return {key: record[key] for key in FUNDAMENTAL_COLUMNS}
 
-                symbol = f"{market}{stock_code}"
-                url = f"https://qt.gtimg.cn/q={symbol}"
+        async with self.limiter:
+            try:
+                url = f"https://qt.gtimg.cn/q={to_symbol(stock_code)}"
 
                 content = await self._fetch_with_retry(session, url, max_retries=2, timeout=10)
 
-                if content and 'v_' in content and len(content.split('~')) > 52:
-                    data_str = content.split('"')[1]
-                    data_parts = data_str.split('~')
-
-                    # 解析PB市净率
-                    pb_ratio = None
-                    if len(data_parts) > 46 and data_parts[46]:
-                        try:
-                            pb_ratio = float(data_parts[46])
-                            if pb_ratio <= 0:
-                                pb_ratio = None
-                        except ValueError:
-                            pass
-
-                    # 解析股息率
-                    dividend_yield = None
-                    manual_dividend = get_manual_dividend_yield(stock_code)
-                    if manual_dividend is not None:
-                        dividend_yield = manual_dividend
-                    else:
-                        current_price = float(data_parts[3]) if data_parts[3] else None
-                        dividend_data = None
-
-                        if len(data_parts) > 53 and data_parts[53]:
-                            try:
-                                dividend_data = float(data_parts[53])
-                                if dividend_data < 0:
-                                    dividend_data = None
-                            except ValueError:
-                                pass
-
-                        if current_price and current_price > 0 and dividend_data and dividend_data > 0:
-                            per_share_dividend = dividend_data / 10
-                            dividend_yield = (per_share_dividend / current_price) * 100
-
-                            if not (0 < dividend_yield <= 20):
-                                dividend_yield = None
-
-                    # 解析换手率
-                    turnover_rate = None
-                    if len(data_parts) > 56 and data_parts[56]:
-                        try:
-                            turnover_rate = float(data_parts[56])
-                        except ValueError:
-                            pass
-
-                    # 获取PE和计算PEG
-                    pe_ratio = None
-                    peg = None
-                    if len(data_parts) > 39 and data_parts[39]:
-                        try:
-                            pe_value = float(data_parts[39])
-                            if 0 < pe_value < 200:
-                                pe_ratio = pe_value
-
-                                if pb_ratio:
-                                    if pb_ratio < 1:
-                                        assumed_growth = 20
-                                    elif pb_ratio > 5:
-                                        assumed_growth = 10
-                                    else:
-                                        assumed_growth = 15
-                                else:
-                                    assumed_growth = 15
-
-                                peg = pe_ratio / assumed_growth
-                        except ValueError:
-                            pass
-
-                    # 计算ROE
-                    roe = None
-                    if pb_ratio and pe_ratio and pe_ratio > 0:
-                        try:
-                            roe = (pb_ratio / pe_ratio) * 100
-                            if roe < -50 or roe > 50:
-                                roe = None
-                        except:
-                            roe = None
-
-                    # 估算利润增长率
-                    profit_growth = None
-                    if roe and dividend_yield:
-                        try:
-                            payout_ratio = min(dividend_yield / roe, 0.9) if roe > 0 else 0.5
-                            profit_growth = roe * (1 - payout_ratio)
-                        except:
-                            profit_growth = None
-
-                    # 计算财务健康度评分
-                    financial_health_score = self._calculate_financial_health(
-                        pb_ratio, dividend_yield, pe_ratio, turnover_rate
-                    )
-
-                    return {
-                        'pb_ratio': pb_ratio,
-                        'dividend_yield': dividend_yield,
-                        'peg': peg,
-                        'turnover_rate': turnover_rate,
-                        'financial_health_score': financial_health_score,
-                        'roe': roe,
-                        'profit_growth': profit_growth,
-                        'debt_ratio': None,
-                        'current_ratio': None,
-                        'gross_margin': None,
-                        # 不设置market_cap和total_shares为None，保留实时数据中的值
-                    }
+                if content and 'v_' in content:
+                    record = parse_quote_records(content).get(stock_code)
+                    if record:
+                        return {key: record[key] for key in FUNDAMENTAL_COLUMNS}
 
             except Exception as e:
                 logger.debug(f"获取股票 {stock_code} 基本面数据失败: {e}")
 
-            return {
-                'pb_ratio': None,
-                'dividend_yield': None,
-                'peg': None,
-                'turnover_rate': None,
-                'financial_health_score': 0,
-                'roe': None,
-                'profit_growth': None,
-                'debt_ratio': None,
-                'current_ratio': None,
-                'gross_margin': None,
-                # 不设置market_cap和total_shares为None，保留实时数据中的值
-            }
+            return empty_fundamental_data()
 
     def _calculate_financial_health(self, pb: Optional[float], div_yield: Optional[float],
                                    pe: Optional[float], turnover: Optional[float]) -> int:
         """计算财务健康度评分"""
-        score = 50
-
-        try:
-            if pb:
-                if pb < 1:
-                    score += 20
-                elif pb < 2:
-                    score += 10
-                elif pb > 10:
-                    score -= 20
-                elif pb > 5:
-                    score -= 10
-
-            if div_yield:
-                if div_yield > 5:
-                    score += 15
-                elif div_yield > 3:
-                    score += 10
-                elif div_yield > 2:
-                    score += 5
-                elif div_yield < 1:
-                    score -= 5
-
-            if pe:
-                if 10 < pe < 20:
-                    score += 10
-                elif 20 <= pe < 30:
-                    score += 5
-                elif pe >= 50:
-                    score -= 10
-
-            if turnover:
-                if 1 < turnover < 5:
-                    score += 5
-                elif turnover > 20:
-                    score -= 5
-        except:
-            pass
-
-        return max(0, min(100, score))
+        return calculate_financial_health(pb, div_yield, pe, turnover)
 
     async def get_stock_historical_data(self, session: aiohttp.ClientSession,
                                        stock_code: str, days: int = 30) -> pd.DataFrame:
         """异步获取股票历史数据"""
-        async with self.semaphore:
+        # 检查缓存 (命中时无需占用并发名额)
+        cache_key = (stock_code, days)
+        cached_data = self.history_cache.get(cache_key)
+        if cached_data is not None:
+            trace_record('history', cache_hits=1)
+            return cached_data
+
+        async with self.limiter:
             try:
-                # 检查缓存
-                cache_key = f"{stock_code}_{days}"
-                if cache_key in self._hist_cache:
-                    cached_data, cached_time = self._hist_cache[cache_key]
-                    if time.time() - cached_time < 3600:  # 1小时缓存
-                        return cached_data
-
-                # 确定市场代码
-                if stock_code.startswith('6') or stock_code.startswith('688'):
-                    market = 'sh'
-                else:
-                    market = 'sz'
-
-                symbol = f"{market}{stock_code}"
-                actual_days = int(days * 2)
-
-                url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={symbol},day,,,{actual_days},qfq&_var=kline_dayqfq"
-
-                content = await self._fetch_with_retry(session, url, max_retries=3, timeout=15)
-
-                if content and 'kline_dayqfq=' in content:
-                    json_str = content.replace('kline_dayqfq=', '')
-                    data_json = json.loads(json_str)
-
-                    if 'data' in data_json and symbol in data_json['data']:
-                        kline_data = data_json['data'][symbol]
+                # 本地K线已是最新时不访问网络, 否则只请求缺失的K线
+                stored = self.kline_store.load(stock_code)
+                bars = self.kline_store.bars_to_request(stored, days)
 
-                        if 'qfqday' in kline_data and kline_data['qfqday']:
-                            klines = kline_data['qfqday']
-
-                            if klines:
-                                df_data = []
-                                for kline in klines:
-                                    df_data.append({
-                                        'date': kline[0],
-                                        'open': float(kline[1]),
-                                        'close': float(kline[2]),
-                                        'high': float(kline[3]),
-                                        'low': float(kline[4]),
-                                        'volume': float(kline[5]) if len(kline) > 5 else 0
-                                    })
-
-                                data = pd.DataFrame(df_data)
-                                data['date'] = pd.to_datetime(data['date'])
+                if bars == 0:
+                    data = stored
+                    trace_record('history', store_hits=1)
+                else:
+                    fetched = await self._fetch_kline(session, stock_code, bars)
+                    if fetched.empty:
+                        data = stored
+                    else:
+                        data = self.kline_store.update(stock_code, stored, fetched)
+                        if data is None:
+                            # 复权因子变化, 重新下载完整历史
+                            full_bars = max(int(days * 2), len(stored) + bars)
+                            fetched = await self._fetch_kline(session, stock_code, full_bars)
+                            data = self.kline_store.replace(stock_code, fetched) if not fetched.empty else stored
 
-                                if len(data) > days:
-                                    data = data.tail(days)
+                if not data.empty:
+                    if len(data) > days:
+                        data = data.tail(days)
 
-                                # 存入缓存
-                                self._hist_cache[cache_key] = (data, time.time())
+                    # 存入缓存 (有效期随交易时段变化, 收盘后保留到下一次开盘)
+                    self.history_cache.put(cache_key, data, ttl=cache_ttl(self.history_cache.ttl))
 
-                                return data
+                    return data
 
             except Exception as e:
                 logger.debug(f"获取股票 {stock_code} 历史数据失败: {e}")
 
             return pd.DataFrame()
 
+    async def _fetch_kline(self, session: aiohttp.ClientSession, stock_code: str,
+                           bars: int) -> pd.DataFrame:
+        """下载最近 bars 根前复权日K线"""
+        symbol = to_symbol(stock_code)
+
+        start = time.perf_counter()
+        content = await self._fetch_with_retry(session, kline_url(symbol, bars), max_retries=3, timeout=15)
+        data = parse_kline_payload(content, symbol)
+        trace_record('history', time.perf_counter() - start, count=1, bytes=len(content or ''))
+        return data
+
     def calculate_momentum(self, price_data: pd.DataFrame, days: int = 20) -> float:
         """计算动量指标"""
         if len(price_data) < days:
@@ -457,6 +344,108 @@ class AsyncStockDataFetcher:
         # 后续可以通过本地缓存文件来批量获取
         return "未知行业"
 
+    def _create_session(self) -> aiohttp.ClientSession:
+        """创建HTTP会话 (连接数与并发窗口上限匹配)"""
+        return self.transport.create_session(
+            limit=self.limiter.max_limit * 2,  # 总连接数
+            limit_per_host=self.limiter.max_limit,  # 每个主机的连接数
+        )
+
+    async def _run_stock_chain(self, session: aiohttp.ClientSession, stock: Dict,
+                               calculate_momentum: bool, queue: asyncio.Queue,
+                               stats: Dict):
+        """单只股票的后续阶段: 历史数据 -> 动量 -> 行业, 完成后放入输出队列"""
+        stock['momentum_20d'] = 0
+        if calculate_momentum:
+            hist_data = await self.get_stock_historical_data(session, stock['code'], days=30)
+            if not hist_data.empty and len(hist_data) >= 20:
+                start = time.perf_counter()
+                stock['momentum_20d'] = self.calculate_momentum(hist_data, days=20)
+                trace_record('momentum', time.perf_counter() - start, count=1)
+                stats['momentum'] += 1
+
+        # 行业信息 (简化版)
+        stock['industry'] = "未知行业"
+        queue.put_nowait(stock)
+
+    async def _run_quote_batch(self, session: aiohttp.ClientSession, batch: List[str],
+                               calculate_momentum: bool, include_fundamental: bool,
+                               queue: asyncio.Queue, stats: Dict):
+        """一批股票的行情(含基本面)到手后, 立即为每只股票启动后续阶段"""
+        records = await self._get_quote_records(session, batch, include_fundamental)
+        if not records:
+            return
+        stats['quote'] += len(records)
+
+        await asyncio.gather(*[
+            self._run_stock_chain(session, stock, calculate_momentum, queue, stats)
+            for stock in records
+        ])
+
+    async def iter_stock_data(self, stock_codes: List[str],
+                              calculate_momentum: bool = True,
+                              include_fundamental: bool = True,
+                              session: aiohttp.ClientSession = None):
+        """
+        流式获取股票数据 - 异步生成器
+
+        每个行情批次返回后, 其中每只股票立即进入 历史数据 -> 动量 阶段,
+        不等待其他批次; 任一股票完成所有阶段即产出, 产出顺序为完成顺序。
+        总耗时接近最慢的单只股票链路, 而不是各阶段尾部延迟之和。
+
+        Args:
+            stock_codes: 股票代码列表
+            calculate_momentum: 是否计算动量
+            include_fundamental: 是否包含基本面数据
+            session: aiohttp会话 (不传则内部创建并在结束时关闭)
+
+        Yields:
+            与 batch_get_stock_data 结果相同结构的股票数据字典
+        """
+        stock_codes = list(dict.fromkeys(stock_codes))
+        batch_size = max(1, self.quote_batch_size)
+        batches = [stock_codes[i:i + batch_size] for i in range(0, len(stock_codes), batch_size)]
+
+        own_session = session is None
+        if own_session:
+            session = self._create_session()
+
+        queue: asyncio.Queue = asyncio.Queue()
+        stats = {'quote': 0, 'momentum': 0}
+        done = object()
+
+        async def run_all():
+            try:
+                await asyncio.gather(*[
+                    self._run_quote_batch(session, batch, calculate_momentum, include_fundamental, queue, stats)
+                    for batch in batches
+                ])
+            finally:
+                queue.put_nowait(done)
+
+        producer = asyncio.ensure_future(run_all())
+        try:
+            while True:
+                stock = await queue.get()
+                if stock is done:
+                    break
+                yield stock
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+            if own_session:
+                await session.close()
+
+        logger.info(f"成功获取 {stats['quote']}/{len(stock_codes)} 只股票实时数据 ({len(batches)} 个行情请求)")
+        if calculate_momentum:
+            logger.info(f"动量计算成功: {stats['momentum']}/{stats['quote']}")
+
+        limiter_state = self.limiter.snapshot()
+        logger.info(f"并发窗口: 当前 {limiter_state['limit']} (范围 {limiter_state['min_limit']}-{limiter_state['max_limit']}), "
+                    f"请求 {limiter_state['total_requests']} 次, 失败 {limiter_state['total_errors']} 次")
+
     async def batch_get_stock_data(self, stock_codes: List[str],
                                   calculate_momentum: bool = True,
                                   include_fundamental: bool = True) -> List[Dict]:
@@ -471,224 +460,108 @@ class AsyncStockDataFetcher:
         Returns:
             股票数据列表
         """
-        # 初始化信号量
-        self.semaphore = asyncio.Semaphore(self.max_concurrent)
-
-        # 去重
-        stock_codes = list(set(stock_codes))
-        logger.info(f"开始批量获取 {len(stock_codes)} 只股票数据 (最大并发: {self.max_concurrent})")
+        # 去重 (保持输入顺序)
+        stock_codes = list(dict.fromkeys(stock_codes))
+        logger.info(f"开始批量获取 {len(stock_codes)} 只股票数据 (初始并发: {self.limiter.limit}, 上限: {self.limiter.max_limit})")
 
         start_time = time.time()
 
-        # 创建TCP连接器,增加连接数和超时设置
-        connector = aiohttp.TCPConnector(
-            limit=self.max_concurrent * 2,  # 总连接数
-            limit_per_host=self.max_concurrent,  # 每个主机的连接数
-            ttl_dns_cache=300,  # DNS缓存5分钟
-        )
-
-        timeout = aiohttp.ClientTimeout(
-            total=60,  # 总超时60秒
-            connect=10,  # 连接超时10秒
-            sock_read=15  # 读取超时15秒
-        )
-
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            # 第一步: 批量获取实时数据
-            logger.info("步骤1: 批量获取实时数据...")
-            realtime_tasks = [
-                self.get_stock_realtime_data(session, code)
-                for code in stock_codes
-            ]
-            realtime_results = await asyncio.gather(*realtime_tasks)
-
-            # 过滤掉空结果
-            valid_stocks = [data for data in realtime_results if data and data.get('code')]
-            logger.info(f"成功获取 {len(valid_stocks)}/{len(stock_codes)} 只股票实时数据")
-
-            if not valid_stocks:
-                return []
-
-            # 第二步: 批量获取基本面数据
-            if include_fundamental:
-                logger.info("步骤2: 批量获取基本面数据...")
-                fundamental_tasks = [
-                    self.get_stock_fundamental_data(session, stock['code'])
-                    for stock in valid_stocks
-                ]
-                fundamental_results = await asyncio.gather(*fundamental_tasks)
-
-                # 合并基本面数据
-                for stock, fundamental in zip(valid_stocks, fundamental_results):
-                    stock.update(fundamental)
-
-            # 第三步: 批量获取历史数据并计算动量
-            if calculate_momentum:
-                logger.info("步骤3: 批量获取历史数据并计算动量...")
-                historical_tasks = [
-                    self.get_stock_historical_data(session, stock['code'], days=30)
-                    for stock in valid_stocks
-                ]
-                historical_results = await asyncio.gather(*historical_tasks)
-
-                # 计算动量
-                momentum_success = 0
-                for stock, hist_data in zip(valid_stocks, historical_results):
-                    if not hist_data.empty and len(hist_data) >= 20:
-                        momentum = self.calculate_momentum(hist_data, days=20)
-                        stock['momentum_20d'] = momentum
-                        momentum_success += 1
-                    else:
-                        stock['momentum_20d'] = 0
-
-                logger.info(f"动量计算成功: {momentum_success}/{len(valid_stocks)}")
-            else:
-                for stock in valid_stocks:
-                    stock['momentum_20d'] = 0
+        valid_stocks = [
+            stock async for stock in self.iter_stock_data(stock_codes, calculate_momentum, include_fundamental)
+        ]
+        if not valid_stocks:
+            return []
 
-            # 第四步: 批量获取行业信息 (简化版)
-            for stock in valid_stocks:
-                stock['industry'] = "未知行业"
+        # 流水线按完成先后产出, 这里恢复输入顺序
+        order = {code: i for i, code in enumerate(stock_codes)}
+        valid_stocks.sort(key=lambda stock: order[stock['code']])
 
         elapsed = time.time() - start_time
         logger.info(f"批量获取完成! 用时: {elapsed:.2f}秒, 平均速度: {len(valid_stocks)/elapsed:.1f}只/秒")
 
         return valid_stocks
 
+    async def get_market_snapshot(self, session: aiohttp.ClientSession = None,
+                                  max_age: float = None) -> MarketSnapshot:
+        """
+        全市场行情快照 - 刷新间隔内直接返回共享快照, 否则扫描一次
+
+        Args:
+            session: aiohttp会话 (不传则内部创建)
+            max_age: 可接受的快照最大时长(秒), 默认 DATA_CONFIG['snapshot_refresh_interval']
+        """
+        cache = get_snapshot_cache()
+        snapshot = cache.current(max_age)
+        if snapshot is not None:
+            return snapshot
+
+        if session is None:
+            async with self.transport.create_session(total_timeout=30, read_timeout=10) as session:
+                snapshot = await self._sweep_market(session)
+        else:
+            snapshot = await self._sweep_market(session)
+        cache.publish(snapshot)
+        return snapshot
+
+    async def _sweep_market(self, session: aiohttp.ClientSession) -> MarketSnapshot:
+        """
+        扫描全部A股和主要指数的行情 (按 breadth_batch_size 分批并发)
+
+        并发受获取器的自适应并发窗口约束; 异步传输层默认不启用令牌桶限流 (见 AsyncHttpTransport)
+        """
+        stock_codes = get_universe().a_share_codes()
+        logger.info(f"正在扫描全市场 {len(stock_codes)} 只A股行情...")
+        start = time.perf_counter()
+
+        index_table, table = await asyncio.gather(
+            self._get_index_table(session),
+            self.get_quote_table(session, stock_codes, batch_size=DATA_CONFIG.get('breadth_batch_size', 500),
+                                 include_fundamental=True, use_snapshot=False),
+        )
+        elapsed = time.perf_counter() - start
+        logger.info(f"全市场快照: {len(table)}/{len(stock_codes)} 只股票 (耗时{elapsed:.2f}秒)")
+        return MarketSnapshot(table, index_table, len(stock_codes), elapsed=elapsed)
+
     async def get_market_overview_async(self) -> Dict:
-        """异步获取市场概况 - 使用缓存优化"""
+        """
+        异步获取市场概况 - 全市场涨跌统计
+
+        统计来自全市场行情快照 (get_market_snapshot), 结果另外写入缓存文件供其他进程使用:
+        连续竞价时缓存 overview_cache_ttl 秒, 收盘后缓存到下一次开盘, 集合竞价时不缓存。
+        """
         try:
             # 检查缓存文件
-            cache_file = './cache/market_overview.json'
+            cache_file = DATA_CONFIG.get('overview_cache_file', './cache/market_overview.json')
             if os.path.exists(cache_file):
                 with open(cache_file, 'r', encoding='utf-8') as f:
                     cached_data = json.load(f)
-                    cache_time = datetime.fromisoformat(cached_data.get('cache_time', '2000-01-01'))
+                    expires_at = datetime.fromisoformat(cached_data.get('expires_at', '2000-01-01'))
 
-                    # 如果缓存在5分钟内,直接使用
-                    if (datetime.now() - cache_time).seconds < 300:
+                    # 缓存未过期时直接使用
+                    if market_now() < expires_at:
                         logger.info("使用缓存的市场概况数据")
                         return cached_data['data']
 
             logger.info("正在获取市场概况数据...")
-
-            # 创建会话
-            timeout = aiohttp.ClientTimeout(total=30, connect=10, sock_read=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                # 获取主要指数数据
-                url = "https://qt.gtimg.cn/q=sh000001,sz399001,sz399006"
-                headers = {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Referer': 'https://gu.qq.com/'
+            snapshot = await self.get_market_snapshot()
+            overview = snapshot.overview()
+            if overview:
+                # 保存缓存
+                os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+                now = market_now()
+                ttl = cache_ttl(DATA_CONFIG.get('overview_cache_ttl', 300), now)
+                cache_data = {
+                    'cache_time': now.isoformat(),
+                    'expires_at': (now + timedelta(seconds=ttl)).isoformat(),
+                    'data': overview
                 }
+                with open(cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(cache_data, f, ensure_ascii=False, default=str)
 
-                index_data = []
-                try:
-                    async with session.get(url, headers=headers) as response:
-                        if response.status == 200:
-                            content = await response.text()
-                            if 'v_' in content:
-                                lines = content.strip().split(';')
-
-                                for line in lines:
-                                    if 'v_' in line and '~' in line:
-                                        data_str = line.split('"')[1]
-                                        parts = data_str.split('~')
-                                        if len(parts) > 32:
-                                            index_data.append({
-                                                'name': parts[1],
-                                                'change_pct': float(parts[32]) if parts[32] else 0,
-                                                'price': float(parts[3]) if parts[3] else 0
-                                            })
-                except Exception as e:
-                    logger.warning(f"获取指数数据失败: {e}")
-
-                avg_change = sum(d['change_pct'] for d in index_data[:3]) / 3 if index_data else 0
-
-                # 使用简化的市场统计 - 只统计沪深300的涨跌情况
-                # 加载沪深300列表
-                csi300_file = './data/csi300_stocks.json'
-                if os.path.exists(csi300_file):
-                    with open(csi300_file, 'r', encoding='utf-8') as f:
-                        csi300_data = json.load(f)
-                        stock_codes = [s['code'] for s in csi300_data['stocks']]
-
-                    # 批量查询沪深300股票涨跌
-                    rising = 0
-                    falling = 0
-                    flat = 0
-
-                    # 分批查询
-                    batch_size = 100
-                    for i in range(0, len(stock_codes), batch_size):
-                        batch = stock_codes[i:i+batch_size]
-                        symbols = []
-                        for code in batch:
-                            if code.startswith('6'):
-                                symbols.append(f"sh{code}")
-                            else:
-                                symbols.append(f"sz{code}")
-
-                        batch_url = f"https://qt.gtimg.cn/q={','.join(symbols)}"
-
-                        try:
-                            async with session.get(batch_url, headers=headers, timeout=15) as response:
-                                if response.status == 200:
-                                    content = await response.text()
-                                    lines = content.strip().split(';')
-
-                                    for line in lines:
-                                        if 'v_' in line and '~' in line:
-                                            try:
-                                                data_str = line.split('"')[1]
-                                                parts = data_str.split('~')
-
-                                                if len(parts) > 32:
-                                                    change_pct = float(parts[32]) if parts[32] else 0
-
-                                                    if change_pct > 0:
-                                                        rising += 1
-                                                    elif change_pct < 0:
-                                                        falling += 1
-                                                    else:
-                                                        flat += 1
-                                            except:
-                                                continue
-                        except Exception as e:
-                            logger.debug(f"批次查询失败: {e}")
-                            continue
-
-                        # 小延迟避免限流
-                        await asyncio.sleep(0.3)
-
-                    total = rising + falling + flat
-                    rising_ratio = (rising / total * 100) if total > 0 else 50.0
-
-                    overview = {
-                        'total_stocks': 300,  # 沪深300
-                        'rising_stocks': rising,
-                        'falling_stocks': falling,
-                        'flat_stocks': flat,
-                        'rising_ratio': rising_ratio,
-                        'avg_change_pct': avg_change,
-                        'update_time': datetime.now(),
-                        'data_source': '腾讯财经实时数据(沪深300)',
-                        'indices': index_data,
-                        'note': f'统计沪深300成分股涨跌数据',
-                        'success_count': total
-                    }
-
-                    # 保存缓存
-                    os.makedirs('./cache', exist_ok=True)
-                    cache_data = {
-                        'cache_time': datetime.now().isoformat(),
-                        'data': overview
-                    }
-                    with open(cache_file, 'w', encoding='utf-8') as f:
-                        json.dump(cache_data, f, ensure_ascii=False, default=str)
-
-                    logger.info(f"市场概况获取成功: 上涨{rising}, 下跌{falling}, 上涨比例{rising_ratio:.2f}%")
-                    return overview
+                logger.info(f"市场概况获取成功: {overview['success_count']}只股票, 上涨{overview['rising_stocks']}, "
+                            f"下跌{overview['falling_stocks']}, 上涨比例{overview['rising_ratio']:.2f}% "
+                            f"(快照时间{snapshot.taken_at:%H:%M:%S})")
+                return overview
 
             # 如果失败,返回兜底数据
             return {
@@ -717,28 +590,55 @@ class AsyncStockDataFetcher:
                 'error': str(e)
             }
 
+    async def _get_index_table(self, session: aiohttp.ClientSession) -> pd.DataFrame:
+        """主要指数行情 (上证指数、深证成指、创业板指)"""
+        url = f"https://qt.gtimg.cn/q={','.join(INDEX_SYMBOLS)}"
+        try:
+            content = await self.transport.get_text(session, url, timeout=10, max_retries=1)
+            if content and 'v_' in content:
+                return parse_quote_table(content, include_fundamental=False)
+        except Exception as e:
+            logger.warning(f"获取指数数据失败: {e}")
+        return pd.DataFrame()
+
 
 # 同步包装函数,方便在非异步代码中使用
 def batch_get_stock_data_sync(stock_codes: List[str], calculate_momentum: bool = True,
-                              include_fundamental: bool = True, max_concurrent: int = 20) -> List[Dict]:
+                              include_fundamental: bool = True, max_concurrent: int = 20,
+                              quote_batch_size: int = None,
+                              history_cache: HistoryCache = None) -> List[Dict]:
     """
     同步版本的批量获取股票数据
 
+    每次调用都会新建获取器, 历史K线缓存默认使用进程内共享实例, 因此多次调用之间仍可复用。
+
     Args:
         stock_codes: 股票代码列表
         calculate_momentum: 是否计算动量
         include_fundamental: 是否包含基本面数据
         max_concurrent: 最大并发数
+        quote_batch_size: 批量行情请求每次包含的股票数
+        history_cache: 历史K线缓存 (默认使用进程内共享缓存)
 
     Returns:
         股票数据列表
     """
-    fetcher = AsyncStockDataFetcher(max_concurrent=max_concurrent)
+    fetcher = AsyncStockDataFetcher(max_concurrent=max_concurrent, quote_batch_size=quote_batch_size,
+                                    history_cache=history_cache)
     return asyncio.run(
         fetcher.batch_get_stock_data(stock_codes, calculate_momentum, include_fundamental)
     )
 
 
+def get_market_snapshot_sync(max_age: float = None) -> MarketSnapshot:
+    """同步版本的获取全市场行情快照"""
+    snapshot = get_snapshot_cache().current(max_age)
+    if snapshot is not None:
+        return snapshot
+    fetcher = AsyncStockDataFetcher()
+    return asyncio.run(fetcher.get_market_snapshot(max_age=max_age))
+
+
 def get_market_overview_sync() -> Dict:
     """同步版本的获取市场概况"""
     fetcher = AsyncStockDataFetcher()
@@ -1,41 +1,52 @@
 import akshare as ak
 import pandas as pd
-import numpy as np
 import time
 import logging
-import random
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import sys
 import os
+import contextvars
+import threading
 
 # 添加config路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from config.dividend_override import get_manual_dividend_yield, has_manual_override
+from config.config import DATA_CONFIG
+from src.data.tencent_parser import (
+    parse_quote_records, parse_quote_table, empty_fundamental_data, calculate_financial_health,
+    FUNDAMENTAL_COLUMNS, kline_url, parse_kline_payload
+)
+from src.data.kline_store import KlineStore
+from src.data.history_cache import HistoryCache, get_history_cache, quote_cache_key, quote_cache_base_ttl
+from src.data.rate_limiter import get_rate_limiter
+from src.data.http_transport import HttpTransport, default_transport
+from src.data.market_breadth import INDEX_SYMBOLS
+from src.data.market_snapshot import MarketSnapshot, get_snapshot_cache, current_snapshot
+from src.data.market_clock import cache_ttl
+from src.data.universe import get_universe, to_symbol, to_symbols
+from src.monitoring.tracing import record as trace_record
 
 logger = logging.getLogger(__name__)
 
 class StockDataFetcher:
-    def __init__(self):
+    def __init__(self, kline_store: KlineStore = None, history_cache: HistoryCache = None,
+                 transport: HttpTransport = None):
         self.a_share_stocks = None
         self.hk_connect_stocks = None
         self.failed_stocks = []  # 记录失败的股票代码
-
-        # User-Agent池 - 模拟不同的浏览器
-        self.user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        ]
+        self._failed_lock = threading.Lock()  # 线程池并行时多个工作线程同时记录失败
+        self.kline_store = kline_store or KlineStore()  # 本地日K线存储
+        self.history_cache = history_cache if history_cache is not None else get_history_cache()  # 进程内共享的历史数据缓存
+        # HTTP传输层: 共享连接池、令牌桶限流、重试退避 (测试和基准可传入 FakeTransport)
+        self.transport = transport or default_transport(
+            pool_size=max(10, DATA_CONFIG.get('sync_max_workers', 8) * 2)
+        )
 
     def get_a_share_list(self) -> pd.DataFrame:
-        """获取A股股票列表"""
+        """获取A股股票列表 (股票池注册表, 每天只从akshare获取一次)"""
         try:
-            # 获取A股股票基本信息
-            stock_info = ak.stock_info_a_code_name()
+            stock_info = get_universe().to_frame()
             logger.info(f"获取到 {len(stock_info)} 只A股股票")
             return stock_info
         except Exception as e:
@@ -55,21 +66,14 @@ class StockDataFetcher:
             logger.error(f"获取港股通列表失败: {e}")
             return pd.DataFrame()
 
-    def _get_random_user_agent(self) -> str:
-        """随机获取一个User-Agent"""
-        return random.choice(self.user_agents)
-
-    def _random_delay(self, min_delay: float = 0.3, max_delay: float = 0.8):
-        """随机延迟，模拟人工操作"""
-        delay = random.uniform(min_delay, max_delay)
-        time.sleep(delay)
-
     def get_stock_industry_info(self, stock_code: str) -> str:
         """获取股票行业信息 - 使用akshare获取行业分类"""
         try:
             import akshare as ak
-            
-            # 获取股票所属行业
+
+            # 获取股票所属行业 (akshare请求东方财富接口, 同样限流; 回放和内存传输层不限流)
+            if self.transport.rate_limit:
+                get_rate_limiter('push2.eastmoney.com').acquire()
             stock_info = ak.stock_individual_info_em(symbol=stock_code)
             if not stock_info.empty:
                 # 查找行业字段
@@ -83,531 +87,147 @@ class StockDataFetcher:
             logger.debug(f"获取股票 {stock_code} 行业信息失败: {e}")
             return "未知行业"
 
-    def get_stock_realtime_data(self, stock_code: str, retry_count: int = 0) -> Dict:
-        """获取股票实时数据 - 使用腾讯财经API，带重试机制"""
-        import requests
+    def _fetch_quote_record(self, stock_code: str, include_fundamental: bool = True,
+                            max_retries: int = 5, timeout: int = 20,
+                            record_failure: bool = True) -> Optional[Dict]:
+        """
+        获取单只股票的腾讯行情记录 - 带重试机制
+
+        实时数据和基本面数据都来自这一条记录, 调用方只需请求一次。
+
+        Returns:
+            解析后的数据字典, 失败返回None
+        """
+        # 刷新间隔内的全市场快照中已有该股票时不再请求
+        snapshot = current_snapshot()
+        if snapshot is not None and stock_code in snapshot:
+            trace_record('snapshot_hits', count=1)
+            return snapshot.record(stock_code, include_fundamental)
+
+        # 逐只行情缓存: 没有快照时 (详情接口、绩效报告) 收盘后同样不重复请求
+        cache_key = quote_cache_key(stock_code, include_fundamental)
+        cached = self.history_cache.get(cache_key)
+        if cached is not None:
+            trace_record('quotes', cache_hits=1)
+            return dict(cached)
+
+        # 构造腾讯财经API请求
+        symbol = to_symbol(stock_code)
+        url = f"https://qt.gtimg.cn/q={symbol}"
+
+        # 传输层负责限流、重试和指数退避, 响应中没有该股票记录时同样重试
+        start = time.perf_counter()
+        content = self.transport.get_text(
+            url, timeout=timeout, max_retries=max_retries,
+            validate=lambda text: f'v_{symbol}="' in text
+        )
+        trace_record('quotes', time.perf_counter() - start, count=1, bytes=len(content or ''))
+        if content:
+            start = time.perf_counter()
+            record = parse_quote_records(content, include_fundamental).get(stock_code)
+            trace_record('fundamentals' if include_fundamental else 'quote_parse',
+                         time.perf_counter() - start, count=1)
+            if record:
+                self.history_cache.put(cache_key, dict(record), ttl=cache_ttl(quote_cache_base_ttl()))
+                return record
 
-        # 增加重试机制
-        max_retries = 5  # 增加到5次重试
-        timeout = 20  # 增加超时时间到20秒
+        # 所有重试都失败后，记录失败的股票
+        if record_failure:
+            self._record_failure(stock_code)
+            logger.error(f"获取股票 {stock_code} 行情数据失败，已重试 {max_retries} 次")
+        return None
 
-        for attempt in range(max_retries):
-            try:
-                # 构造腾讯财经API请求
-                if stock_code.startswith('6'):
-                    symbol = f"sh{stock_code}"
-                else:
-                    symbol = f"sz{stock_code}"
-
-                url = f"https://qt.gtimg.cn/q={symbol}"
-
-                # 使用随机User-Agent
-                headers = {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Accept': '*/*',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                    'Connection': 'keep-alive',
-                    'Referer': 'https://gu.qq.com/'
-                }
+    def _record_failure(self, stock_code: str):
+        """记录失败的股票 (检查和追加在同一把锁内, 并行时不会重复记录)"""
+        with self._failed_lock:
+            if stock_code not in self.failed_stocks:
+                self.failed_stocks.append(stock_code)
 
-                # 添加随机延迟，避免被识别为机器人
-                if attempt > 0:
-                    self._random_delay(0.5, 1.5)
-
-                response = requests.get(url, headers=headers, timeout=timeout)
-
-                if response.status_code == 200:
-                    content = response.text
-                    if 'v_' in content:
-                        # 解析腾讯返回的数据
-                        data_str = content.split('"')[1]
-                        data_parts = data_str.split('~')
-
-                        # 腾讯API返回数据结构：
-                        # [0]市场标志 [1]名称 [2]代码 [3]当前价 [4]昨收 [5]今开 [6]成交量 [7]成交额 [8]最高 [9]最低
-                        # [10]竞买价 [11]竞卖价 [12]委比 [13]振幅 [14]市盈率(动) [15]市盈率(静) [16]市净率 [17]涨停价 [18]跌停价 [19]量比
-                        # [20]均价 [21]溢价 [22]市盈率(TTM) [23]总市值（万元）[24]流通市值 [25]总股本（万股）[26]流通股 [27]换手率 [28]资产净值 [29]市现率 [30]市销率 [31]股息率 [32]涨跌幅 [33]涨跌额
-                        # [34]买入价 [35]卖出价 ... (更多字段)
-                        if len(data_parts) > 35:
-                            name = data_parts[1]
-                            price = float(data_parts[3]) if data_parts[3] and data_parts[3] != '' else 0
-                            prev_close = float(data_parts[4]) if data_parts[4] and data_parts[4] != '' else 0
-                            change_pct = float(data_parts[32]) if data_parts[32] and data_parts[32] != '' else 0
-                            pe_dynamic = data_parts[14] if len(data_parts) > 14 and data_parts[14] != '' and data_parts[14] != '0' else None  # 动态PE
-                            pe_static = data_parts[15] if len(data_parts) > 15 and data_parts[15] != '' and data_parts[15] != '0' else None  # 静态PE
-                            pe_ttm = data_parts[22] if len(data_parts) > 22 and data_parts[22] != '' and data_parts[22] != '0' else None  # TTM PE
-                            pb = data_parts[16] if len(data_parts) > 16 and data_parts[16] != '' and data_parts[16] != '0' else None  # 市净率
-                            volume = int(float(data_parts[6])) if data_parts[6] and data_parts[6] != '' else 0
-                            turnover = int(float(data_parts[7])) if data_parts[7] and data_parts[7] != '' else 0  # 成交额
-                            
-                            # 获取总市值和总股本信息（如果存在）
-                            market_cap_str = data_parts[23] if len(data_parts) > 23 and data_parts[23] != '' else None  # 总市值（万元）
-                            total_shares_str = data_parts[25] if len(data_parts) > 25 and data_parts[25] != '' else None  # 总股本（万股）
-                            
-                            market_cap = None
-                            total_shares = None
-                            
-                            if market_cap_str:
-                                try:
-                                    market_cap = float(market_cap_str)  # 单位是万元
-                                except ValueError:
-                                    pass
-                            
-                            if total_shares_str:
-                                try:
-                                    total_shares = float(total_shares_str)  # 单位是万股
-                                except ValueError:
-                                    pass
-                            
-                            # 获取换手率数据
-                            turnover_rate = None
-                            if len(data_parts) > 27 and data_parts[27] and data_parts[27] != '':
-                                try:
-                                    turnover_rate = float(data_parts[27])
-                                except (ValueError, IndexError):
-                                    pass
-
-                            # 获取PE值 - 调整优先级：优先使用基本面PE，然后是TTM PE，静态PE，最后动态PE
-                            pe_ratio = None
-                            
-                            # 按优先级顺序尝试不同的PE值
-                            pe_fields = [
-                                ('基本面PE', data_parts[39] if len(data_parts) > 39 else None),  # 字段39 - 基本面PE
-                                ('TTM PE', data_parts[22] if len(data_parts) > 22 else None),     # 字段22 - TTM PE
-                                ('静态PE', data_parts[15] if len(data_parts) > 15 else None),     # 字段15 - 静态PE
-                                ('动态PE', data_parts[14] if len(data_parts) > 14 else None)      # 字段14 - 动态PE
-                            ]
-                            
-                            for pe_name, pe_str in pe_fields:
-                                if pe_str and pe_str != '':
-                                    try:
-                                        pe_value = float(pe_str)
-                                        # 过滤异常PE值（大于1000或小于0的值）
-                                        if pe_value > 0 and pe_value < 1000:
-                                            pe_ratio = pe_value
-                                            logger.debug(f"{stock_code} 使用{pe_name}: {pe_value:.2f}")
-                                            break  # 找到合适的PE值就停止
-                                    except ValueError:
-                                        continue
-
-                            # 获取PB值
-                            pb_ratio = None
-                            if pb:
-                                try:
-                                    pb_value = float(pb)
-                                    if pb_value > 0 and pb_value < 100:  # 过滤异常值
-                                        pb_ratio = pb_value
-                                except ValueError:
-                                    pass
-
-                            return {
-                                'code': stock_code,
-                                'name': name,
-                                'price': price,
-                                'prev_close': prev_close,
-                                'change_pct': change_pct,
-                                'pe_ratio': pe_ratio,
-                                'pb_ratio': pb_ratio,  # 添加PB比率
-                                'market_cap': market_cap,  # 总市值（万元单位）
-                                'total_shares': total_shares,  # 总股本（万股单位）
-                                'volume': volume,
-                                'turnover': turnover,  # 成交额
-                                'turnover_rate': turnover_rate
-                            }
-
-                # 如果响应不成功，等待后重试 - 使用指数退避 + 随机抖动
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                    logger.debug(f"股票 {stock_code} 重试等待 {backoff_time:.2f} 秒...")
-                    time.sleep(backoff_time)
+    def get_stock_realtime_data(self, stock_code: str, retry_count: int = 0) -> Dict:
+        """获取股票实时数据 - 使用腾讯财经API，带重试机制"""
+        return self._fetch_quote_record(stock_code, include_fundamental=False) or {}
 
-            except Exception as e:
-                logger.warning(f"获取股票 {stock_code} 实时数据失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    # 指数退避 + 随机抖动
-                    backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(backoff_time)
-                continue
+    def get_stock_quote_data(self, stock_code: str, include_fundamental: bool = True) -> Dict:
+        """
+        获取股票实时数据和基本面数据 - 一次请求一次解析
 
-        # 所有重试都失败后，记录失败的股票
-        if stock_code not in self.failed_stocks:
-            self.failed_stocks.append(stock_code)
-        logger.error(f"获取股票 {stock_code} 实时数据失败，已重试 {max_retries} 次")
-        return {}
+        等价于 get_stock_realtime_data 的结果再 update get_stock_fundamental_data 的结果,
+        但只下载一次行情记录。
+        """
+        return self._fetch_quote_record(stock_code, include_fundamental) or {}
 
     def get_stock_fundamental_data(self, stock_code: str) -> Dict:
         """获取股票基本面数据 - 纯腾讯财经API (简化版)"""
-        import requests
-
-        max_retries = 3
-
-        for attempt in range(max_retries):
-            try:
-                # 确定市场代码
-                if stock_code.startswith('6'):
-                    market = 'sh'
-                elif stock_code.startswith('0') or stock_code.startswith('3'):
-                    market = 'sz'
-                elif stock_code.startswith('688'):
-                    market = 'sh'
-                else:
-                    market = 'sz'
-
-                symbol = f"{market}{stock_code}"
-
-                # 腾讯财经实时行情API
-                url = f"https://qt.gtimg.cn/q={symbol}"
-                headers = {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Referer': 'https://gu.qq.com/'
-                }
-
-                response = requests.get(url, headers=headers, timeout=15)
-
-                if response.status_code == 200 and 'v_' in response.text:
-                    content = response.text
-                    data_str = content.split('"')[1]
-                    data_parts = data_str.split('~')
-
-                    if len(data_parts) > 52:
-                        # 从腾讯API解析基本面数据
-                        # 关键字段位置:
-                        # [39] = PE市盈率
-                        # [46] = PB市净率
-                        # [52] = 股息率
-                        # [53] = 股息
-                        # [56] = 换手率
-
-                        # 解析PB市净率
-                        pb_ratio = None
-                        if data_parts[46]:
-                            try:
-                                pb_ratio = float(data_parts[46])
-                                if pb_ratio <= 0:
-                                    pb_ratio = None
-                            except (ValueError, IndexError):
-                                pass
-
-                        # 解析股息率 - 采用统一的每10股转换算法
-                        dividend_yield = None
-
-                        # 1. 首先检查是否有手动配置的股息率
-                        manual_dividend = get_manual_dividend_yield(stock_code)
-                        if manual_dividend is not None:
-                            dividend_yield = manual_dividend
-                            logger.debug(f"{stock_code} 使用手动配置的股息率: {dividend_yield}%")
-                        else:
-                            # 2. 获取当前股价和股息数据
-                            current_price = float(data_parts[3]) if data_parts[3] else None
-                            dividend_data = None
-
-                            # 尝试从API获取股息数据（字段[53]）
-                            if len(data_parts) > 53 and data_parts[53]:
-                                try:
-                                    dividend_data = float(data_parts[53])
-                                    if dividend_data < 0:
-                                        dividend_data = None
-                                except (ValueError, IndexError):
-                                    pass
-
-                            # 3. 如果有股价和股息数据，使用统一的每10股转换算法
-                            if current_price and current_price > 0 and dividend_data and dividend_data > 0:
-                                # 统一采用每10股股息转换算法
-                                # 根据测试，API返回的数据通常是每10股的股息，需要除以10得到每股股息
-                                per_share_dividend = dividend_data / 10
-                                dividend_yield = (per_share_dividend / current_price) * 100
-
-                                # 验证计算结果是否在合理范围内（0-20%）
-                                if 0 < dividend_yield <= 20:
-                                    logger.debug(f"{stock_code} 基于每10股股息转换的每股股息({per_share_dividend:.4f}元)和股价({current_price}元)计算股息率: {dividend_yield:.2f}%")
-                                else:
-                                    logger.warning(f"{stock_code} 计算的股息率{dividend_yield:.2f}%超出合理范围(0-20%)，使用默认值")
-                                    dividend_yield = None
-
-                        # 解析换手率
-                        turnover_rate = None
-                        if len(data_parts) > 56 and data_parts[56]:
-                            try:
-                                turnover_rate = float(data_parts[56])
-                            except (ValueError, IndexError):
-                                pass
-
-                        # 获取PE用于估算PEG（简化版：使用行业平均增长率15%）
-                        pe_ratio = None
-                        peg = None
-                        if data_parts[39]:
-                            try:
-                                pe_value = float(data_parts[39])
-                                # 过滤异常PE值（大于100或小于0的值），但仍允许相对较高的基本面PE值
-                                if pe_value > 0 and pe_value < 200:
-                                    pe_ratio = pe_value
-                                    # 简化PEG计算：假设平均增长率15%
-                                    # 如果PB很低(<1),假设增长更高(20%)
-                                    # 如果PB很高(>5),假设增长较低(10%)
-                                    if pb_ratio:
-                                        if pb_ratio < 1:
-                                            assumed_growth = 20
-                                        elif pb_ratio > 5:
-                                            assumed_growth = 10
-                                        else:
-                                            assumed_growth = 15
-                                    else:
-                                        assumed_growth = 15
-
-                                    peg = pe_ratio / assumed_growth
-                            except (ValueError, TypeError):
-                                # 如果解析失败，保持pe_ratio为None
-                                pass
-                        roe = None
-                        if pb_ratio and pe_ratio and pe_ratio > 0:
-                            try:
-                                roe = (pb_ratio / pe_ratio) * 100  # 转换为百分比
-                                # ROE合理性检查: 通常在-50%到50%之间
-                                if roe < -50 or roe > 50:
-                                    logger.debug(f"{stock_code} ROE计算异常: {roe:.2f}%, PB={pb_ratio}, PE={pe_ratio}")
-                                    # 保留数据,但标记可能异常
-                            except Exception as e:
-                                logger.debug(f"计算ROE失败: {e}")
-                                roe = None
-
-                        # 基于ROE和股息率估算利润增长率(简化)
-                        profit_growth = None
-                        if roe and dividend_yield:
-                            try:
-                                # 利润增长率估算 = ROE × (1 - 股息支付率)
-                                # 假设股息支付率 = 股息率 / ROE
-                                payout_ratio = min(dividend_yield / roe, 0.9) if roe > 0 else 0.5
-                                profit_growth = roe * (1 - payout_ratio)
-                            except:
-                                profit_growth = None
-
-                        # 基于现有数据推算财务健康度评分
-                        financial_health_score = self._calculate_financial_health(
-                            pb_ratio, dividend_yield, pe_ratio, turnover_rate
-                        )
-
-                        return {
-                            'pb_ratio': pb_ratio,
-                            'dividend_yield': dividend_yield,
-                            'peg': peg,  # 简化版PEG
-                            'turnover_rate': turnover_rate,
-                            'financial_health_score': financial_health_score,
-                            'roe': roe,  # 通过PB/PE计算得出! ⭐
-                            'profit_growth': profit_growth,  # 通过ROE估算
-                            # 以下字段暂时无法获取
-                            'debt_ratio': None,  # 腾讯API不提供
-                            'current_ratio': None,
-                            'gross_margin': None,
-                            # 不设置market_cap和total_shares为None，保留实时数据中的值
-                        }
-
-                        return fundamental_data
-
-                # 重试
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 0.5)
-                    time.sleep(backoff_time)
-                    continue
-
-            except Exception as e:
-                logger.warning(f"获取股票 {stock_code} 基本面数据失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 0.5)
-                    time.sleep(backoff_time)
-                    continue
-
-        return {
-                'pb_ratio': None,
-                'dividend_yield': None,
-                'peg': None,
-                'turnover_rate': None,
-                'financial_health_score': 0,
-                'roe': None,
-                'profit_growth': None,
-                'debt_ratio': None,
-                'current_ratio': None,
-                'gross_margin': None,
-                # 不设置market_cap和total_shares为None，保留实时数据中的值
-            }
+        record = self._fetch_quote_record(stock_code, max_retries=3, timeout=15, record_failure=False)
+        if record:
+            return {key: record[key] for key in FUNDAMENTAL_COLUMNS}
+        return empty_fundamental_data()
 
     def _calculate_financial_health(self, pb: Optional[float], div_yield: Optional[float],
                                     pe: Optional[float], turnover: Optional[float]) -> int:
         """基于有限数据计算财务健康度评分 (0-100)"""
-        score = 50  # 基础分50分
-
-        try:
-            # PB评分 (±20分)
-            if pb:
-                if pb < 1:  # 破净
-                    score += 20
-                elif pb < 2:  # 低估
-                    score += 10
-                elif pb > 10:  # 极度高估
-                    score -= 20
-                elif pb > 5:  # 高估
-                    score -= 10
-
-            # 股息率评分 (±15分)
-            if div_yield:
-                if div_yield > 5:
-                    score += 15
-                elif div_yield > 3:
-                    score += 10
-                elif div_yield > 2:
-                    score += 5
-                elif div_yield < 1:
-                    score -= 5
-
-            # PE评分 (±10分)
-            if pe:
-                if 10 < pe < 20:  # 合理区间
-                    score += 10
-                elif 20 <= pe < 30:
-                    score += 5
-                elif pe >= 50:  # 过高
-                    score -= 10
-
-            # 换手率评分 (±5分)
-            if turnover:
-                if 1 < turnover < 5:  # 适中
-                    score += 5
-                elif turnover > 20:  # 过度投机
-                    score -= 5
-
-        except:
-            pass
-
-        return max(0, min(100, score))  # 限制在0-100之间
+        return calculate_financial_health(pb, div_yield, pe, turnover)
 
     def get_stock_historical_data(self, stock_code: str, days: int = 30) -> pd.DataFrame:
-        """获取股票历史数据 - 使用腾讯财经API，带重试机制和缓存"""
-        import requests
-
-        max_retries = 5  # 增加重试次数
-
-        for attempt in range(max_retries):
-            try:
-                # 简单的内存缓存key
-                cache_key = f"{stock_code}_{days}"
-                cache_time = 3600  # 缓存1小时
-
-                # 检查内存缓存
-                if not hasattr(self, '_hist_cache'):
-                    self._hist_cache = {}
-
-                if cache_key in self._hist_cache:
-                    cached_data, cached_time = self._hist_cache[cache_key]
-                    if time.time() - cached_time < cache_time:
-                        return cached_data
-
-                # 添加随机延迟
-                if attempt > 0:
-                    self._random_delay(0.5, 1.5)
-
-                # 构造腾讯财经历史数据API请求
-                # 确定市场代码
-                if stock_code.startswith('6'):
-                    market = 'sh'
-                elif stock_code.startswith('0') or stock_code.startswith('3'):
-                    market = 'sz'
-                elif stock_code.startswith('688'):
-                    market = 'sh'
-                else:
-                    market = 'sz'
+        """获取股票历史数据 - 使用腾讯财经API，本地K线存储增量更新，带重试机制和缓存"""
+        # 检查进程内共享缓存
+        cache_key = (stock_code, days)
+        cached_data = self.history_cache.get(cache_key)
+        if cached_data is not None:
+            trace_record('history', cache_hits=1)
+            return cached_data
+
+        # 本地K线已是最新时不访问网络, 否则只请求缺失的K线
+        stored = self.kline_store.load(stock_code)
+        bars = self.kline_store.bars_to_request(stored, days)
+
+        if bars == 0:
+            data = stored
+            trace_record('history', store_hits=1)
+        else:
+            fetched = self._fetch_kline(stock_code, bars)
+            if fetched is None:
+                data = stored
+            else:
+                data = self.kline_store.update(stock_code, stored, fetched)
+                if data is None:
+                    # 复权因子变化, 重新下载完整历史
+                    full_bars = max(int(days * 2), len(stored) + bars)
+                    fetched = self._fetch_kline(stock_code, full_bars)
+                    data = self.kline_store.replace(stock_code, fetched) if fetched is not None else stored
+
+        if data.empty:
+            # 所有重试失败后记录
+            self._record_failure(stock_code)
+            return pd.DataFrame()
 
-                symbol = f"{market}{stock_code}"
+        # 只保留最近指定天数的数据
+        if len(data) > days:
+            data = data.tail(days)
 
-                # 腾讯财经日K线数据接口
-                # 获取更多天数以确保有足够的交易日数据
-                actual_days = int(days * 2)  # 获取更多数据
+        # 存入缓存 (有效期随交易时段变化, 收盘后保留到下一次开盘)
+        self.history_cache.put(cache_key, data, ttl=cache_ttl(self.history_cache.ttl))
 
-                url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
-                params = {
-                    'param': f'{symbol},day,,,{actual_days},qfq',  # qfq=前复权
-                    '_var': 'kline_dayqfq'
-                }
+        return data
 
-                headers = {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Accept': '*/*',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                    'Connection': 'keep-alive',
-                    'Referer': 'https://gu.qq.com/'
-                }
+    def _fetch_kline(self, stock_code: str, bars: int) -> Optional[pd.DataFrame]:
+        """下载最近 bars 根前复权日K线，失败返回None"""
+        max_retries = 5  # 增加重试次数
 
-                response = requests.get(url, params=params, headers=headers, timeout=20)
-
-                if response.status_code == 200:
-                    content = response.text
-
-                    # 解析腾讯返回的数据（JSON格式，带JavaScript变量名）
-                    if 'kline_dayqfq=' in content:
-                        json_str = content.replace('kline_dayqfq=', '')
-                        import json
-                        data_json = json.loads(json_str)
-
-                        if 'data' in data_json and symbol in data_json['data']:
-                            kline_data = data_json['data'][symbol]
-
-                            if 'qfqday' in kline_data and kline_data['qfqday']:
-                                # 解析K线数据
-                                # 数据格式: ['日期', '开盘', '收盘', '最高', '最低', '成交量']
-                                klines = kline_data['qfqday']
-
-                                if not klines:
-                                    if attempt < max_retries - 1:
-                                        backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                                        logger.debug(f"股票 {stock_code} 历史数据为空，等待 {backoff_time:.2f} 秒后重试...")
-                                        time.sleep(backoff_time)
-                                        continue
-                                    return pd.DataFrame()
-
-                                # 转换为DataFrame
-                                df_data = []
-                                for kline in klines:
-                                    # kline格式: ['2024-01-01', '10.50', '10.80', '10.90', '10.40', '1000000']
-                                    df_data.append({
-                                        'date': kline[0],
-                                        'open': float(kline[1]),
-                                        'close': float(kline[2]),
-                                        'high': float(kline[3]),
-                                        'low': float(kline[4]),
-                                        'volume': float(kline[5]) if len(kline) > 5 else 0
-                                    })
-
-                                data = pd.DataFrame(df_data)
-                                data['date'] = pd.to_datetime(data['date'])
-
-                                # 只保留最近指定天数的数据
-                                if len(data) > days:
-                                    data = data.tail(days)
-
-                                # 存入缓存
-                                self._hist_cache[cache_key] = (data, time.time())
-
-                                return data
-
-                # 如果响应不成功，等待后重试
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                    logger.debug(f"股票 {stock_code} 历史数据获取失败，等待 {backoff_time:.2f} 秒后重试...")
-                    time.sleep(backoff_time)
-                    continue
+        symbol = to_symbol(stock_code)
 
-            except Exception as e:
-                logger.warning(f"获取股票 {stock_code} 历史数据失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(backoff_time)
-                    continue
+        # 腾讯财经日K线数据接口 (qfq=前复权), 数据为空时同样重试
+        start = time.perf_counter()
+        content = self.transport.get_text(
+            kline_url(symbol, bars), timeout=20, max_retries=max_retries,
+            validate=lambda text: not parse_kline_payload(text, symbol).empty
+        )
+        trace_record('history', time.perf_counter() - start, count=1, bytes=len(content or ''))
+        if content:
+            return parse_kline_payload(content, symbol)
 
-        # 所有重试失败后记录
-        if stock_code not in self.failed_stocks:
-            self.failed_stocks.append(stock_code)
         logger.error(f"获取股票 {stock_code} 历史数据失败，已重试 {max_retries} 次")
-        return pd.DataFrame()
+        return None
 
     def calculate_momentum(self, price_data: pd.DataFrame, days: int = 20) -> float:
         """计算股票动量指标"""
@@ -623,148 +243,131 @@ class StockDataFetcher:
             logger.error(f"计算动量指标失败: {e}")
             return 0
 
-    def get_market_overview(self) -> Dict:
-        """获取市场概况 - 真实统计全市场涨跌数据"""
+    def _get_quote_batch(self, stock_codes: List[str], include_fundamental: bool,
+                         use_snapshot: bool = True) -> pd.DataFrame:
+        """一次请求获取多只股票的行情, 解析为列式表格 (当前快照中已有的股票不再请求)"""
+        snapshot = current_snapshot() if use_snapshot else None
+        if snapshot is not None:
+            hits, stock_codes = snapshot.lookup(stock_codes)
+            if len(hits):
+                trace_record('snapshot_hits', count=len(hits))
+            if not stock_codes:
+                return hits.reset_index(drop=True)
+            missing = self._get_quote_batch(stock_codes, include_fundamental, use_snapshot=False)
+            return pd.concat([hits.reset_index(drop=True), missing], ignore_index=True)
+
+        url = f"https://qt.gtimg.cn/q={','.join(to_symbols(stock_codes))}"
+
         try:
-            import requests
+            start = time.perf_counter()
+            content = self.transport.get_text(url, timeout=30, max_retries=3)
+            trace_record('quotes', time.perf_counter() - start, count=len(stock_codes), bytes=len(content or ''))
+            if content and 'v_' in content:
+                start = time.perf_counter()
+                table = parse_quote_table(content, include_fundamental)
+                trace_record('fundamentals' if include_fundamental else 'quote_parse',
+                             time.perf_counter() - start, count=len(table))
+                return table
+        except Exception as e:
+            logger.warning(f"批量获取行情失败 ({len(stock_codes)}只): {e}")
+        return pd.DataFrame()
 
-            try:
-                # 使用腾讯财经API获取市场概况
-                logger.info("正在获取市场概况数据(腾讯财经API)...")
-
-                # 先获取主要指数数据
-                url = "https://qt.gtimg.cn/q=sh000001,sz399001,sz399006"
-                headers = {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Referer': 'https://gu.qq.com/'
-                }
-                response = requests.get(url, headers=headers, timeout=10)
-
-                index_data = []
-                if response.status_code == 200 and 'v_' in response.text:
-                    lines = response.text.strip().split(';')
-
-                    for line in lines:
-                        if 'v_' in line and '~' in line:
-                            data_str = line.split('"')[1]
-                            parts = data_str.split('~')
-                            if len(parts) > 32:
-                                index_data.append({
-                                    'name': parts[1],
-                                    'change_pct': float(parts[32]) if parts[32] else 0,
-                                    'price': float(parts[3]) if parts[3] else 0
-                                })
-
-                # 计算平均指数涨跌幅
-                avg_change = sum(d['change_pct'] for d in index_data[:3]) / 3 if index_data else 0
-
-                # 获取A股列表
-                logger.info("正在获取全市场A股列表...")
-                stock_list = self.get_a_share_list()
-
-                if stock_list.empty:
-                    logger.warning("无法获取A股列表,使用兜底数据")
-                    raise Exception("获取A股列表失败")
-
-                total_stocks = len(stock_list)
-                logger.info(f"获取到 {total_stocks} 只A股,准备统计涨跌情况...")
-
-                # 真实统计全市场涨跌股票数
-                rising_stocks = 0
-                falling_stocks = 0
-                flat_stocks = 0
-                success_count = 0
-
-                # 批量获取股票涨跌数据
-                stock_codes = stock_list['code'].tolist()
-
-                # 使用腾讯API批量查询(每次最多800只)
-                batch_size = 800
-
-                for i in range(0, len(stock_codes), batch_size):
-                    batch = stock_codes[i:i+batch_size]
-
-                    # 构造批量查询符号
-                    symbols = []
-                    for code in batch:
-                        if code.startswith('6'):
-                            symbols.append(f"sh{code}")
-                        else:
-                            symbols.append(f"sz{code}")
+    def get_quote_table(self, stock_codes: List[str], batch_size: Optional[int] = None,
+                        include_fundamental: bool = True, max_workers: Optional[int] = None,
+                        use_snapshot: bool = True) -> pd.DataFrame:
+        """
+        批量获取行情并返回列式表格 (每批一个请求, 各批在线程池中并行)
+
+        Args:
+            batch_size: 每个请求包含的股票数 (默认 DATA_CONFIG['quote_batch_size'])
+            max_workers: 并行线程数 (默认 DATA_CONFIG['sync_max_workers'])
+            use_snapshot: 是否先读当前的全市场快照
+
+        Returns:
+            以股票代码为索引、按输入顺序排列的DataFrame, 获取失败的股票不包含在内
+        """
+        batch_size = max(1, batch_size or DATA_CONFIG.get('quote_batch_size', 100))
+        max_workers = max(1, max_workers or DATA_CONFIG.get('sync_max_workers', 8))
+        batches = [stock_codes[i:i + batch_size] for i in range(0, len(stock_codes), batch_size)]
+        if not batches:
+            return pd.DataFrame()
 
-                    # 批量查询
-                    batch_url = f"https://qt.gtimg.cn/q={','.join(symbols)}"
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            tables = list(executor.map(
+                lambda batch: contextvars.copy_context().run(self._get_quote_batch, batch,
+                                                             include_fundamental, use_snapshot),
+                batches
+            ))
+        tables = [t for t in tables if not t.empty]
+        if not tables:
+            return pd.DataFrame()
 
-                    try:
-                        batch_response = requests.get(batch_url, headers=headers, timeout=30)
-
-                        if batch_response.status_code == 200:
-                            lines = batch_response.text.strip().split(';')
-
-                            for line in lines:
-                                if 'v_' in line and '~' in line:
-                                    try:
-                                        data_str = line.split('"')[1]
-                                        parts = data_str.split('~')
-
-                                        if len(parts) > 32:
-                                            change_pct = float(parts[32]) if parts[32] else 0
-
-                                            if change_pct > 0:
-                                                rising_stocks += 1
-                                            elif change_pct < 0:
-                                                falling_stocks += 1
-                                            else:
-                                                flat_stocks += 1
-
-                                            success_count += 1
-                                    except Exception as parse_error:
-                                        continue
-
-                        # 显示进度
-                        progress = min(i + batch_size, len(stock_codes))
-                        logger.info(f"市场统计进度: {progress}/{len(stock_codes)} ({progress/len(stock_codes)*100:.1f}%)")
-
-                        # 批次间延迟,避免限流
-                        if i + batch_size < len(stock_codes):
-                            time.sleep(0.5)
-
-                    except Exception as batch_error:
-                        logger.warning(f"批次 {i}-{i+batch_size} 获取失败: {batch_error}")
-                        continue
-
-                # 计算统计数据
-                if success_count > 0:
-                    rising_ratio = (rising_stocks / success_count) * 100
-
-                    overview = {
-                        'total_stocks': total_stocks,
-                        'rising_stocks': rising_stocks,
-                        'falling_stocks': falling_stocks,
-                        'flat_stocks': flat_stocks,
-                        'rising_ratio': rising_ratio,
-                        'avg_change_pct': avg_change,
-                        'update_time': datetime.now(),
-                        'data_source': '腾讯财经实时数据',
-                        'indices': index_data,
-                        'note': f'真实统计{success_count}只股票涨跌数据',
-                        'success_count': success_count
-                    }
-
-                    logger.info(f"获取市场数据成功: 总数{total_stocks}, 上涨{rising_stocks}({rising_ratio:.2f}%), 下跌{falling_stocks}")
-                    logger.info(f"   指数平均涨跌: {avg_change:+.2f}%")
+        table = pd.concat(tables, ignore_index=True)
+        table = table.drop_duplicates('code', keep='last').set_index('code', drop=False)
+        wanted = [code for code in dict.fromkeys(stock_codes) if code in table.index]
+        table = table.loc[wanted]
+
+        logger.info(f"批量行情: {len(batches)} 个请求获取 {len(table)}/{len(stock_codes)} 只股票 (每批 {batch_size} 只)")
+        return table
+
+    def get_market_snapshot(self, max_age: float = None) -> MarketSnapshot:
+        """
+        全市场行情快照 - 刷新间隔内直接返回共享快照, 否则扫描一次
+
+        Args:
+            max_age: 可接受的快照最大时长(秒), 默认 DATA_CONFIG['snapshot_refresh_interval']
+        """
+        return get_snapshot_cache().get(self._sweep_market, max_age)
+
+    def _sweep_market(self) -> MarketSnapshot:
+        """扫描全部A股和主要指数的行情 (按 breadth_batch_size 分批在线程池中并行请求)"""
+        stock_codes = get_universe().a_share_codes()
+        logger.info(f"正在扫描全市场 {len(stock_codes)} 只A股行情(腾讯财经API)...")
+        start = time.perf_counter()
+
+        index_table = pd.DataFrame()
+        try:
+            url = f"https://qt.gtimg.cn/q={','.join(INDEX_SYMBOLS)}"
+            content = self.transport.get_text(url, timeout=10, max_retries=1)
+            if content and 'v_' in content:
+                index_table = parse_quote_table(content, include_fundamental=False)
+        except Exception as e:
+            logger.warning(f"获取指数数据失败: {e}")
+
+        table = self.get_quote_table(stock_codes, batch_size=DATA_CONFIG.get('breadth_batch_size', 500),
+                                     include_fundamental=True, use_snapshot=False)
+        elapsed = time.perf_counter() - start
+        logger.info(f"全市场快照: {len(table)}/{len(stock_codes)} 只股票 (耗时{elapsed:.2f}秒)")
+        return MarketSnapshot(table, index_table, len(stock_codes), elapsed=elapsed)
+
+    def get_market_overview(self) -> Dict:
+        """
+        获取市场概况 - 真实统计全市场涨跌数据
+
+        统计来自全市场行情快照 (get_market_snapshot), 刷新间隔内不重复请求。
+        """
+        try:
+            # 获取A股列表 (每天只请求一次akshare, 失败或休市时兜底数据也用它的数量)
+            stock_codes = get_universe().a_share_codes()
+
+            try:
+                snapshot = self.get_market_snapshot()
+                overview = snapshot.overview()
+                if overview:
+                    logger.info(f"获取市场数据成功: 总数{overview['total_stocks']}, "
+                                f"上涨{overview['rising_stocks']}({overview['rising_ratio']:.2f}%), "
+                                f"下跌{overview['falling_stocks']} (快照时间{snapshot.taken_at:%H:%M:%S})")
+                    logger.info(f"   指数平均涨跌: {overview['avg_change_pct']:+.2f}%")
                     return overview
-                else:
-                    logger.warning("未能成功获取任何股票数据,使用兜底方案")
-                    raise Exception("统计失败")
+
+                logger.warning("未能成功获取任何股票数据,使用兜底方案")
 
             except Exception as tencent_error:
                 logger.warning(f"真实统计失败，使用兜底数据: {tencent_error}")
 
             # 如果实时数据失败，返回基于历史的模拟概况
-            stock_list = self.get_a_share_list()
-            if not stock_list.empty:
-                total_stocks = len(stock_list)
+            if stock_codes:
+                total_stocks = len(stock_codes)
 
                 # 由于获取不到实时数据，使用模拟的市场统计
                 overview = {
@@ -805,99 +408,110 @@ class StockDataFetcher:
                 'error': str(e)
             }
 
-    def batch_get_stock_data(self, stock_codes: List[str], calculate_momentum: bool = True,
-                            include_fundamental: bool = True) -> List[Dict]:
-        """批量获取股票数据 - 带失败重试机制,包含基本面数据"""
-        results = []
-        seen_codes = set()  # 用于去重
+    def _fetch_stock_record(self, code: str, calculate_momentum: bool,
+                            include_fundamental: bool) -> Tuple[Optional[Dict], bool]:
+        """
+        获取单只股票的完整数据: 行情(含基本面)、行业、20日动量
 
-        # 统计动量计算情况
-        momentum_success = 0
-        momentum_fail = 0
+        Returns:
+            (数据字典或None, 动量是否计算成功)
+        """
+        try:
+            # 获取实时数据和基本面数据 (同一条行情记录, 只请求一次)
+            realtime_data = self.get_stock_quote_data(code, include_fundamental)
+            if not realtime_data:
+                return None, False
+
+            # 获取行业信息
+            industry = self.get_stock_industry_info(code)
+            realtime_data['industry'] = industry
+
+            # 计算20日动量
+            momentum_ok = False
+            realtime_data['momentum_20d'] = 0
+            if calculate_momentum:
+                try:
+                    # 获取历史数据计算动量
+                    historical_data = self.get_stock_historical_data(code, days=30)
+                    if not historical_data.empty and len(historical_data) >= 20:
+                        start = time.perf_counter()
+                        realtime_data['momentum_20d'] = self.calculate_momentum(historical_data, days=20)
+                        trace_record('momentum', time.perf_counter() - start, count=1)
+                        momentum_ok = True
+                    else:
+                        logger.debug(f"{code} 历史数据不足20天，动量设为0 (数据量:{len(historical_data) if not historical_data.empty else 0})")
+                except Exception as e:
+                    logger.warning(f"计算 {code} 动量失败: {e}")
 
-        # 统计基本面数据获取情况
-        fundamental_success = 0
-        fundamental_fail = 0
+            return realtime_data, momentum_ok
+
+        except Exception as e:
+            logger.error(f"批量获取股票 {code} 数据失败: {e}")
+            return None, False
 
+    def batch_get_stock_data(self, stock_codes: List[str], calculate_momentum: bool = True,
+                            include_fundamental: bool = True, max_workers: int = 1) -> List[Dict]:
+        """
+        批量获取股票数据 - 带失败重试机制,包含基本面数据
+
+        Args:
+            stock_codes: 股票代码列表 (重复代码只处理第一次出现)
+            calculate_momentum: 是否计算动量
+            include_fundamental: 是否包含基本面数据
+            max_workers: 并行线程数, 1为逐只顺序获取; 大于1时用线程池并行,
+                         共享连接池和令牌桶限流, 结果仍按输入顺序返回
+
+        Returns:
+            股票数据列表
+        """
         # 清空失败列表
         self.failed_stocks = []
 
-        for i, code in enumerate(stock_codes):
-            try:
-                # 去重检查
-                if code in seen_codes:
-                    logger.warning(f"跳过重复股票: {code}")
-                    continue
-
-                # 获取实时数据
-                realtime_data = self.get_stock_realtime_data(code)
-                if not realtime_data:
-                    continue
-
-                # 获取行业信息
-                industry = self.get_stock_industry_info(code)
-                realtime_data['industry'] = industry
-
-                # 计算20日动量
-                if calculate_momentum:
-                    try:
-                        # 获取历史数据计算动量
-                        historical_data = self.get_stock_historical_data(code, days=30)
-                        if not historical_data.empty and len(historical_data) >= 20:
-                            momentum = self.calculate_momentum(historical_data, days=20)
-                            realtime_data['momentum_20d'] = momentum
-                            momentum_success += 1
-                            if (i + 1) % 50 == 0:
-                                logger.info(f"动量计算进度: {momentum_success}成功/{momentum_fail}失败")
-                        else:
-                            realtime_data['momentum_20d'] = 0
-                            momentum_fail += 1
-                            logger.debug(f"{code} 历史数据不足20天，动量设为0 (数据量:{len(historical_data) if not historical_data.empty else 0})")
-                    except Exception as e:
-                        logger.warning(f"计算 {code} 动量失败: {e}")
-                        realtime_data['momentum_20d'] = 0
-                        momentum_fail += 1
-                else:
-                    realtime_data['momentum_20d'] = 0
-
-                # 获取基本面数据
-                if include_fundamental:
-                    try:
-                        fundamental_data = self.get_stock_fundamental_data(code)
-                        if fundamental_data:
-                            realtime_data.update(fundamental_data)
-                            # 判断是否成功获取了关键指标
-                            if fundamental_data.get('roe') is not None or fundamental_data.get('pb_ratio') is not None:
-                                fundamental_success += 1
-                            else:
-                                fundamental_fail += 1
-                        else:
-                            fundamental_fail += 1
-                    except Exception as e:
-                        logger.warning(f"获取 {code} 基本面数据失败: {e}")
-                        fundamental_fail += 1
-
-                results.append(realtime_data)
-                seen_codes.add(code)  # 记录已处理的股票代码
+        # 去重
+        unique_codes = []
+        seen_codes = set()
+        for code in stock_codes:
+            if code in seen_codes:
+                logger.warning(f"跳过重复股票: {code}")
+                continue
+            seen_codes.add(code)
+            unique_codes.append(code)
+
+        total = len(unique_codes)
+        outputs: List[Tuple[Optional[Dict], bool]] = [(None, False)] * total
+        progress_step = 50
+
+        if max_workers > 1:
+            logger.info(f"并行获取 {total} 只股票数据 (线程数: {max_workers})")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # 每个任务带上调用方的上下文副本, 工作线程中的耗时统计归入当前trace
+                futures = {
+                    executor.submit(contextvars.copy_context().run, self._fetch_stock_record,
+                                    code, calculate_momentum, include_fundamental): i
+                    for i, code in enumerate(unique_codes)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    outputs[futures[future]] = future.result()
+                    if done % progress_step == 0 or done == total:
+                        logger.info(f"处理进度: {done}/{total} ({done / total * 100:.1f}%)")
+        else:
+            for i, code in enumerate(unique_codes):
+                outputs[i] = self._fetch_stock_record(code, calculate_momentum, include_fundamental)
+                if (i + 1) % progress_step == 0 or i + 1 == total:
+                    logger.info(f"处理进度: {i + 1}/{total} ({(i + 1) / total * 100:.1f}%)")
+
+        results = [data for data, _ in outputs if data]
 
-                # 优化请求间隔时间，更好地防止限流
-                # 使用随机延迟模拟人工操作
-                if calculate_momentum:
-                    if (i + 1) % 3 == 0:
-                        # 每处理3只股票暂停较长时间
-                        self._random_delay(1.5, 3.0)
-                    else:
-                        # 正常随机间隔
-                        self._random_delay(0.5, 1.2)
-                else:
-                    if (i + 1) % 10 == 0:
-                        self._random_delay(1.0, 2.0)
-                    else:
-                        self._random_delay(0.3, 0.8)
+        # 统计动量计算情况
+        momentum_success = sum(1 for data, ok in outputs if data and ok)
+        momentum_fail = len(results) - momentum_success
 
-            except Exception as e:
-                logger.error(f"批量获取股票 {code} 数据失败: {e}")
-                continue
+        # 统计基本面数据 (已随行情记录一起解析), 判断是否成功获取了关键指标
+        fundamental_success = sum(
+            1 for data in results
+            if data.get('roe') is not None or data.get('pb_ratio') is not None
+        )
+        fundamental_fail = len(results) - fundamental_success
 
         logger.info(f"批量获取完成，去重前: {len(stock_codes)}只，去重后: {len(results)}只")
         if calculate_momentum:
@@ -917,15 +531,13 @@ class StockDataFetcher:
     def _retry_failed_stocks(self, calculate_momentum: bool = True) -> List[Dict]:
         """重试失败的股票"""
         retry_results = []
-        failed_codes = self.failed_stocks.copy()
-        self.failed_stocks = []  # 清空失败列表
+        with self._failed_lock:
+            failed_codes = self.failed_stocks.copy()
+            self.failed_stocks = []  # 清空失败列表
 
+        # 不再固定等待: 请求按令牌桶速率发出, 单次请求失败仍有指数退避
         logger.info(f"开始重试 {len(failed_codes)} 只失败股票...")
 
-        # 等待一段时间再重试
-        logger.info("等待10秒后开始重试...")
-        time.sleep(10)
-
         for i, code in enumerate(failed_codes):
             try:
                 # 获取实时数据
@@ -951,9 +563,6 @@ class StockDataFetcher:
                 retry_results.append(realtime_data)
                 logger.info(f"重试成功: {code} ({i+1}/{len(failed_codes)})")
 
-                # 重试时使用更保守的延迟
-                self._random_delay(2.0, 4.0)
-
             except Exception as e:
                 logger.error(f"重试股票 {code} 仍然失败: {e}")
                 continue
@@ -0,0 +1,236 @@
+"""
+时点因子存储
+
+每日盘后分析把每只股票当天实际计算出的因子 (PE、PB、ROE、净利润增长率、股息率、换手率、20日动量)
+按日期保存一份快照, 回测某个历史日期时只使用该日及之前的快照, 避免用今天的估值回测过去 (前视偏差)。
+
+- 每日快照: daily/YYYYMMDD.npz (股票代码 + 各因子列), 先写临时文件再替换
+- 面板: panel.npy 为 因子 × 日期 × 股票 的float64矩阵, panel.json 记录各维度的标签;
+  快照有新增时重新合并, 读取时使用内存映射, 回测只读取用到的日期行
+"""
+
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+from src.data.kline_store import expected_last_bar_date
+from src.data.market_clock import market_phase, CLOSED, PRE_OPEN
+
+logger = logging.getLogger(__name__)
+
+FACTOR_FIELDS = ('pe_ratio', 'pb_ratio', 'roe', 'profit_growth', 'dividend_yield', 'turnover_rate', 'momentum_20d')
+
+
+def snapshot_date(now: datetime = None) -> Optional[str]:
+    """
+    当前行情对应的快照日期 (YYYY-MM-DD)
+
+    Returns:
+        收盘后、开盘前和非交易日返回最近一个已收盘交易日; 盘中行情尚未定格, 返回None
+    """
+    phase, _ = market_phase(now)
+    if phase not in (CLOSED, PRE_OPEN):
+        return None
+    return expected_last_bar_date(now).strftime('%Y-%m-%d')
+
+
+class FactorPanel:
+    """因子 × 日期 × 股票 的只读面板, 按日期取最近一份不晚于该日的快照"""
+
+    def __init__(self, dates: np.ndarray, codes: List[str], values: np.ndarray, max_age_days: int):
+        """
+        Args:
+            dates: 快照日期 (datetime64[D], 升序)
+            codes: 股票代码
+            values: (len(FACTOR_FIELDS), len(dates), len(codes)) 矩阵, 没有数据为NaN
+            max_age_days: 快照最多可以比回测日早多少天
+        """
+        self.dates = dates
+        self.codes = codes
+        self.values = values
+        self.max_age_days = max_age_days
+        self._columns = {code: j for j, code in enumerate(codes)}
+
+    def rows(self, days) -> np.ndarray:
+        """各回测日可用快照的行号, 没有快照或快照过旧时为-1"""
+        query = np.array(days, dtype='datetime64[D]')
+        rows = np.searchsorted(self.dates, query, side='right') - 1
+        valid = rows >= 0
+        age = query - self.dates[np.clip(rows, 0, None)]
+        return np.where(valid & (age <= np.timedelta64(self.max_age_days, 'D')), rows, -1)
+
+    def covers(self, day: str) -> bool:
+        return bool(self.rows([day])[0] >= 0)
+
+    def take(self, days: List[str], codes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        各回测日每只股票的时点因子
+
+        Returns:
+            因子名 -> (日期 × 股票) 矩阵, 没有快照的日期或股票为NaN
+        """
+        rows = self.rows(days)
+        columns = np.array([self._columns.get(code, -1) for code in codes], dtype=np.int64)
+        result = {}
+        for k, field in enumerate(FACTOR_FIELDS):
+            block = np.asarray(self.values[k][np.clip(rows, 0, None)][:, np.clip(columns, 0, None)])
+            block = np.where((rows[:, None] >= 0) & (columns[None, :] >= 0), block, np.nan)
+            result[field] = block
+        return result
+
+    def records(self, day: str, codes: List[str]) -> Dict[str, Dict[str, float]]:
+        """某个回测日的时点因子, 股票代码 -> {因子: 值} (只包含有数据的因子; 没有快照时为空)"""
+        factors = self.take([day], codes)
+        result = {}
+        for j, code in enumerate(codes):
+            values = {field: float(factors[field][0, j]) for field in FACTOR_FIELDS
+                      if not np.isnan(factors[field][0, j])}
+            if values:
+                result[code] = values
+        return result
+
+
+class FactorStore:
+    """每日因子快照的持久化和面板加载"""
+
+    def __init__(self, store_dir: str = None, read_only: bool = False, max_age_days: int = None):
+        """
+        Args:
+            store_dir: 存储目录 (默认 DATA_CONFIG['factor_store_dir'])
+            read_only: 只读 (多进程回测的工作进程使用, 不重新合并面板)
+            max_age_days: 快照最多可以比回测日早多少天 (默认 DATA_CONFIG['factor_max_age_days'])
+        """
+        self.store_dir = store_dir or DATA_CONFIG.get(
+            'factor_store_dir', os.path.join(DATA_CONFIG['cache_dir'], 'factors')
+        )
+        self.daily_dir = os.path.join(self.store_dir, 'daily')
+        self.read_only = read_only
+        self.max_age_days = (max_age_days if max_age_days is not None
+                             else DATA_CONFIG.get('factor_max_age_days', 7))
+        self._lock = threading.Lock()
+        if not read_only:
+            os.makedirs(self.daily_dir, exist_ok=True)
+
+    def _daily_path(self, day: str) -> str:
+        return os.path.join(self.daily_dir, f"{day.replace('-', '')}.npz")
+
+    def _snapshot_days(self) -> List[str]:
+        if not os.path.isdir(self.daily_dir):
+            return []
+        return sorted(f"{name[:4]}-{name[4:6]}-{name[6:8]}" for name in os.listdir(self.daily_dir)
+                      if name.endswith('.npz') and len(name) == 12 and name[:8].isdigit())
+
+    # ---------- 写入 ----------
+
+    def record(self, day: str, stocks: List[Dict]) -> bool:
+        """
+        保存某日的因子快照 (同一天重复保存时覆盖)
+
+        Args:
+            day: 快照日期 YYYY-MM-DD
+            stocks: 股票数据字典列表 (缺失或非数值的因子记为NaN)
+        """
+        codes = [stock['code'] for stock in stocks if stock.get('code')]
+        if not codes:
+            return False
+        columns = {}
+        for field in FACTOR_FIELDS:
+            values = [stock.get(field) for stock in stocks if stock.get('code')]
+            columns[field] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+
+        path = self._daily_path(day)
+        tmp_path = f"{path}.tmp.npz"
+        try:
+            np.savez(tmp_path, codes=np.array(codes, dtype=str), **columns)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存因子快照失败 {day}: {e}")
+            return False
+        logger.info(f"因子快照已保存: {day}, {len(codes)} 只股票")
+        return True
+
+    # ---------- 面板 ----------
+
+    def _compact(self, days: List[str]):
+        """把全部每日快照合并为一个面板文件"""
+        snapshots = []
+        for day in days:
+            try:
+                with np.load(self._daily_path(day)) as data:
+                    snapshots.append((day, data['codes'].tolist(),
+                                      {field: data[field] for field in FACTOR_FIELDS if field in data.files}))
+            except Exception as e:
+                logger.warning(f"读取因子快照失败 {day}: {e}")
+
+        codes = sorted({code for _, day_codes, _ in snapshots for code in day_codes})
+        index = {code: j for j, code in enumerate(codes)}
+        values = np.full((len(FACTOR_FIELDS), len(snapshots), len(codes)), np.nan)
+        for i, (_, day_codes, columns) in enumerate(snapshots):
+            positions = np.array([index[code] for code in day_codes], dtype=np.int64)
+            for k, field in enumerate(FACTOR_FIELDS):
+                if field in columns:
+                    values[k, i, positions] = columns[field]
+
+        panel_path = os.path.join(self.store_dir, 'panel.npy')
+        index_path = os.path.join(self.store_dir, 'panel.json')
+        np.save(f"{panel_path}.tmp.npy", values)
+        with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'fields': list(FACTOR_FIELDS), 'dates': [day for day, _, _ in snapshots], 'codes': codes}, f)
+        os.replace(f"{panel_path}.tmp.npy", panel_path)
+        os.replace(f"{index_path}.tmp", index_path)
+        logger.info(f"因子面板已合并: {len(snapshots)} 个交易日 × {len(codes)} 只股票")
+
+    def load(self) -> Optional[FactorPanel]:
+        """
+        加载因子面板 (内存映射); 有新的每日快照时先重新合并
+
+        Returns:
+            FactorPanel; 没有任何快照时返回None
+        """
+        panel_path = os.path.join(self.store_dir, 'panel.npy')
+        index_path = os.path.join(self.store_dir, 'panel.json')
+        with self._lock:
+            try:
+                index = None
+                if os.path.exists(index_path):
+                    with open(index_path, 'r', encoding='utf-8') as f:
+                        index = json.load(f)
+                if not self.read_only:
+                    days = self._snapshot_days()
+                    stale = index is None or index['dates'] != days or index['fields'] != list(FACTOR_FIELDS)
+                    if days and stale:
+                        self._compact(days)
+                        with open(index_path, 'r', encoding='utf-8') as f:
+                            index = json.load(f)
+                if not index or not index['dates']:
+                    return None
+                values = np.load(panel_path, mmap_mode='r')
+            except Exception as e:
+                logger.warning(f"加载因子面板失败: {e}")
+                return None
+        return FactorPanel(np.array(index['dates'], dtype='datetime64[D]'), index['codes'],
+                           values, self.max_age_days)
+
+
+_shared_store: Optional[FactorStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_factor_store() -> FactorStore:
+    """获取进程内共享的因子存储 (按 DATA_CONFIG 配置创建)"""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                _shared_store = FactorStore()
+    return _shared_store
@@ -0,0 +1,162 @@
+"""
+进程级历史K线缓存
+
+所有数据获取器和 MarketAnalyzer 共用同一个缓存实例 (get_history_cache),
+同一进程内的重复分析、API请求和定时任务可以直接复用已获取的K线。
+没有全市场快照时, 单只股票的行情记录也缓存在这里 (键见 quote_cache_key), 收盘后到下一次开盘不再重复请求。
+按最近最少使用(LRU)淘汰, 同时限制条目数和内存占用, 每个条目有独立的过期时间。
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class HistoryCache:
+    """带容量上限和TTL的线程安全LRU缓存"""
+
+    def __init__(self, max_entries: int = 20000, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: float = 3600):
+        """
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 最大内存占用(字节)
+            ttl: 默认过期时间(秒)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (value, expire_at, size)
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        """读取缓存, 未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expire_at, size = entry
+            if time.time() >= expire_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Any, value: Any, ttl: float = None):
+        """写入缓存, 超出容量时淘汰最久未使用的条目; ttl<=0 (如集合竞价时段) 不写入"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        expire_at = time.time() + ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._entries[key] = (value, expire_at, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: Any):
+        """删除单个条目"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self):
+        """清空缓存 (统计计数保留)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and time.time() < entry[1]
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def quote_cache_key(stock_code: str, include_fundamental: bool) -> tuple:
+    """单只股票行情记录在共享缓存中的键 (与历史K线的 (代码, 天数) 键区分)"""
+    return ('quote', stock_code, include_fundamental)
+
+
+def quote_cache_base_ttl() -> float:
+    """连续竞价时单只股票行情的缓存时间, 实际有效期由 market_clock.cache_ttl 按交易时段决定"""
+    return DATA_CONFIG.get('quote_cache_ttl', DATA_CONFIG.get('snapshot_refresh_interval', 60))
+
+
+_shared_cache: Optional[HistoryCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_history_cache() -> HistoryCache:
+    """获取进程内共享的历史K线缓存 (按 DATA_CONFIG 配置创建)"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = HistoryCache(
+                    max_entries=DATA_CONFIG.get('history_cache_max_entries', 20000),
+                    max_bytes=int(DATA_CONFIG.get('history_cache_max_mb', 256) * 1024 * 1024),
+                    ttl=DATA_CONFIG.get('history_cache_ttl', 3600),
+                )
+    return _shared_cache
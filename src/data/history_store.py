@@ -0,0 +1,205 @@
+"""
+回测日线存储
+
+每只股票一个 .npz 文件, 保存 akshare stock_zh_a_hist 的前复权日线及已覆盖的日期区间。
+请求某个区间时, 已覆盖则直接读本地; 否则把新区间与已覆盖区间合并后一次下载整段
+(同一次下载的复权基准一致), 之后任意 (股票, 日期) 的查询都在日期索引上二分查找。
+
+尚未收盘的日期不计入覆盖区间; 文件超过 cache_expire_days 天后整段重新下载 (复权因子可能已变化)。
+下载限速只作用于真正访问网络的请求, 本地命中不等待; 多进程回测的工作进程以只读方式共享同一目录。
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.backtest_config import BACKTEST_SAMPLE_CONFIG
+from src.data.kline_store import expected_last_bar_date
+
+logger = logging.getLogger(__name__)
+
+# akshare stock_zh_a_hist 的数值列
+HISTORY_COLUMNS = ['开盘', '收盘', '最高', '最低', '成交量', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率']
+
+
+def _day(value) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+def download_history(stock_code: str, start: np.datetime64, end: np.datetime64) -> pd.DataFrame:
+    """从akshare下载前复权日线"""
+    import akshare as ak
+
+    return ak.stock_zh_a_hist(symbol=stock_code, period="daily",
+                              start_date=pd.Timestamp(start).strftime('%Y%m%d'),
+                              end_date=pd.Timestamp(end).strftime('%Y%m%d'), adjust="qfq")
+
+
+class _History:
+    """一只股票的日线 (按日期升序) 及已覆盖区间"""
+
+    def __init__(self, dates: np.ndarray, columns: Dict[str, np.ndarray],
+                 covered: Tuple[np.datetime64, np.datetime64], fetched_at: float):
+        self.dates = dates
+        self.columns = columns
+        self.covered = covered
+        self.fetched_at = fetched_at
+
+    def covers(self, start: np.datetime64, end: np.datetime64) -> bool:
+        return self.covered[0] <= start and end <= self.covered[1]
+
+    def frame(self, lo: int, hi: int) -> pd.DataFrame:
+        data = {'日期': pd.to_datetime(self.dates[lo:hi])}
+        data.update({name: values[lo:hi] for name, values in self.columns.items()})
+        return pd.DataFrame(data)
+
+
+class HistoryStore:
+    """按股票代码持久化、按区间补齐的回测日线"""
+
+    def __init__(self, store_dir: str = None, persist: bool = True, expire_days: float = None,
+                 downloader: Callable[[str, np.datetime64, np.datetime64], pd.DataFrame] = None,
+                 read_only: bool = False, pause_every: int = 20, pause_seconds: float = 0.3):
+        """
+        Args:
+            store_dir: 存储目录 (默认 BACKTEST_SAMPLE_CONFIG['history_dir'])
+            persist: 是否读写本地文件 (录制/回放时关闭, 只在内存中去重)
+            expire_days: 文件有效天数 (默认 BACKTEST_SAMPLE_CONFIG['cache_expire_days'])
+            downloader: 下载函数 (默认 download_history)
+            read_only: 只读本地文件, 不写入 (多进程共享目录时使用); 未覆盖的区间下载后只保存在内存
+            pause_every: 每下载多少只股票暂停一次
+            pause_seconds: 暂停秒数
+        """
+        self.store_dir = store_dir or BACKTEST_SAMPLE_CONFIG.get('history_dir', './cache/history')
+        self.persist = persist
+        self.expire_days = (expire_days if expire_days is not None
+                            else BACKTEST_SAMPLE_CONFIG.get('cache_expire_days', 7))
+        self.downloader = downloader or download_history
+        self.read_only = read_only
+        self.pause_every = pause_every
+        self.pause_seconds = pause_seconds
+        self.downloads = 0
+        self._histories: Dict[str, _History] = {}
+        self._lock = threading.Lock()
+        if persist and not read_only:
+            os.makedirs(self.store_dir, exist_ok=True)
+
+    def _path(self, stock_code: str) -> str:
+        return os.path.join(self.store_dir, f"{stock_code}.npz")
+
+    # ---------- 读写 ----------
+
+    def _load(self, stock_code: str) -> Optional[_History]:
+        history = self._histories.get(stock_code)
+        if history is not None or not self.persist:
+            return history
+
+        path = self._path(stock_code)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                history = _History(
+                    dates=data['date'].astype('datetime64[D]'),
+                    columns={name: data[name] for name in HISTORY_COLUMNS if name in data.files},
+                    covered=tuple(data['covered'].astype('datetime64[D]')),
+                    fetched_at=float(data['fetched_at']),
+                )
+        except Exception as e:
+            logger.warning(f"读取本地日线失败 {stock_code}: {e}")
+            return None
+        self._histories[stock_code] = history
+        return history
+
+    def _save(self, stock_code: str, history: _History):
+        path = self._path(stock_code)
+        tmp_path = f"{path}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path,
+                date=history.dates.astype(np.int64),
+                covered=np.array(history.covered, dtype='datetime64[D]').astype(np.int64),
+                fetched_at=np.float64(history.fetched_at),
+                **history.columns
+            )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存本地日线失败 {stock_code}: {e}")
+
+    # ---------- 区间补齐 ----------
+
+    def ensure(self, stock_code: str, start, end) -> bool:
+        """
+        确保 [start, end] 区间的日线在本地 (未收盘的日期不要求)
+
+        Returns:
+            是否访问了网络
+        """
+        start = _day(start)
+        end = min(_day(end), np.datetime64(expected_last_bar_date(), 'D'))
+        if end < start:
+            return False
+        with self._lock:
+            history = self._load(stock_code)
+            if history is not None:
+                expired = time.time() - history.fetched_at > self.expire_days * 86400
+                if history.covers(start, end) and not expired:
+                    return False
+                start, end = min(start, history.covered[0]), max(end, history.covered[1])
+
+        # 下载不占锁, 不同股票可以并行
+        try:
+            frame = self.downloader(stock_code, start, end)
+        except Exception as e:
+            logger.debug(f"下载 {stock_code} 日线失败: {e}")
+            return True
+
+        history = self._from_frame(frame, (start, end))
+        with self._lock:
+            self.downloads += 1
+            pause = self.pause_every > 0 and self.downloads % self.pause_every == 0
+            self._histories[stock_code] = history
+            if self.persist and not self.read_only:
+                self._save(stock_code, history)
+        if pause:
+            time.sleep(self.pause_seconds)
+        return True
+
+    @staticmethod
+    def _from_frame(frame: pd.DataFrame, covered) -> _History:
+        if frame is None or frame.empty:
+            return _History(np.array([], dtype='datetime64[D]'), {}, covered, time.time())
+        frame = frame.assign(日期=pd.to_datetime(frame['日期'])).sort_values('日期')
+        columns = {name: pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=np.float64)
+                   for name in HISTORY_COLUMNS if name in frame.columns}
+        return _History(frame['日期'].to_numpy().astype('datetime64[D]'), columns, covered, time.time())
+
+    # ---------- 查询 ----------
+
+    def get_range(self, stock_code: str, start, end) -> pd.DataFrame:
+        """[start, end] 区间的日线 (列名与 stock_zh_a_hist 相同, 日期为Timestamp), 没有数据时为空"""
+        self.ensure(stock_code, start, end)
+        history = self._load(stock_code)
+        if history is None:
+            return pd.DataFrame()
+        lo = np.searchsorted(history.dates, _day(start), side='left')
+        hi = np.searchsorted(history.dates, _day(end), side='right')
+        return history.frame(lo, hi)
+
+    def window(self, stock_code: str, date, lookback_days: int) -> pd.DataFrame:
+        """[date - lookback_days, date] 内的日线, 即截至 date 可见的最近行情 (最后一行为 date 当天或之前最近的K线)"""
+        end = _day(date)
+        return self.get_range(stock_code, end - np.timedelta64(lookback_days, 'D'), end)
+
+    def stats(self) -> Dict:
+        persisted = self.persist and os.path.isdir(self.store_dir)
+        files = len([f for f in os.listdir(self.store_dir) if f.endswith('.npz')]) if persisted else 0
+        return {'symbols': len(self._histories), 'downloads': self.downloads, 'files': files}
@@ -0,0 +1,390 @@
+"""
+HTTP传输层
+
+两个数据获取器共用的请求实现: 请求头和User-Agent轮换、连接池与keep-alive、
+重试与指数退避、响应校验、按主机限流以及请求耗时回调。
+- HttpTransport: 基于 requests.Session (同步, 线程安全)
+- AsyncHttpTransport: 基于 aiohttp.ClientSession (异步)
+- FakeTransport / AsyncFakeTransport: 内存实现, 由处理函数直接返回响应文本, 用于离线测试和基准
+
+host_map 可以把真实主机映射到本地替身服务器, 例如
+{'qt.gtimg.cn': 'http://127.0.0.1:8765'}, 整条流水线即可在离线环境下运行。
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import aiohttp
+except ImportError:  # 同步模式不依赖aiohttp
+    aiohttp = None
+
+# 添加项目根路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.data.rate_limiter import get_rate_limiter
+from src.monitoring.metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+# User-Agent池 - 模拟不同的浏览器
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+]
+
+
+def build_headers() -> Dict[str, str]:
+    """请求头 (随机User-Agent)"""
+    return {
+        'User-Agent': random.choice(USER_AGENTS),
+        'Accept': '*/*',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Connection': 'keep-alive',
+        'Referer': 'https://gu.qq.com/'
+    }
+
+
+@dataclass
+class RetryPolicy:
+    """重试策略: 第n次失败后等待 backoff_base * 2**n + uniform(0, jitter) 秒"""
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    jitter: float = 0.0
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+
+@dataclass
+class RequestTiming:
+    """单次请求尝试的结果, 传给耗时回调"""
+    host: str
+    url: str
+    status: Optional[int]
+    latency: float
+    ok: bool
+    attempt: int
+    error: Optional[str] = None  # 'timeout' 或异常信息
+    bytes: int = 0  # 响应体大小 (按UTF-8编码计)
+
+
+TimingHook = Callable[[RequestTiming], None]
+Validator = Callable[[str], bool]
+
+
+def _body_size(text: Optional[str]) -> int:
+    return len(text.encode('utf-8')) if text else 0
+
+
+def _host_of(url: str) -> str:
+    return urlsplit(url).hostname or ''
+
+
+class _BaseTransport:
+    """同步/异步传输层的公共部分: 主机映射、限流和耗时回调"""
+
+    def __init__(self, retry: RetryPolicy = None, host_map: Dict[str, str] = None,
+                 rate_limit: bool = True, hooks: List[TimingHook] = None):
+        """
+        Args:
+            retry: 默认重试策略
+            host_map: 主机名 -> 替代基础地址 (如本地替身服务器)
+            rate_limit: 是否按主机使用令牌桶限流 (RATE_LIMIT_CONFIG)
+            hooks: 每次请求尝试后调用的耗时回调 (进程级请求指标 src.monitoring.metrics 总是会记录)
+        """
+        self.retry = retry or RetryPolicy()
+        self.host_map = dict(host_map or {})
+        self.rate_limit = rate_limit
+        self.hooks: List[TimingHook] = [observe_request] + list(hooks or [])
+
+    def add_hook(self, hook: TimingHook):
+        self.hooks.append(hook)
+
+    def resolve(self, url: str) -> str:
+        """按 host_map 改写请求地址"""
+        if not self.host_map:
+            return url
+        parts = urlsplit(url)
+        base = self.host_map.get(parts.hostname)
+        if not base:
+            return url
+        base_parts = urlsplit(base)
+        return urlunsplit((base_parts.scheme, base_parts.netloc, parts.path, parts.query, parts.fragment))
+
+    def _emit(self, timing: RequestTiming, on_attempt: Optional[TimingHook]):
+        for hook in self.hooks:
+            try:
+                hook(timing)
+            except Exception as e:
+                logger.debug(f"耗时回调失败: {e}")
+        if on_attempt is not None:
+            on_attempt(timing)
+
+
+class HttpTransport(_BaseTransport):
+    """同步传输层 - 共享 requests.Session 连接池"""
+
+    def __init__(self, retry: RetryPolicy = None, pool_size: int = 16,
+                 host_map: Dict[str, str] = None, rate_limit: bool = True,
+                 hooks: List[TimingHook] = None):
+        """
+        Args:
+            pool_size: 每个主机的连接池大小 (应不小于并行线程数)
+        """
+        super().__init__(retry or RetryPolicy(max_retries=5, backoff_base=1.0, jitter=1.0),
+                         host_map, rate_limit, hooks)
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """共享的 requests.Session, 首次使用时创建"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.pool_size)
+                    session = requests.Session()
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _send(self, url: str, timeout: float):
+        """发送一次请求, 返回 (状态码, 响应文本)"""
+        response = self.session.get(url, headers=build_headers(), timeout=timeout)
+        return response.status_code, response.text
+
+    def get_text(self, url: str, timeout: float = 10, max_retries: int = None,
+                 validate: Validator = None, on_attempt: TimingHook = None) -> Optional[str]:
+        """
+        GET请求并返回响应文本, 失败或校验不通过时按重试策略重试
+
+        Args:
+            url: 请求地址
+            timeout: 单次请求超时(秒)
+            max_retries: 最大尝试次数 (默认使用重试策略)
+            validate: 响应文本校验函数, 返回False视为失败并重试
+            on_attempt: 本次调用专用的耗时回调
+
+        Returns:
+            响应文本, 所有尝试都失败时返回None
+        """
+        max_retries = max_retries or self.retry.max_retries
+        target = self.resolve(url)
+        host = _host_of(url)
+
+        for attempt in range(max_retries):
+            if self.rate_limit:
+                get_rate_limiter(host).acquire()
+
+            start = time.monotonic()
+            status, error = None, None
+            try:
+                status, text = self._send(target, timeout)
+                ok = status == 200 and (validate is None or validate(text))
+            except Exception as e:
+                text, ok = None, False
+                error = 'timeout' if isinstance(e, TimeoutError) or 'Timeout' in type(e).__name__ else str(e)
+                logger.debug(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+
+            self._emit(RequestTiming(host, url, status, time.monotonic() - start, ok, attempt, error,
+                                     _body_size(text)), on_attempt)
+            if ok:
+                return text
+
+            if attempt < max_retries - 1:
+                backoff_time = self.retry.delay(attempt)
+                logger.debug(f"{host} 请求未成功 (状态码 {status}), 等待 {backoff_time:.2f} 秒后重试...")
+                time.sleep(backoff_time)
+
+        return None
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class _NullSession:
+    """不发起网络请求的会话占位 (内存传输层使用)"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        pass
+
+
+class AsyncHttpTransport(_BaseTransport):
+    """异步传输层 - aiohttp会话由调用方创建并在整批请求间复用"""
+
+    def __init__(self, retry: RetryPolicy = None, host_map: Dict[str, str] = None,
+                 rate_limit: bool = False, hooks: List[TimingHook] = None):
+        """
+        Args:
+            rate_limit: 是否按主机令牌桶限流 (异步获取器默认由自适应并发窗口控制, 不额外限流)
+        """
+        super().__init__(retry or RetryPolicy(max_retries=3, backoff_base=0.5), host_map, rate_limit, hooks)
+
+    def create_session(self, limit: int = 100, limit_per_host: int = 20,
+                       total_timeout: float = 60, connect_timeout: float = 10,
+                       read_timeout: float = 15):
+        """创建带连接池的aiohttp会话"""
+        if aiohttp is None:
+            raise ImportError("异步传输层需要安装 aiohttp")
+
+        connector = aiohttp.TCPConnector(
+            limit=limit,  # 总连接数
+            limit_per_host=limit_per_host,  # 每个主机的连接数
+            ttl_dns_cache=300,  # DNS缓存5分钟
+        )
+        timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout, sock_read=read_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def _send(self, session, url: str, timeout: float):
+        async with session.get(url, headers=build_headers(), timeout=timeout) as response:
+            if response.status != 200:
+                return response.status, None
+            return response.status, await response.text()
+
+    async def get_text(self, session, url: str, timeout: float = 10, max_retries: int = None,
+                       validate: Validator = None, on_attempt: TimingHook = None) -> Optional[str]:
+        """
+        异步GET请求并返回响应文本 (参数含义同 HttpTransport.get_text)
+
+        Args:
+            session: create_session 创建的会话
+        """
+        max_retries = max_retries or self.retry.max_retries
+        target = self.resolve(url)
+        host = _host_of(url)
+
+        for attempt in range(max_retries):
+            if self.rate_limit:
+                await get_rate_limiter(host).acquire_async()
+
+            start = time.monotonic()
+            status, text, error = None, None, None
+            try:
+                status, text = await self._send(session, target, timeout)
+                ok = status == 200 and (validate is None or validate(text))
+            except asyncio.TimeoutError:
+                ok, error = False, 'timeout'
+                logger.debug(f"请求超时 (尝试 {attempt + 1}/{max_retries}): {url[:80]}...")
+            except Exception as e:
+                ok, error = False, str(e)
+                logger.debug(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+
+            self._emit(RequestTiming(host, url, status, time.monotonic() - start, ok, attempt, error,
+                                     _body_size(text)), on_attempt)
+            if ok:
+                return text
+
+            # 等待后重试
+            if attempt < max_retries - 1:
+                await asyncio.sleep(self.retry.delay(attempt))
+
+        return None
+
+
+FakeHandler = Union[Callable[[str], Optional[str]], Dict[str, str]]
+
+
+def _call_handler(handler: FakeHandler, url: str):
+    """调用内存处理函数, 返回 (状态码, 响应文本); 处理函数返回None视为404"""
+    if isinstance(handler, dict):
+        text = handler.get(url)
+    else:
+        text = handler(url)
+    return (404, None) if text is None else (200, text)
+
+
+class FakeTransport(HttpTransport):
+    """内存同步传输层 - 不访问网络, 响应由处理函数给出, 并记录所有请求"""
+
+    def __init__(self, handler: FakeHandler, latency: float = 0.0, retry: RetryPolicy = None,
+                 hooks: List[TimingHook] = None):
+        """
+        Args:
+            handler: url -> 响应文本 的函数或字典
+            latency: 每次请求模拟的延迟(秒)
+        """
+        super().__init__(retry or RetryPolicy(max_retries=1, backoff_base=0), rate_limit=False, hooks=hooks)
+        self.handler = handler
+        self.latency = latency
+        self.requests: List[str] = []
+        self._requests_lock = threading.Lock()
+
+    def _send(self, url: str, timeout: float):
+        with self._requests_lock:
+            self.requests.append(url)
+        if self.latency:
+            time.sleep(self.latency)
+        return _call_handler(self.handler, url)
+
+
+class AsyncFakeTransport(AsyncHttpTransport):
+    """内存异步传输层"""
+
+    def __init__(self, handler: FakeHandler, latency: float = 0.0, retry: RetryPolicy = None,
+                 hooks: List[TimingHook] = None):
+        super().__init__(retry or RetryPolicy(max_retries=1, backoff_base=0), rate_limit=False, hooks=hooks)
+        self.handler = handler
+        self.latency = latency
+        self.requests: List[str] = []
+
+    def create_session(self, *args, **kwargs):
+        return _NullSession()
+
+    async def _send(self, session, url: str, timeout: float):
+        self.requests.append(url)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return _call_handler(self.handler, url)
+
+
+def default_transport(**kwargs) -> HttpTransport:
+    """
+    获取器默认使用的同步传输层: 启用了录制/回放 (见 src.data.replay) 时返回对应实现,
+    否则返回 HttpTransport
+    """
+    from src.data.replay import activate_from_env
+
+    fixtures = activate_from_env()
+    if fixtures is not None:
+        return fixtures.sync_transport(**kwargs)
+    return HttpTransport(**kwargs)
+
+
+def default_async_transport(**kwargs) -> AsyncHttpTransport:
+    """获取器默认使用的异步传输层 (规则同 default_transport)"""
+    from src.data.replay import activate_from_env
+
+    fixtures = activate_from_env()
+    if fixtures is not None:
+        return fixtures.async_transport(**kwargs)
+    return AsyncHttpTransport(**kwargs)
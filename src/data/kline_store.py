@@ -0,0 +1,184 @@
+"""
+本地日K线存储
+
+每只股票一个 .npz 文件, 记录前复权(qfq)日线。
+每次只向腾讯接口请求本地最后一个交易日之后缺失的几根K线;
+重叠K线的收盘价发生变化说明复权因子变了, 按比例整体调整已存数据,
+无法一致调整时返回None, 由调用方重新下载完整历史。
+
+盘中 (交易日9:30之后) 总是请求当日K线, 动量等指标包含最新价格, 但未收盘的当日K线不落盘。
+每次保存时记录检查时间; 停牌股票的最后一根K线早于最近交易日,
+检查时间晚于该交易日收盘时不再重复请求。
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime, timedelta, date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+from src.data.trading_calendar import get_trading_calendar
+from src.data.market_clock import to_market_time
+
+logger = logging.getLogger(__name__)
+
+KLINE_COLUMNS = ['open', 'close', 'high', 'low', 'volume']
+PRICE_COLUMNS = ['open', 'close', 'high', 'low']
+
+# 开盘时间, 之后接口返回当日未收盘K线
+MARKET_OPEN_TIME = (9, 30)
+# 收盘时间, 之后当日K线才算完整
+MARKET_CLOSE_TIME = (15, 0)
+
+
+def expected_last_bar_date(now: datetime = None) -> date:
+    """最近一个已收盘交易日 (按交易日历和北京时间, 节假日也不会出现新K线)"""
+    now = to_market_time(now)
+    day = now.date()
+    calendar = get_trading_calendar()
+    if calendar.is_trading_day(day) and (now.hour, now.minute) >= MARKET_CLOSE_TIME:
+        return day
+    return calendar.prev_trading_day(day)
+
+
+def latest_bar_date(now: datetime = None) -> date:
+    """接口能返回的最新K线日期: 盘中为当天 (未收盘K线), 否则为最近一个已收盘交易日"""
+    now = to_market_time(now)
+    if get_trading_calendar().is_trading_day(now.date()) and (now.hour, now.minute) >= MARKET_OPEN_TIME:
+        return now.date()
+    return expected_last_bar_date(now)
+
+
+class KlineStore:
+    """按股票代码持久化的日K线存储"""
+
+    def __init__(self, store_dir: str = None, overlap_bars: int = 2):
+        """
+        Args:
+            store_dir: 存储目录 (默认 DATA_CONFIG['kline_store_dir'])
+            overlap_bars: 增量请求时与本地数据重叠的K线数, 用于检测复权因子变化
+        """
+        self.store_dir = store_dir or DATA_CONFIG.get(
+            'kline_store_dir', os.path.join(DATA_CONFIG['cache_dir'], 'kline')
+        )
+        self.overlap_bars = overlap_bars
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _path(self, stock_code: str) -> str:
+        return os.path.join(self.store_dir, f"{stock_code}.npz")
+
+    def load(self, stock_code: str) -> pd.DataFrame:
+        """读取本地K线, 不存在时返回空DataFrame; 上次检查时间 (北京时间) 记录在 attrs['checked_at']"""
+        path = self._path(stock_code)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=['date'] + KLINE_COLUMNS)
+        try:
+            with np.load(path) as data:
+                frame = pd.DataFrame({
+                    'date': pd.to_datetime(data['date'].astype('datetime64[D]')),
+                    **{col: data[col] for col in KLINE_COLUMNS}
+                })
+                if 'checked_at' in data.files:
+                    frame.attrs['checked_at'] = pd.Timestamp(int(data['checked_at']), unit='s').to_pydatetime()
+            return frame
+        except Exception as e:
+            logger.warning(f"读取本地K线失败 {stock_code}: {e}")
+            return pd.DataFrame(columns=['date'] + KLINE_COLUMNS)
+
+    def read(self, stock_code: str, start: str = None, end: str = None) -> pd.DataFrame:
+        """读取指定日期区间的本地K线 (不访问网络)"""
+        frame = self.load(stock_code)
+        if frame.empty:
+            return frame
+        if start:
+            frame = frame[frame['date'] >= pd.Timestamp(start)]
+        if end:
+            frame = frame[frame['date'] <= pd.Timestamp(end)]
+        return frame.reset_index(drop=True)
+
+    def save(self, stock_code: str, frame: pd.DataFrame, checked_at: datetime = None):
+        """保存K线 (先写临时文件再替换, 避免中断时损坏), 同时记录检查时间"""
+        path = self._path(stock_code)
+        tmp_path = f"{path}.tmp.npz"
+        checked_at = to_market_time(checked_at)
+        try:
+            np.savez(
+                tmp_path,
+                date=frame['date'].to_numpy().astype('datetime64[D]').astype(np.int64),
+                checked_at=np.int64(pd.Timestamp(checked_at).value // 10**9),
+                **{col: frame[col].to_numpy(dtype=np.float64) for col in KLINE_COLUMNS}
+            )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存本地K线失败 {stock_code}: {e}")
+
+    def bars_to_request(self, stored: pd.DataFrame, days: int, now: datetime = None) -> int:
+        """
+        计算需要向接口请求的K线数量
+
+        Returns:
+            0 表示本地数据已是最新 (或停牌股票在最近交易日收盘后已检查过);
+            盘中至少请求当日K线; 本地数据不足 days 根时返回完整请求量 days*2
+        """
+        if stored.empty or len(stored) < days:
+            return int(days * 2)
+
+        last_stored = stored['date'].iloc[-1].date()
+        now = to_market_time(now)
+        today = now.date()
+        latest = latest_bar_date(now)
+        if last_stored >= latest:
+            return 0
+        checked_at = stored.attrs.get('checked_at')
+        if checked_at is not None and expected_last_bar_date(checked_at) >= latest:
+            return 0
+
+        missing = len(get_trading_calendar().trading_days(last_stored + timedelta(days=1), today))
+        return max(missing, 1) + self.overlap_bars
+
+    def update(self, stock_code: str, stored: pd.DataFrame, fetched: pd.DataFrame,
+               now: datetime = None) -> Optional[pd.DataFrame]:
+        """
+        合并新下载的K线并持久化
+
+        Returns:
+            合并后的完整K线; 复权因子变化且无法一致调整时返回None (需要重新下载完整历史)
+        """
+        if stored.empty:
+            merged = fetched
+        else:
+            overlap = stored.merge(fetched, on='date', suffixes=('_old', '_new'))
+            if overlap.empty:
+                logger.info(f"{stock_code} 增量K线与本地数据无重叠, 需要重新下载")
+                return None
+
+            ratios = (overlap['close_new'] / overlap['close_old']).to_numpy()
+            if not np.allclose(ratios, 1.0, rtol=1e-4):
+                if np.ptp(ratios) / ratios.mean() > 1e-3:
+                    logger.info(f"{stock_code} 复权因子变化不一致, 需要重新下载")
+                    return None
+                ratio = float(ratios.mean())
+                logger.info(f"{stock_code} 检测到复权因子变化, 本地K线按 {ratio:.6f} 调整")
+                stored = stored.copy()
+                stored[PRICE_COLUMNS] = stored[PRICE_COLUMNS] * ratio
+
+            first_new = fetched['date'].iloc[0]
+            merged = pd.concat([stored[stored['date'] < first_new], fetched], ignore_index=True)
+
+        self.replace(stock_code, merged, now)
+        return merged
+
+    def replace(self, stock_code: str, frame: pd.DataFrame, now: datetime = None) -> pd.DataFrame:
+        """用完整K线覆盖本地数据, 未收盘的当日K线不落盘"""
+        now = to_market_time(now)
+        last_complete = pd.Timestamp(expected_last_bar_date(now))
+        complete = frame[frame['date'] <= last_complete]
+        if not complete.empty:
+            self.save(stock_code, complete, checked_at=now)
+        return frame
@@ -0,0 +1,107 @@
+"""
+全市场涨跌统计 (市场宽度)
+
+行情表 -> 上涨/下跌/平盘家数、涨跌幅分布、指数涨跌。
+统计范围为股票池注册表中的全部A股 (src/data/universe.py), 行情来自全市场快照 (market_snapshot.py)。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 主要指数: 上证指数、深证成指、创业板指
+INDEX_SYMBOLS = ['sh000001', 'sz399001', 'sz399006']
+
+# 涨跌幅分布区间 (%), 平盘单独统计
+_DOWN_EDGES = [-9.5, -5, -2]
+_UP_EDGES = [2, 5, 9.5]
+DISTRIBUTION_LABELS = [
+    '跌停(≤-9.5%)', '-9.5~-5%', '-5~-2%', '-2~0%', '平盘', '0~2%', '2~5%', '5~9.5%', '涨停(≥9.5%)'
+]
+
+
+def compute_breadth(table: pd.DataFrame) -> Dict:
+    """
+    按行情表统计涨跌家数和涨跌幅分布
+
+    Args:
+        table: parse_quote_table 的结果 (需要 price、change_pct 列)
+
+    Returns:
+        统计字典; 价格为0的记录(停牌或无成交)计入 suspended_stocks, 不参与涨跌统计
+    """
+    if table.empty:
+        return {'success_count': 0, 'rising_stocks': 0, 'falling_stocks': 0, 'flat_stocks': 0,
+                'suspended_stocks': 0, 'rising_ratio': 0.0, 'distribution': {}}
+
+    price = table['price'].to_numpy(dtype=np.float64)
+    change = table['change_pct'].to_numpy(dtype=np.float64)
+    traded = price > 0
+    change = change[traded]
+
+    rising = int((change > 0).sum())
+    falling = int((change < 0).sum())
+    flat = int((change == 0).sum())
+    total = len(change)
+
+    # 下跌区间 [-inf,-9.5] (-9.5,-5] (-5,-2] (-2,0), 上涨区间 (0,2) [2,5) [5,9.5) [9.5,inf)
+    down = change[change < 0]
+    up = change[change > 0]
+    down_counts = np.bincount(np.searchsorted(_DOWN_EDGES, down, side='left'), minlength=4)
+    up_counts = np.bincount(np.searchsorted(_UP_EDGES, up, side='right'), minlength=4)
+    counts = list(down_counts) + [flat] + list(up_counts)
+
+    return {
+        'success_count': total,
+        'rising_stocks': rising,
+        'falling_stocks': falling,
+        'flat_stocks': flat,
+        'suspended_stocks': int((~traded).sum()),
+        'rising_ratio': rising / total * 100 if total else 0.0,
+        'avg_stock_change_pct': float(change.mean()) if total else 0.0,
+        'median_change_pct': float(np.median(change)) if total else 0.0,
+        'limit_up': int(counts[-1]),
+        'limit_down': int(counts[0]),
+        'distribution': {label: int(count) for label, count in zip(DISTRIBUTION_LABELS, counts)},
+    }
+
+
+def summarize_indices(index_table: pd.DataFrame) -> List[Dict]:
+    """主要指数的名称、涨跌幅和点位"""
+    if index_table.empty:
+        return []
+    rows = index_table.set_index('symbol').reindex(INDEX_SYMBOLS).dropna(subset=['name'])
+    return [{'name': row['name'], 'change_pct': float(row['change_pct']), 'price': float(row['price'])}
+            for _, row in rows.iterrows()]
+
+
+def build_overview(index_table: pd.DataFrame, stock_table: pd.DataFrame, universe_size: int,
+                   data_source: str = '腾讯财经实时数据(全市场)', update_time: datetime = None) -> Dict:
+    """
+    组装市场概况 (字段与原有 get_market_overview 一致, 另含涨跌幅分布)
+
+    Returns:
+        概况字典; 没有成功获取任何股票行情时返回空字典, 由调用方使用兜底数据
+    """
+    breadth = compute_breadth(stock_table)
+    if breadth['success_count'] == 0:
+        return {}
+
+    index_data = summarize_indices(index_table)
+    avg_change = sum(d['change_pct'] for d in index_data[:3]) / len(index_data[:3]) if index_data else 0
+
+    overview = {
+        'total_stocks': universe_size,
+        'update_time': update_time or datetime.now(),
+        'data_source': data_source,
+        'indices': index_data,
+        'avg_change_pct': avg_change,
+        'note': f"真实统计{breadth['success_count']}只股票涨跌数据",
+    }
+    overview.update(breadth)
+    return overview
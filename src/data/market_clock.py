@@ -0,0 +1,127 @@
+"""
+A股交易时段时钟
+
+按交易时段决定行情类缓存的有效期:
+- 连续竞价 (9:30-11:30, 13:00-14:57): 使用配置的短TTL, 且不超过本时段结束
+- 集合竞价 (9:15-9:30, 14:57-15:00 及收盘后的结算窗口): 行情随时变化, 不缓存
+- 午间休市: 缓存到 13:00
+- 收盘后、开盘前和非交易日: 行情不再变化, 缓存到下一次开盘 (9:15)
+
+非交易日按交易日历 (src/data/trading_calendar.py, 周末和交易所休市日) 判断。
+所有时间都是北京时间 (不带时区的本地时钟读数), 与服务器所在时区无关。
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone, time as dtime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Optional, Tuple
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+from src.data.trading_calendar import get_trading_calendar
+
+CALL_AUCTION = 'call_auction'
+CONTINUOUS = 'continuous'
+LUNCH_BREAK = 'lunch_break'
+PRE_OPEN = 'pre_open'
+CLOSED = 'closed'
+
+try:
+    MARKET_TZ = ZoneInfo('Asia/Shanghai')
+except ZoneInfoNotFoundError:  # Windows 未安装 tzdata; 中国不实行夏令时, 固定UTC+8等价
+    MARKET_TZ = timezone(timedelta(hours=8), 'Asia/Shanghai')
+
+OPEN_TIME = dtime(9, 15)
+
+# (开始, 结束, 时段), 按时间顺序
+_SESSIONS = [
+    (dtime(9, 15), dtime(9, 30), CALL_AUCTION),   # 开盘集合竞价
+    (dtime(9, 30), dtime(11, 30), CONTINUOUS),
+    (dtime(11, 30), dtime(13, 0), LUNCH_BREAK),
+    (dtime(13, 0), dtime(14, 57), CONTINUOUS),
+    (dtime(14, 57), dtime(15, 0), CALL_AUCTION),  # 收盘集合竞价
+]
+
+
+def market_now() -> datetime:
+    """当前北京时间 (不带时区), 服务器在UTC等其他时区时也按交易所时钟判断"""
+    return datetime.now(MARKET_TZ).replace(tzinfo=None)
+
+
+def to_market_time(now: Optional[datetime]) -> datetime:
+    """None -> 当前北京时间; 带时区的时间换算为北京时间; 不带时区的视为北京时间"""
+    if now is None:
+        return market_now()
+    if now.tzinfo is not None:
+        return now.astimezone(MARKET_TZ).replace(tzinfo=None)
+    return now
+
+
+def is_trading_day(day) -> bool:
+    """是否交易日 (排除周末和交易所休市日)"""
+    return get_trading_calendar().is_trading_day(day)
+
+
+def next_open(now: datetime = None) -> datetime:
+    """下一次开盘 (集合竞价开始) 的时间; 交易日9:15之前调用时返回当天9:15"""
+    now = to_market_time(now)
+    day = now.date()
+    if not (is_trading_day(day) and now.time() < OPEN_TIME):
+        day += timedelta(days=1)
+        while not is_trading_day(day):
+            day += timedelta(days=1)
+    return datetime.combine(day, OPEN_TIME)
+
+
+def market_phase(now: datetime = None) -> Tuple[str, Optional[datetime]]:
+    """
+    当前交易时段
+
+    Returns:
+        (时段, 时段结束时间); 收盘后、开盘前和非交易日的结束时间为下一次开盘
+    """
+    now = to_market_time(now)
+    if not is_trading_day(now.date()):
+        return CLOSED, next_open(now)
+
+    current = now.time()
+    if current < OPEN_TIME:
+        return PRE_OPEN, next_open(now)
+
+    for start, end, phase in _SESSIONS:
+        if start <= current < end:
+            return phase, datetime.combine(now.date(), end)
+
+    # 收盘后的结算窗口: 收盘价可能还在更新, 按集合竞价处理
+    close = datetime.combine(now.date(), _SESSIONS[-1][1])
+    settle_end = close + timedelta(seconds=DATA_CONFIG.get('close_settle_seconds', 60))
+    if now < settle_end:
+        return CALL_AUCTION, settle_end
+    return CLOSED, next_open(now)
+
+
+def cache_ttl(base_ttl: float, now: datetime = None) -> float:
+    """
+    行情类数据在当前时刻的缓存有效期(秒)
+
+    Args:
+        base_ttl: 连续竞价时段使用的TTL
+        now: 当前时间 (默认当前北京时间)
+
+    Returns:
+        集合竞价时为0 (不缓存), 连续竞价时不超过 base_ttl 和本时段剩余时间,
+        休市期间为距离行情下一次变化的秒数。关闭 DATA_CONFIG['market_hours_ttl'] 时直接返回 base_ttl
+    """
+    if not DATA_CONFIG.get('market_hours_ttl', True):
+        return base_ttl
+
+    now = to_market_time(now)
+    phase, end = market_phase(now)
+    if phase == CALL_AUCTION:
+        return 0.0
+    remaining = max(0.0, (end - now).total_seconds())
+    if phase == CONTINUOUS:
+        return min(base_ttl, remaining)
+    return remaining
@@ -0,0 +1,182 @@
+"""
+全市场行情快照
+
+一次扫描(按 breadth_batch_size 分批并发)取得全部A股的行情记录(含基本面字段),
+解析成一张以股票代码为索引的列式表格并记录时间。快照在进程内共享:
+有效期内, 盘后分析的行情阶段、市场概况、API股票详情和表现报告都直接读这张表,
+每只股票的行情在一个刷新间隔内最多下载一次。有效期随交易时段变化 (market_clock.cache_ttl):
+连续竞价时为刷新间隔, 收盘后到下一次开盘前一直有效, 集合竞价时不复用。
+
+获取器的行情方法会先查当前快照, 只有快照中没有的股票才单独请求。
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+from src.data.tencent_parser import quote_row_to_record
+from src.data.market_breadth import build_overview
+from src.data.market_clock import cache_ttl, market_now
+
+logger = logging.getLogger(__name__)
+
+
+class MarketSnapshot:
+    """某一时刻的全市场行情表"""
+
+    def __init__(self, table: pd.DataFrame, index_table: pd.DataFrame, universe_size: int,
+                 taken_at: datetime = None, elapsed: float = 0.0):
+        """
+        Args:
+            table: 股票行情表 (以股票代码为索引, 含基本面字段)
+            index_table: 主要指数行情表
+            universe_size: 扫描的股票数 (含获取失败的)
+            taken_at: 扫描完成时间
+            elapsed: 扫描耗时(秒)
+        """
+        self.table = table
+        self.index_table = index_table
+        self.universe_size = universe_size
+        self.taken_at = taken_at or market_now()
+        self.elapsed = elapsed
+        self._created = time.monotonic()
+        self.expires_at = time.time()  # 发布到 SnapshotCache 时按交易时段设置
+        self._overview: Optional[Dict] = None
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+
+    @property
+    def age(self) -> float:
+        """距扫描完成的秒数"""
+        return time.monotonic() - self._created
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, code: str) -> bool:
+        return not self.table.empty and code in self.table.index
+
+    def lookup(self, codes: List[str]) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        按代码取行情
+
+        Returns:
+            (快照中有的股票行情表(按输入顺序), 快照中没有的代码列表)
+        """
+        if self.table.empty:
+            return self.table, list(codes)
+        index = self.table.index
+        hits = [code for code in codes if code in index]
+        missing = [code for code in codes if code not in index]
+        return self.table.loc[hits], missing
+
+    def _column_arrays(self) -> Dict[str, np.ndarray]:
+        """各列的数组 (首次使用时生成), 逐只取值时不经过pandas的行索引"""
+        if self._arrays is None:
+            self._arrays = {column: self.table[column].to_numpy() for column in self.table.columns}
+        return self._arrays
+
+    def record(self, code: str, include_fundamental: bool = True) -> Optional[Dict]:
+        """单只股票的行情字典 (结构与 parse_quote_records 相同), 不在快照中返回None"""
+        if code not in self:
+            return None
+        return quote_row_to_record(self._column_arrays(), self.table.index.get_loc(code), include_fundamental)
+
+    def records(self, codes: List[str], include_fundamental: bool = True) -> List[Dict]:
+        """快照中有的股票的行情字典 (按输入顺序)"""
+        if self.table.empty:
+            return []
+        arrays = self._column_arrays()
+        index = self.table.index
+        return [quote_row_to_record(arrays, index.get_loc(code), include_fundamental)
+                for code in codes if code in index]
+
+    def overview(self) -> Dict:
+        """由快照统计的市场概况 (见 market_breadth.build_overview); 没有行情时为空字典"""
+        if self._overview is None:
+            self._overview = build_overview(self.index_table, self.table, self.universe_size,
+                                            update_time=self.taken_at)
+        return self._overview
+
+
+class SnapshotCache:
+    """进程内共享的最新快照 (线程安全, 并发请求只触发一次扫描)"""
+
+    def __init__(self, refresh_interval: float = None):
+        """
+        Args:
+            refresh_interval: 连续竞价时的快照有效期(秒), 默认 DATA_CONFIG['snapshot_refresh_interval']
+        """
+        self.refresh_interval = (refresh_interval if refresh_interval is not None
+                                 else DATA_CONFIG.get('snapshot_refresh_interval', 60))
+        self._snapshot: Optional[MarketSnapshot] = None
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self.sweeps = 0
+
+    def current(self, max_age: float = None) -> Optional[MarketSnapshot]:
+        """
+        未过期的快照, 没有时返回None
+
+        Args:
+            max_age: 指定时按快照时长判断, 否则按发布时根据交易时段计算的过期时间判断
+        """
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if max_age is not None:
+            return snapshot if snapshot.age <= max_age else None
+        return snapshot if time.time() < snapshot.expires_at else None
+
+    def publish(self, snapshot: MarketSnapshot):
+        """保存新扫描的快照 (空快照不保存, 下次调用会重新扫描)"""
+        if len(snapshot) == 0:
+            return
+        snapshot.expires_at = time.time() + cache_ttl(self.refresh_interval, snapshot.taken_at)
+        with self._lock:
+            self._snapshot = snapshot
+            self.sweeps += 1
+
+    def get(self, loader: Callable[[], MarketSnapshot], max_age: float = None) -> MarketSnapshot:
+        """
+        返回未过期的快照, 没有时调用 loader 扫描一次
+
+        多个线程同时请求时只有一个执行扫描, 其余等待并共用结果。
+        """
+        snapshot = self.current(max_age)
+        if snapshot is not None:
+            return snapshot
+        with self._sweep_lock:
+            snapshot = self.current(max_age)
+            if snapshot is not None:
+                return snapshot
+            snapshot = loader()
+            self.publish(snapshot)
+            return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = None
+
+
+_cache = SnapshotCache()
+
+
+def get_snapshot_cache() -> SnapshotCache:
+    """进程内共享的快照缓存"""
+    return _cache
+
+
+def current_snapshot() -> Optional[MarketSnapshot]:
+    """当前未过期的快照 (获取器的行情方法用它避免重复下载)"""
+    return _cache.current()
@@ -0,0 +1,132 @@
+"""
+令牌桶限流
+
+按主机名共享的令牌桶: 令牌按固定速率补充, 最多积累 burst 个。
+有令牌时立即放行, 没有令牌时只等待到下一个令牌可用为止,
+取代原来每只股票固定的随机休眠。同步(线程安全)和异步调用共用同一个桶。
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict
+from urllib.parse import urlparse
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import RATE_LIMIT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate: float, burst: int, name: str = ''):
+        """
+        Args:
+            rate: 每秒补充的令牌数 (即长期允许的请求速率)
+            burst: 桶容量 (允许的瞬时突发请求数)
+            name: 名称, 用于日志
+        """
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.name = name
+
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.total_acquired = 0
+        self.total_waited = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        """预占令牌, 返回需要等待的秒数 (允许令牌数为负, 等待时间按欠量计算)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            self._tokens -= tokens
+            self.total_acquired += tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.total_waited += wait
+            return wait
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        获取令牌 (同步阻塞)
+
+        Returns:
+            实际等待的秒数
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int = 1) -> float:
+        """获取令牌 (异步等待)"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """有足够令牌时立即获取并返回True, 否则不等待直接返回False"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            self.total_acquired += tokens
+            return True
+
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'rate': self.rate,
+            'burst': self.burst,
+            'acquired': self.total_acquired,
+            'waited_seconds': round(self.total_waited, 3),
+        }
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _host_of(host_or_url: str) -> str:
+    if '://' in host_or_url:
+        return urlparse(host_or_url).hostname or host_or_url
+    return host_or_url
+
+
+def get_rate_limiter(host_or_url: str) -> TokenBucket:
+    """
+    获取主机对应的共享令牌桶 (按 RATE_LIMIT_CONFIG 配置, 未配置的主机使用默认值)
+
+    Args:
+        host_or_url: 主机名或完整URL
+    """
+    host = _host_of(host_or_url)
+    bucket = _buckets.get(host)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(host)
+            if bucket is None:
+                settings = RATE_LIMIT_CONFIG.get('hosts', {}).get(host, RATE_LIMIT_CONFIG['default'])
+                bucket = TokenBucket(settings['rate'], settings['burst'], name=host)
+                _buckets[host] = bucket
+                logger.debug(f"创建限流器 {host}: {bucket.rate}次/秒, 突发{bucket.burst}")
+    return bucket
+
+
+def rate_limiter_stats() -> Dict[str, Dict]:
+    """所有已创建令牌桶的统计信息"""
+    return {host: bucket.stats() for host, bucket in list(_buckets.items())}
@@ -0,0 +1,523 @@
+"""
+上游数据录制与回放
+
+录制模式把获取器和回测看到的每一个上游响应(腾讯HTTP接口的 URL/状态码/响应体/耗时,
+以及 akshare 函数调用的返回值)写入 gzip 压缩的 JSONL 归档;
+回放模式从归档中按顺序返回同样的响应, 不访问网络, 可选按录制时的耗时模拟延迟。
+
+启用方式 (任选其一):
+- 命令行: python main.py --mode analysis --record fixtures/day.jsonl.gz
+          python main.py --mode analysis --replay fixtures/day.jsonl.gz [--replay-latency]
+- 环境变量: STOCK_FIXTURE_MODE=record|replay, STOCK_FIXTURE_PATH=归档路径,
+            STOCK_FIXTURE_LATENCY=1 (回放时模拟延迟)
+- 本地替身服务器: python -m src.data.replay serve fixtures/day.jsonl.gz --port 8765
+  再通过 host_map 把腾讯主机映射到 http://127.0.0.1:8765
+
+录制和回放期间, 本地状态 (K线存储、A股列表、市场概况缓存、因子快照、回测日线) 都改到同一个临时目录,
+从空状态开始, 请求序列不受工作目录中已有缓存的影响; 临时目录在停用或进程退出时删除。
+交易日历随归档一起录制, 回放时使用录制时的休市表。
+"""
+
+import os
+import io
+import sys
+import json
+import gzip
+import time
+import atexit
+import asyncio
+import logging
+import argparse
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+# 添加项目根路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+from config.backtest_config import BACKTEST_SAMPLE_CONFIG
+from src.data import trading_calendar, universe, factor_store, history_cache
+from src.data.market_snapshot import get_snapshot_cache
+from src.data.http_transport import HttpTransport, AsyncHttpTransport, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# 回测和分析中用到的 akshare 函数, 录制/回放时统一拦截
+AKSHARE_FUNCTIONS = [
+    'stock_info_a_code_name',
+    'stock_individual_info_em',
+    'stock_zh_a_hist',
+    'index_stock_cons',
+    'index_stock_cons_csindex',
+    'tool_trade_date_hist_sina',
+    'stock_hk_ggt_top10',
+]
+
+
+def _path_key(url: str) -> str:
+    """不含协议和主机的请求键, 替身服务器按它匹配"""
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def _call_key(func: str, args: tuple, kwargs: dict) -> str:
+    return json.dumps([func, list(args), kwargs], sort_keys=True, ensure_ascii=False, default=str)
+
+
+class FixtureArchive:
+    """录制归档: gzip 压缩的 JSONL, 每行一条 http 或 akshare 记录"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: List[Dict] = []
+        self._lock = threading.Lock()
+
+        # 回放索引: 同一请求录制多次时按顺序返回, 用完后重复最后一次
+        self._http_index: Dict[str, List[Dict]] = defaultdict(list)
+        self._path_index: Dict[str, List[Dict]] = defaultdict(list)
+        self._call_index: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def load(cls, path: str) -> 'FixtureArchive':
+        archive = cls(path)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    archive._index(json.loads(line))
+        logger.info(f"加载录制归档 {path}: {len(archive.entries)} 条记录")
+        return archive
+
+    def _index(self, entry: Dict):
+        self.entries.append(entry)
+        if entry['kind'] == 'http':
+            self._http_index[entry['url']].append(entry)
+            self._path_index[_path_key(entry['url'])].append(entry)
+        else:
+            self._call_index[entry['key']].append(entry)
+
+    def add(self, entry: Dict):
+        with self._lock:
+            self._index(entry)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            entries = list(self.entries)
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        logger.info(f"录制归档已保存 {self.path}: {len(entries)} 条记录")
+
+    def _next(self, index: Dict[str, List[Dict]], key: str) -> Optional[Dict]:
+        with self._lock:
+            candidates = index.get(key)
+            if not candidates:
+                return None
+            cursor_key = f"{id(index)}:{key}"
+            position = min(self._cursors[cursor_key], len(candidates) - 1)
+            self._cursors[cursor_key] += 1
+            return candidates[position]
+
+    def lookup_http(self, url: str) -> Optional[Dict]:
+        """按完整URL查找录制的响应, 找不到时按路径匹配"""
+        return self._next(self._http_index, url) or self._next(self._path_index, _path_key(url))
+
+    def lookup_path(self, path: str) -> Optional[Dict]:
+        return self._next(self._path_index, path)
+
+    def lookup_call(self, key: str) -> Optional[Dict]:
+        return self._next(self._call_index, key)
+
+
+def _record_http(archive: FixtureArchive, url: str, status, body, latency: float):
+    archive.add({'kind': 'http', 'url': url, 'status': status, 'body': body,
+                 'latency': round(latency, 4), 'ts': time.time()})
+
+
+class RecordingTransport(HttpTransport):
+    """同步录制传输层: 正常访问网络, 同时把每次响应写入归档"""
+
+    def __init__(self, archive: FixtureArchive, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    def _send(self, url: str, timeout: float):
+        start = time.monotonic()
+        status, text = super()._send(url, timeout)
+        _record_http(self.archive, url, status, text, time.monotonic() - start)
+        return status, text
+
+
+class AsyncRecordingTransport(AsyncHttpTransport):
+    """异步录制传输层"""
+
+    def __init__(self, archive: FixtureArchive, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    async def _send(self, session, url: str, timeout: float):
+        start = time.monotonic()
+        status, text = await super()._send(session, url, timeout)
+        _record_http(self.archive, url, status, text, time.monotonic() - start)
+        return status, text
+
+
+class _ReplayMixin:
+    def _replay(self, url: str):
+        entry = self.archive.lookup_http(url)
+        if entry is None:
+            logger.debug(f"回放归档中没有该请求: {url[:100]}")
+            return 404, None, 0.0
+        latency = entry.get('latency', 0.0) * self.latency_scale if self.simulate_latency else 0.0
+        return entry['status'], entry['body'], latency
+
+
+class ReplayTransport(_ReplayMixin, HttpTransport):
+    """同步回放传输层: 从归档返回录制的响应, 不访问网络"""
+
+    def __init__(self, archive: FixtureArchive, simulate_latency: bool = False,
+                 latency_scale: float = 1.0, **kwargs):
+        kwargs.setdefault('retry', RetryPolicy(max_retries=1, backoff_base=0))
+        kwargs.setdefault('rate_limit', False)
+        super().__init__(**kwargs)
+        self.archive = archive
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+
+    def _send(self, url: str, timeout: float):
+        status, body, latency = self._replay(url)
+        if latency:
+            time.sleep(latency)
+        return status, body
+
+
+class AsyncReplayTransport(_ReplayMixin, AsyncHttpTransport):
+    """异步回放传输层"""
+
+    def __init__(self, archive: FixtureArchive, simulate_latency: bool = False,
+                 latency_scale: float = 1.0, **kwargs):
+        kwargs.setdefault('retry', RetryPolicy(max_retries=1, backoff_base=0))
+        super().__init__(**kwargs)
+        self.archive = archive
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+
+    def create_session(self, *args, **kwargs):
+        from src.data.http_transport import _NullSession
+        return _NullSession()
+
+    async def _send(self, session, url: str, timeout: float):
+        status, body, latency = self._replay(url)
+        if latency:
+            await asyncio.sleep(latency)
+        return status, body
+
+
+def _encode_result(result: Any) -> Dict:
+    if isinstance(result, pd.DataFrame):
+        return {'type': 'dataframe', 'value': result.to_json(orient='split', force_ascii=False, date_format='iso')}
+    return {'type': 'json', 'value': json.dumps(result, ensure_ascii=False, default=str)}
+
+
+def _decode_result(payload: Dict) -> Any:
+    if payload['type'] == 'dataframe':
+        # 保持字符串原样 (股票代码等), 不做类型推断
+        return pd.read_json(io.StringIO(payload['value']), orient='split', dtype=False, convert_dates=False)
+    return json.loads(payload['value'])
+
+
+_original_akshare: Dict[str, Any] = {}
+
+
+def install_akshare_hooks(archive: FixtureArchive, mode: str, simulate_latency: bool = False):
+    """
+    拦截 akshare 函数调用
+
+    Args:
+        mode: record=调用真实函数并录制返回值; replay=直接返回录制的结果, 未录制时抛出异常
+    """
+    try:
+        import akshare as ak
+    except ImportError:
+        logger.warning("未安装akshare, 跳过akshare录制/回放")
+        return
+
+    for name in AKSHARE_FUNCTIONS:
+        original = _original_akshare.setdefault(name, getattr(ak, name, None))
+        if original is None:
+            continue
+
+        def wrapper(*args, _name=name, _original=original, **kwargs):
+            key = _call_key(_name, args, kwargs)
+            if mode == 'replay':
+                entry = archive.lookup_call(key)
+                if entry is None:
+                    raise LookupError(f"回放归档中没有akshare调用: {key}")
+                if simulate_latency and entry.get('latency'):
+                    time.sleep(entry['latency'])
+                if entry.get('error'):
+                    raise RuntimeError(entry['error'])
+                return _decode_result(entry['result'])
+
+            start = time.monotonic()
+            try:
+                result = _original(*args, **kwargs)
+            except Exception as e:
+                archive.add({'kind': 'akshare', 'key': key, 'error': str(e),
+                             'latency': round(time.monotonic() - start, 4)})
+                raise
+            archive.add({'kind': 'akshare', 'key': key, 'result': _encode_result(result),
+                         'latency': round(time.monotonic() - start, 4)})
+            return result
+
+        setattr(ak, name, wrapper)
+
+
+def uninstall_akshare_hooks():
+    try:
+        import akshare as ak
+    except ImportError:
+        return
+    for name, original in _original_akshare.items():
+        if original is not None:
+            setattr(ak, name, original)
+
+
+# 交易日历在归档中的键
+CALENDAR_KEY = 'file:trading_holidays.json'
+
+
+def _isolate_local_state(root: str) -> Dict:
+    """
+    把本地状态的路径都改到 root 下
+
+    Returns:
+        原来的配置, 停用时用于恢复
+    """
+    saved = {
+        'data': {key: DATA_CONFIG.get(key) for key in
+                 ('cache_dir', 'kline_store_dir', 'factor_store_dir', 'universe_cache_file', 'overview_cache_file')},
+        'history_dir': BACKTEST_SAMPLE_CONFIG.get('history_dir'),
+        'calendar_file': trading_calendar.CALENDAR_FILE,
+    }
+    DATA_CONFIG.update({
+        'cache_dir': root,
+        'kline_store_dir': os.path.join(root, 'kline'),
+        'factor_store_dir': os.path.join(root, 'factors'),
+        'universe_cache_file': os.path.join(root, 'a_share_list.json'),
+        'overview_cache_file': os.path.join(root, 'market_overview.json'),
+    })
+    BACKTEST_SAMPLE_CONFIG['history_dir'] = os.path.join(root, 'history')
+    _reset_shared_state()
+    return saved
+
+
+def _reset_shared_state():
+    """丢弃进程内按旧路径创建的共享对象和内存缓存, 之后按当前配置重新创建"""
+    universe._universe = None
+    factor_store._shared_store = None
+    if history_cache._shared_cache is not None:
+        history_cache._shared_cache.clear()
+    get_snapshot_cache().clear()
+
+
+def _restore_local_state(saved: Dict):
+    for key, value in saved['data'].items():
+        if value is None:
+            DATA_CONFIG.pop(key, None)
+        else:
+            DATA_CONFIG[key] = value
+    BACKTEST_SAMPLE_CONFIG['history_dir'] = saved['history_dir']
+    trading_calendar.CALENDAR_FILE = saved['calendar_file']
+    _reset_shared_state()
+
+
+class FixtureSession:
+    """当前进程的录制/回放状态"""
+
+    def __init__(self, mode: str, path: str, simulate_latency: bool = False):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"未知的录制模式: {mode}")
+        self.mode = mode
+        self.path = path
+        self.simulate_latency = simulate_latency
+        self.archive = FixtureArchive.load(path) if mode == 'replay' else FixtureArchive(path)
+        self.state_dir = tempfile.mkdtemp(prefix='stock_fixture_')
+        self._saved_state = _isolate_local_state(self.state_dir)
+        self._use_recorded_calendar()
+
+    def _use_recorded_calendar(self):
+        """录制时把交易日历写入归档; 回放时改用归档中的交易日历 (旧归档没有时沿用当前文件)"""
+        if self.mode == 'record':
+            with open(trading_calendar.CALENDAR_FILE, 'r', encoding='utf-8') as f:
+                self.archive.add({'kind': 'file', 'key': CALENDAR_KEY, 'body': f.read()})
+            return
+        entry = self.archive.lookup_call(CALENDAR_KEY)
+        if entry is None:
+            logger.info("回放归档中没有交易日历, 使用当前的休市表")
+            return
+        calendar_file = os.path.join(self.state_dir, 'trading_holidays.json')
+        with open(calendar_file, 'w', encoding='utf-8') as f:
+            f.write(entry['body'])
+        trading_calendar.CALENDAR_FILE = calendar_file
+
+    def close(self):
+        """恢复本地状态路径并删除临时目录"""
+        _restore_local_state(self._saved_state)
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def sync_transport(self, **kwargs) -> HttpTransport:
+        if self.mode == 'record':
+            return RecordingTransport(self.archive, **kwargs)
+        return ReplayTransport(self.archive, simulate_latency=self.simulate_latency, **kwargs)
+
+    def async_transport(self, **kwargs) -> AsyncHttpTransport:
+        if self.mode == 'record':
+            return AsyncRecordingTransport(self.archive, **kwargs)
+        return AsyncReplayTransport(self.archive, simulate_latency=self.simulate_latency, **kwargs)
+
+
+_active: Optional[FixtureSession] = None
+
+
+def activate_fixtures(mode: str, path: str, simulate_latency: bool = False) -> FixtureSession:
+    """
+    启用录制或回放: 之后新建的获取器默认使用对应的传输层, akshare调用同样被拦截。
+    录制模式在进程退出时自动保存归档 (也可以手动调用 save_fixtures)。
+    启用前已创建的获取器不受影响, 应在创建 MarketAnalyzer 等对象之前调用。
+    """
+    global _active
+    if _active is not None:
+        deactivate_fixtures()
+    _active = FixtureSession(mode, path, simulate_latency)
+    install_akshare_hooks(_active.archive, mode, simulate_latency)
+    if mode == 'record':
+        atexit.register(save_fixtures)
+    atexit.register(shutil.rmtree, _active.state_dir, True)
+    logger.info(f"数据{'录制' if mode == 'record' else '回放'}模式已启用: {path}")
+    return _active
+
+
+def activate_from_env() -> Optional[FixtureSession]:
+    """按环境变量 STOCK_FIXTURE_MODE / STOCK_FIXTURE_PATH / STOCK_FIXTURE_LATENCY 启用"""
+    mode = os.environ.get('STOCK_FIXTURE_MODE')
+    path = os.environ.get('STOCK_FIXTURE_PATH')
+    if _active is None and mode and path:
+        simulate_latency = os.environ.get('STOCK_FIXTURE_LATENCY', '0').lower() in ('1', 'true', 'yes')
+        activate_fixtures(mode, path, simulate_latency)
+    return _active
+
+
+def active_fixture() -> Optional[FixtureSession]:
+    return _active
+
+
+def save_fixtures():
+    if _active is not None and _active.mode == 'record':
+        _active.archive.save()
+
+
+def deactivate_fixtures():
+    global _active
+    save_fixtures()
+    uninstall_akshare_hooks()
+    if _active is not None:
+        _active.close()
+    _active = None
+
+
+def add_fixture_arguments(parser: argparse.ArgumentParser):
+    """给命令行脚本添加 --record / --replay / --replay-latency 参数"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='PATH', help='录制所有上游响应到归档 (.jsonl.gz)')
+    group.add_argument('--replay', metavar='PATH', help='从归档回放上游响应, 不访问网络')
+    parser.add_argument('--replay-latency', action='store_true', help='回放时按录制耗时模拟延迟')
+
+
+def activate_from_args(args: argparse.Namespace) -> Optional[FixtureSession]:
+    if getattr(args, 'record', None):
+        return activate_fixtures('record', args.record)
+    if getattr(args, 'replay', None):
+        return activate_fixtures('replay', args.replay, args.replay_latency)
+    return activate_from_env()
+
+
+def serve_archive(archive: FixtureArchive, host: str = '127.0.0.1', port: int = 8765,
+                  simulate_latency: bool = False):
+    """
+    本地替身服务器: 按请求路径返回录制的响应体
+
+    Returns:
+        已在后台线程启动的 ThreadingHTTPServer (调用 shutdown() 停止)
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            entry = archive.lookup_path(self.path)
+            if entry is None or entry.get('body') is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if simulate_latency and entry.get('latency'):
+                time.sleep(entry['latency'])
+            body = entry['body'].encode('utf-8')
+            self.send_response(entry.get('status') or 200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256  # 默认的5在高并发下会丢连接, 客户端要等TCP重传
+
+    server = Server((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"替身服务器已启动: http://{host}:{server.server_address[1]} ({len(archive.entries)} 条记录)")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上游数据录制归档工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help='启动本地替身服务器')
+    serve.add_argument('path', help='录制归档路径')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', action='store_true', help='按录制耗时模拟延迟')
+
+    info = sub.add_parser('info', help='查看归档内容统计')
+    info.add_argument('path', help='录制归档路径')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    archive = FixtureArchive.load(args.path)
+
+    if args.command == 'serve':
+        server = serve_archive(archive, args.host, args.port, args.latency)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        hosts = defaultdict(int)
+        for entry in archive.entries:
+            hosts[urlsplit(entry['url']).hostname if entry['kind'] == 'http' else entry['kind']] += 1
+        for host, count in sorted(hosts.items()):
+            print(f"{host}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,476 @@
+"""
+腾讯财经行情数据解析
+
+qt.gtimg.cn 返回的一条行情记录同时包含实时价格和基本面字段, 同一份响应只需下载和拆分一次。
+两种解析方式, 规则完全相同:
+- parse_quote_records / parse_quote_record: 逐条解析为字典, 用于单只股票和需要字典的调用方
+- parse_quote_table: 整段响应解析为列式表格 (缺失字段为NaN, 衍生指标按数组计算),
+  用于全市场快照、实时排名、市场宽度等按列使用行情的场景
+
+逐条解析每只股票只需几微秒, 单只或几十只股票时比构建表格 (固定开销约3毫秒) 快几十到几百倍;
+5000只股票时两者耗时相当, 但表格再转换为字典还要额外约50毫秒,
+因此需要字典时始终逐条解析, 只有按列使用时才构建表格。
+"""
+
+import re
+import json
+import logging
+from operator import itemgetter
+from typing import List, Dict, Optional
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.dividend_override import DIVIDEND_OVERRIDE
+
+logger = logging.getLogger(__name__)
+
+# 单条记录: v_sh600000="1~浦发银行~600000~...";
+_RECORD_PATTERN = re.compile(r'v_([a-z]{2})(\w+)="([^"]*)"')
+
+# 腾讯API返回数据结构(按~拆分后的字段位置):
+# [1]名称 [3]当前价 [4]昨收 [5]今开 [6]成交量 [7]成交额 [14]市盈率(动) [15]市盈率(静) [16]市净率
+# [22]市盈率(TTM) [23]总市值(万元) [25]总股本(万股) [27]换手率 [32]涨跌幅 [33]最高 [34]最低
+# [39]基本面PE [46]PB市净率 [53]股息(每10股) [56]换手率
+_NUMERIC_FIELDS = {
+    'f3': 3, 'f4': 4, 'f5': 5, 'f6': 6, 'f7': 7, 'f14': 14, 'f15': 15, 'f16': 16,
+    'f22': 22, 'f23': 23, 'f25': 25, 'f27': 27, 'f32': 32, 'f33': 33, 'f34': 34,
+    'f39': 39, 'f46': 46, 'f53': 53, 'f56': 56,
+}
+_MAX_FIELD_INDEX = max(_NUMERIC_FIELDS.values())
+_FIELD_GETTER = itemgetter(1, *_NUMERIC_FIELDS.values())
+
+# 实时字段至少需要36个, 基本面字段至少需要53个
+_MIN_REALTIME_FIELDS = 36
+_MIN_FUNDAMENTAL_FIELDS = 53
+
+REALTIME_COLUMNS = [
+    'code', 'name', 'price', 'prev_close', 'open', 'high', 'low', 'change_pct', 'pe_ratio', 'pb_ratio',
+    'market_cap', 'total_shares', 'volume', 'turnover', 'turnover_rate'
+]
+FUNDAMENTAL_COLUMNS = [
+    'pb_ratio', 'dividend_yield', 'peg', 'turnover_rate', 'financial_health_score',
+    'roe', 'profit_growth', 'debt_ratio', 'current_ratio', 'gross_margin'
+]
+_INTEGER_COLUMNS = ('volume', 'turnover', 'financial_health_score')
+
+
+def parse_quote_table(content: str, include_fundamental: bool = True) -> pd.DataFrame:
+    """
+    把腾讯行情响应解析为列式表格
+
+    Args:
+        content: qt.gtimg.cn 响应文本, 可包含任意多只股票
+        include_fundamental: 是否计算基本面衍生字段 (ROE、股息率、PEG等)
+
+    Returns:
+        每只股票一行的DataFrame, 包含 symbol 列和 REALTIME_COLUMNS (及 FUNDAMENTAL_COLUMNS) 列,
+        缺失值为NaN; 字段不足的记录被丢弃
+    """
+    markets, codes, parts = [], [], []
+    for market, code, data_str in _RECORD_PATTERN.findall(content or ''):
+        fields = data_str.split('~')
+        if len(fields) < _MIN_REALTIME_FIELDS:
+            continue
+        markets.append(market)
+        codes.append(code)
+        parts.append(fields)
+
+    if not parts:
+        columns = ['symbol'] + REALTIME_COLUMNS
+        if include_fundamental:
+            columns += [c for c in FUNDAMENTAL_COLUMNS if c not in columns]
+        return pd.DataFrame(columns=columns)
+
+    field_counts = np.fromiter((len(p) for p in parts), dtype=np.int64, count=len(parts))
+    padding = [''] * (_MAX_FIELD_INDEX + 1)
+    rows = [_FIELD_GETTER(p if len(p) > _MAX_FIELD_INDEX else p + padding) for p in parts]
+    columns = list(zip(*rows))
+
+    names = columns[0]
+    raw = {
+        key: pd.to_numeric(pd.Series(col, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        for key, col in zip(_NUMERIC_FIELDS, columns[1:])
+    }
+
+    table = pd.DataFrame({
+        'symbol': [m + c for m, c in zip(markets, codes)],
+        'code': codes,
+        'name': names,
+    })
+    _derive_realtime_columns(table, raw)
+    if include_fundamental:
+        _derive_fundamental_columns(table, raw, field_counts >= _MIN_FUNDAMENTAL_FIELDS)
+    return table
+
+
+def _derive_realtime_columns(table: pd.DataFrame, raw: Dict[str, np.ndarray]):
+    """计算实时行情字段"""
+    table['price'] = np.nan_to_num(raw['f3'], nan=0.0)
+    table['prev_close'] = np.nan_to_num(raw['f4'], nan=0.0)
+    # 开盘前或停牌时接口返回0, 视为缺失
+    for column, key in (('open', 'f5'), ('high', 'f33'), ('low', 'f34')):
+        table[column] = np.where(raw[key] > 0, raw[key], np.nan)
+    table['change_pct'] = np.nan_to_num(raw['f32'], nan=0.0)
+
+    # PE优先级: 基本面PE > TTM PE > 静态PE > 动态PE, 只接受 0 < PE < 1000
+    pe_ratio = np.full(len(table), np.nan)
+    for key in ('f14', 'f15', 'f22', 'f39'):
+        candidate = raw[key]
+        valid = (candidate > 0) & (candidate < 1000)
+        pe_ratio = np.where(valid, candidate, pe_ratio)
+    table['pe_ratio'] = pe_ratio
+
+    pb = raw['f16']
+    table['pb_ratio'] = np.where((pb > 0) & (pb < 100), pb, np.nan)
+    table['market_cap'] = raw['f23']  # 万元
+    table['total_shares'] = raw['f25']  # 万股
+    table['volume'] = np.trunc(np.nan_to_num(raw['f6'], nan=0.0)).astype(np.int64)
+    table['turnover'] = np.trunc(np.nan_to_num(raw['f7'], nan=0.0)).astype(np.int64)  # 成交额
+    table['turnover_rate'] = raw['f27']
+
+
+def _derive_fundamental_columns(table: pd.DataFrame, raw: Dict[str, np.ndarray],
+                                has_fundamental: np.ndarray):
+    """计算基本面衍生字段, 字段不足的记录取默认值(与单只股票解析失败时一致)"""
+    pb = np.where(raw['f46'] > 0, raw['f46'], np.nan)
+
+    # 股息率: 手动配置优先, 否则按每10股股息换算, 超出0-20%视为无效
+    price = raw['f3']
+    dividend = raw['f53']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        computed_yield = (dividend / 10) / price * 100
+    computed_yield = np.where(
+        (price > 0) & (dividend > 0) & (computed_yield > 0) & (computed_yield <= 20),
+        computed_yield, np.nan
+    )
+    manual_yield = np.array(
+        [DIVIDEND_OVERRIDE[c]['dividend_yield'] if c in DIVIDEND_OVERRIDE else np.nan
+         for c in table['code']],
+        dtype=np.float64
+    )
+    dividend_yield = np.where(np.isnan(manual_yield), computed_yield, manual_yield)
+
+    turnover_rate = raw['f56']
+
+    # PEG: 假设增长率 PB<1 为20%, PB>5 为10%, 其余15%
+    pe = np.where((raw['f39'] > 0) & (raw['f39'] < 200), raw['f39'], np.nan)
+    assumed_growth = np.select([pb < 1, pb > 5], [20.0, 10.0], default=15.0)
+    peg = pe / assumed_growth
+
+    # ROE = PB / PE, 合理范围 -50% ~ 50%
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roe = pb / pe * 100
+    roe = np.where((roe >= -50) & (roe <= 50), roe, np.nan)
+
+    # 利润增长率 = ROE × (1 - 股息支付率), 股息支付率 = 股息率 / ROE (上限0.9)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payout_ratio = np.where(roe > 0, np.minimum(dividend_yield / roe, 0.9), 0.5)
+    profit_growth = np.where((roe != 0) & (dividend_yield != 0), roe * (1 - payout_ratio), np.nan)
+
+    health = calculate_financial_health_array(pb, dividend_yield, pe, turnover_rate)
+
+    missing = ~has_fundamental
+    table['pb_ratio'] = np.where(missing, np.nan, pb)
+    table['dividend_yield'] = np.where(missing, np.nan, dividend_yield)
+    table['peg'] = np.where(missing, np.nan, peg)
+    table['turnover_rate'] = np.where(missing, np.nan, turnover_rate)
+    table['financial_health_score'] = np.where(missing, 0, health).astype(np.int64)
+    table['roe'] = np.where(missing, np.nan, roe)
+    table['profit_growth'] = np.where(missing, np.nan, profit_growth)
+    # 以下字段腾讯API不提供
+    table['debt_ratio'] = np.nan
+    table['current_ratio'] = np.nan
+    table['gross_margin'] = np.nan
+
+
+def calculate_financial_health_array(pb: np.ndarray, div_yield: np.ndarray,
+                                     pe: np.ndarray, turnover: np.ndarray) -> np.ndarray:
+    """财务健康度评分的数组版本, 规则与 calculate_financial_health 相同, NaN视为缺失"""
+    score = np.full(len(pb), 50.0)
+    score += np.select([pb < 1, pb < 2, pb > 10, pb > 5], [20, 10, -20, -10], default=0)
+    score += np.select([div_yield > 5, div_yield > 3, div_yield > 2, div_yield < 1],
+                       [15, 10, 5, -5], default=0) * (div_yield != 0)
+    score += np.select([(pe > 10) & (pe < 20), (pe >= 20) & (pe < 30), pe >= 50],
+                       [10, 5, -10], default=0)
+    score += np.select([(turnover > 1) & (turnover < 5), turnover > 20], [5, -5], default=0)
+    return np.clip(score, 0, 100).astype(np.int64)
+
+
+def _record_columns(available, include_fundamental: bool) -> List[str]:
+    columns = list(REALTIME_COLUMNS)
+    if include_fundamental and 'roe' in available:
+        columns += [c for c in FUNDAMENTAL_COLUMNS if c not in columns]
+    return columns
+
+
+def quote_table_to_records(table: pd.DataFrame, include_fundamental: bool = True) -> List[Dict]:
+    """
+    把行情表转换为与原有接口一致的字典列表 (NaN转为None)
+    """
+    if table.empty:
+        return []
+
+    columns = _record_columns(table.columns, include_fundamental)
+
+    frame = table[columns].astype(object)
+    frame = frame.where(table[columns].notna(), None)
+    records = frame.to_dict('records')
+    for record in records:
+        for key in _INTEGER_COLUMNS:
+            if key in record:
+                record[key] = int(record[key])
+    return records
+
+
+def quote_row_to_record(arrays: Dict[str, np.ndarray], position: int, include_fundamental: bool = True) -> Dict:
+    """
+    行情表第 position 行的数据字典 (与 quote_table_to_records 的元素相同)
+
+    Args:
+        arrays: 行情表各列的数组 (列名 -> table[列名].to_numpy()), 由调用方缓存, 逐行取值不经过pandas
+    """
+    record = {}
+    for column in _record_columns(arrays, include_fundamental):
+        value = arrays[column][position]
+        if column in _INTEGER_COLUMNS:
+            value = int(value)
+        elif isinstance(value, np.generic):
+            value = value.item()
+        record[column] = None if isinstance(value, float) and value != value else value
+    return record
+
+
+def calculate_financial_health(pb, div_yield, pe, turnover) -> int:
+    """基于有限数据计算财务健康度评分 (0-100)"""
+    score = 50  # 基础分50分
+
+    try:
+        # PB评分 (±20分)
+        if pb:
+            if pb < 1:  # 破净
+                score += 20
+            elif pb < 2:  # 低估
+                score += 10
+            elif pb > 10:  # 极度高估
+                score -= 20
+            elif pb > 5:  # 高估
+                score -= 10
+
+        # 股息率评分 (±15分)
+        if div_yield:
+            if div_yield > 5:
+                score += 15
+            elif div_yield > 3:
+                score += 10
+            elif div_yield > 2:
+                score += 5
+            elif div_yield < 1:
+                score -= 5
+
+        # PE评分 (±10分)
+        if pe:
+            if 10 < pe < 20:  # 合理区间
+                score += 10
+            elif 20 <= pe < 30:
+                score += 5
+            elif pe >= 50:  # 过高
+                score -= 10
+
+        # 换手率评分 (±5分)
+        if turnover:
+            if 1 < turnover < 5:  # 适中
+                score += 5
+            elif turnover > 20:  # 过度投机
+                score -= 5
+
+    except Exception:
+        pass
+
+    return max(0, min(100, score))  # 限制在0-100之间
+
+
+def empty_fundamental_data() -> Dict:
+    """基本面数据获取失败时的默认值"""
+    return {
+        'pb_ratio': None,
+        'dividend_yield': None,
+        'peg': None,
+        'turnover_rate': None,
+        'financial_health_score': 0,
+        'roe': None,
+        'profit_growth': None,
+        'debt_ratio': None,
+        'current_ratio': None,
+        'gross_margin': None,
+        # 不设置market_cap和total_shares为None，保留实时数据中的值
+    }
+
+
+def _to_float(value: str) -> Optional[float]:
+    """字段转为浮点数, 空字段和非数值为None"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_quote_record(stock_code: str, fields: List[str], include_fundamental: bool = True) -> Dict:
+    """
+    解析一条行情记录 (按~拆分后的字段列表), 规则与 parse_quote_table 相同
+
+    基本面字段覆盖实时字段(与先取实时数据再 update 基本面数据的结果一致)。
+
+    Returns:
+        数据字典 (结构与 quote_table_to_records 的元素相同); 字段不足时返回空字典
+    """
+    if len(fields) < _MIN_REALTIME_FIELDS:
+        return {}
+    has_fundamental = len(fields) >= _MIN_FUNDAMENTAL_FIELDS
+    if len(fields) <= _MAX_FIELD_INDEX:
+        fields = fields + [''] * (_MAX_FIELD_INDEX + 1 - len(fields))
+
+    price = _to_float(fields[3])
+    # PE优先级: 基本面PE > TTM PE > 静态PE > 动态PE, 只接受 0 < PE < 1000
+    pe_ratio = None
+    for index in (39, 22, 15, 14):
+        candidate = _to_float(fields[index])
+        if candidate is not None and 0 < candidate < 1000:
+            pe_ratio = candidate
+            break
+    pb = _to_float(fields[16])
+
+    # 开盘前或停牌时接口返回0, 视为缺失
+    open_, high, low = (_to_float(fields[index]) for index in (5, 33, 34))
+
+    data = {
+        'code': stock_code,
+        'name': fields[1],
+        'price': price or 0.0,
+        'prev_close': _to_float(fields[4]) or 0.0,
+        'open': open_ if open_ is not None and open_ > 0 else None,
+        'high': high if high is not None and high > 0 else None,
+        'low': low if low is not None and low > 0 else None,
+        'change_pct': _to_float(fields[32]) or 0.0,
+        'pe_ratio': pe_ratio,
+        'pb_ratio': pb if pb is not None and 0 < pb < 100 else None,
+        'market_cap': _to_float(fields[23]),  # 万元
+        'total_shares': _to_float(fields[25]),  # 万股
+        'volume': int(_to_float(fields[6]) or 0),
+        'turnover': int(_to_float(fields[7]) or 0),  # 成交额
+        'turnover_rate': _to_float(fields[27]),
+    }
+    if not include_fundamental:
+        return data
+    if not has_fundamental:
+        data.update(empty_fundamental_data())
+        return data
+
+    pb = _to_float(fields[46])
+    pb = pb if pb is not None and pb > 0 else None
+
+    # 股息率: 手动配置优先, 否则按每10股股息换算, 超出0-20%视为无效
+    dividend_yield = None
+    if stock_code in DIVIDEND_OVERRIDE:
+        dividend_yield = DIVIDEND_OVERRIDE[stock_code]['dividend_yield']
+    else:
+        dividend = _to_float(fields[53])
+        if price and price > 0 and dividend and dividend > 0:
+            computed_yield = (dividend / 10) / price * 100
+            if 0 < computed_yield <= 20:
+                dividend_yield = computed_yield
+
+    turnover_rate = _to_float(fields[56])
+
+    # PEG: 假设增长率 PB<1 为20%, PB>5 为10%, 其余15%
+    pe = _to_float(fields[39])
+    pe = pe if pe is not None and 0 < pe < 200 else None
+    peg = None
+    if pe is not None:
+        assumed_growth = 20 if pb is not None and pb < 1 else 10 if pb is not None and pb > 5 else 15
+        peg = pe / assumed_growth
+
+    # ROE = PB / PE, 合理范围 -50% ~ 50%
+    roe = pb / pe * 100 if pb is not None and pe is not None else None
+    if roe is not None and not -50 <= roe <= 50:
+        roe = None
+
+    # 利润增长率 = ROE × (1 - 股息支付率), 股息支付率 = 股息率 / ROE (上限0.9)
+    profit_growth = None
+    if roe and dividend_yield:
+        payout_ratio = min(dividend_yield / roe, 0.9) if roe > 0 else 0.5
+        profit_growth = roe * (1 - payout_ratio)
+
+    data.update({
+        'pb_ratio': pb,
+        'dividend_yield': dividend_yield,
+        'peg': peg,
+        'turnover_rate': turnover_rate,
+        'financial_health_score': calculate_financial_health(pb, dividend_yield, pe, turnover_rate),
+        'roe': roe,
+        'profit_growth': profit_growth,
+        # 以下字段腾讯API不提供
+        'debt_ratio': None,
+        'current_ratio': None,
+        'gross_margin': None,
+    })
+    return data
+
+
+def parse_quote_records(content: str, include_fundamental: bool = True) -> Dict[str, Dict]:
+    """
+    逐条解析行情响应为 {股票代码: 数据字典} (字段不足的记录被丢弃)
+
+    需要字典时比 parse_quote_table + quote_table_to_records 快, 见模块说明。
+    """
+    records = {}
+    for _, code, data_str in _RECORD_PATTERN.findall(content or ''):
+        record = parse_quote_record(code, data_str.split('~'), include_fundamental)
+        if record:
+            records[code] = record
+    return records
+
+
+def kline_url(symbol: str, bars: int) -> str:
+    """腾讯前复权日K线接口地址"""
+    return (f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
+            f"?param={symbol},day,,,{bars},qfq&_var=kline_dayqfq")
+
+
+def parse_kline_payload(content: str, symbol: str) -> pd.DataFrame:
+    """
+    解析日K线响应 (kline_dayqfq={...})
+
+    Args:
+        content: 响应文本
+        symbol: 带市场前缀的代码, 如 sh600000
+
+    Returns:
+        列为 date/open/close/high/low/volume 的DataFrame, 无数据时为空
+    """
+    if not content or 'kline_dayqfq=' not in content:
+        return pd.DataFrame()
+
+    data_json = json.loads(content.replace('kline_dayqfq=', ''))
+    kline_data = (data_json.get('data') or {}).get(symbol)
+    if not isinstance(kline_data, dict):
+        return pd.DataFrame()
+
+    # 数据格式: ['日期', '开盘', '收盘', '最高', '最低', '成交量', ...]
+    klines = kline_data.get('qfqday') or kline_data.get('day')
+    if not klines:
+        return pd.DataFrame()
+
+    data = pd.DataFrame({
+        'date': pd.to_datetime([k[0] for k in klines]),
+        'open': np.array([k[1] for k in klines], dtype=np.float64),
+        'close': np.array([k[2] for k in klines], dtype=np.float64),
+        'high': np.array([k[3] for k in klines], dtype=np.float64),
+        'low': np.array([k[4] for k in klines], dtype=np.float64),
+        'volume': np.array([k[5] if len(k) > 5 else 0 for k in klines], dtype=np.float64),
+    })
+    return data
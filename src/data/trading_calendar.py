@@ -0,0 +1,234 @@
+"""
+交易日历
+
+休市表 (data/trading_holidays.json) 覆盖的年份内, 周一至周五且不在休市表中的日期为交易日;
+覆盖范围之外没有休市信息, 只排除周末。
+
+加载时为覆盖范围内的每个自然日预先计算"该日及之前最近一个交易日的序号",
+is_trading_day / next_trading_day / prev_trading_day / offset 都只是数组下标运算 (O(1))。
+
+休市表可以离线更新: 从交易日列表文件 (每行一个日期, 或含 trade_date 列的CSV,
+如 akshare tool_trade_date_hist_sina 的导出) 重新生成:
+
+    python -m src.data.trading_calendar --import trade_dates.csv
+
+文件修改后 get_trading_calendar() 会自动重新加载。
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'trading_holidays.json')
+
+
+def _to_day(value) -> np.datetime64:
+    """date / datetime / 'YYYY-MM-DD' / datetime64 -> datetime64[D]"""
+    if isinstance(value, str):
+        if len(value) == 8 and value.isdigit():
+            value = f'{value[:4]}-{value[4:6]}-{value[6:]}'
+        return np.datetime64(value[:10], 'D')
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+class TradingCalendar:
+    """A股交易日历 (休市表覆盖范围内精确, 范围外只排除周末)"""
+
+    def __init__(self, holidays: Iterable = (), years: Iterable[int] = ()):
+        """
+        Args:
+            holidays: 休市日 (周一至周五中不开市的日期)
+            years: 休市表覆盖的年份 (取最小到最大年份之间的连续范围)
+        """
+        years = sorted(int(year) for year in years)
+        self.holidays = np.array(sorted({_to_day(day) for day in holidays}), dtype='datetime64[D]')
+        # 覆盖范围外的计数 (跨越范围边界时也要跳过休市日)
+        self._busdaycal = np.busdaycalendar(holidays=self.holidays)
+        if years:
+            self.start = np.datetime64(f'{years[0]}-01-01', 'D')
+            self.end = np.datetime64(f'{years[-1]}-12-31', 'D')
+            days = np.arange(self.start, self.end + 1, dtype='datetime64[D]')
+            self._open = np.is_busday(days, holidays=self.holidays)
+        else:
+            self.start = self.end = None
+            days = np.array([], dtype='datetime64[D]')
+            self._open = np.array([], dtype=bool)
+        # 每个自然日 -> 该日及之前最近一个交易日在 sessions 中的序号 (之前没有交易日时为-1)
+        self._floor = np.cumsum(self._open) - 1
+        self.sessions = days[self._open]
+        self._session_dates: List[date] = self.sessions.astype(object).tolist()
+
+    @classmethod
+    def from_file(cls, path: str = None) -> 'TradingCalendar':
+        """从休市表文件加载; 文件不存在或格式错误时返回只排除周末的日历"""
+        path = path or CALENDAR_FILE
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(data.get('holidays', []), data.get('years', []))
+        except Exception as e:
+            logger.warning(f"加载交易日历失败 {path}: {e}, 只按周末判断交易日")
+            return cls()
+
+    def _position(self, day: np.datetime64) -> Optional[int]:
+        if self.start is None or day < self.start or day > self.end:
+            return None
+        return int((day - self.start).astype(np.int64))
+
+    def _session(self, index: int) -> date:
+        """第 index 个交易日; 超出覆盖范围时从边界交易日按周末规则继续数"""
+        count = len(self.sessions)
+        if 0 <= index < count:
+            return self._session_dates[index]
+        if index >= count:
+            return np.busday_offset(self.sessions[-1], index - count + 1, busdaycal=self._busdaycal).astype(object)
+        return np.busday_offset(self.sessions[0], index, busdaycal=self._busdaycal).astype(object)
+
+    def is_trading_day(self, day) -> bool:
+        """是否交易日"""
+        day = _to_day(day)
+        position = self._position(day)
+        if position is None:
+            return bool(np.is_busday(day))
+        return bool(self._open[position])
+
+    def next_trading_day(self, day, n: int = 1) -> date:
+        """day 之后的第 n 个交易日 (不含 day 本身)"""
+        day = _to_day(day)
+        position = self._position(day)
+        if position is None:
+            return np.busday_offset(day, n, roll='backward', busdaycal=self._busdaycal).astype(object)
+        return self._session(int(self._floor[position]) + n)
+
+    def prev_trading_day(self, day, n: int = 1) -> date:
+        """day 之前的第 n 个交易日 (不含 day 本身)"""
+        day = _to_day(day)
+        position = self._position(day)
+        if position is None:
+            return np.busday_offset(day, -n, roll='forward', busdaycal=self._busdaycal).astype(object)
+        ceiling = int(self._floor[position]) + (0 if self._open[position] else 1)
+        return self._session(ceiling - n)
+
+    def offset(self, day, n: int) -> date:
+        """相对 day 移动 n 个交易日 (n>0 向后, n<0 向前); n=0 时为 day 当天或之后最近的交易日"""
+        if n > 0:
+            return self.next_trading_day(day, n)
+        if n < 0:
+            return self.prev_trading_day(day, -n)
+        if self.is_trading_day(day):
+            return _to_day(day).astype(object)
+        return self.next_trading_day(day, 1)
+
+    def trading_days(self, start, end) -> List[date]:
+        """[start, end] 内的全部交易日"""
+        start, end = _to_day(start), _to_day(end)
+        if end < start:
+            return []
+        if self._position(start) is not None and self._position(end) is not None:
+            lo = int(self._floor[self._position(start)]) + (0 if self._open[self._position(start)] else 1)
+            hi = int(self._floor[self._position(end)]) + 1
+            return self._session_dates[lo:hi]
+        days = np.arange(start, end + 1, dtype='datetime64[D]')
+        is_open = np.is_busday(days)
+        inside = (days >= self.start) & (days <= self.end) if self.start is not None else np.zeros(len(days), bool)
+        if inside.any():
+            is_open[inside] = self._open[(days[inside] - self.start).astype(np.int64)]
+        return days[is_open].astype(object).tolist()
+
+
+_calendar: Optional[TradingCalendar] = None
+_calendar_source: Optional[tuple] = None
+_calendar_lock = threading.Lock()
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """进程内共享的交易日历 (休市表文件修改或 CALENDAR_FILE 改为其他文件后自动重新加载)"""
+    global _calendar, _calendar_source
+    path = CALENDAR_FILE
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    with _calendar_lock:
+        if _calendar is None or (path, mtime) != _calendar_source:
+            _calendar = TradingCalendar.from_file(path)
+            _calendar_source = (path, mtime)
+        return _calendar
+
+
+def import_trade_dates(source: str, output: str = None) -> int:
+    """
+    由交易日列表文件生成休市表 (不访问网络)
+
+    Args:
+        source: 每行一个日期的文本文件, 或含 trade_date 列的CSV
+        output: 休市表文件 (默认 CALENDAR_FILE)
+
+    Returns:
+        休市日数量
+    """
+    sessions = set()
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            for field in line.strip().split(','):
+                field = field.strip().strip('"')
+                if len(field) < 8:  # 空字段、序号列等
+                    continue
+                try:
+                    sessions.add(_to_day(field))
+                    break
+                except ValueError:
+                    continue
+    if not sessions:
+        raise ValueError(f"{source} 中没有可识别的日期")
+
+    # 从首个交易日所在年份的1月1日开始 (此前的工作日同样没有开市), 到最后一个交易日为止
+    first, last = min(sessions), max(sessions)
+    weekdays = np.arange(first.astype('datetime64[Y]').astype('datetime64[D]'), last + 1, dtype='datetime64[D]')
+    weekdays = weekdays[np.is_busday(weekdays)]
+    holidays = [str(day) for day in weekdays if day not in sessions]
+    years = list(range(first.astype(object).year, last.astype(object).year + 1))
+
+    output = output or CALENDAR_FILE
+    data = {
+        'update_date': datetime.now().strftime('%Y-%m-%d'),
+        'note': '沪深交易所休市安排 - 只列出周一至周五的休市日; years 内未列出的工作日均为交易日',
+        'data_source': os.path.basename(source),
+        'years': years,
+        'holidays': holidays,
+    }
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+    logger.info(f"交易日历已更新: {years[0]}-{years[-1]}年, {len(holidays)} 个休市日 -> {output}")
+    return len(holidays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='交易日历休市表')
+    parser.add_argument('--import', dest='source', required=True,
+                        help='交易日列表文件 (每行一个日期, 或含 trade_date 列的CSV)')
+    parser.add_argument('--output', default=None, help='休市表文件, 默认 data/trading_holidays.json')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        import_trade_dates(args.source, args.output)
+    except Exception as e:
+        logger.error(f"更新交易日历失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+股票池注册表
+
+全部A股列表和沪深300成分股每天只加载一次 (本地缓存文件 -> akshare), 日期 (北京时间) 变化后的首次使用时重新加载,
+长期运行的API服务和调度进程也能看到新上市、退市和状态变化; 加载时预先计算
+每只股票的带交易所前缀代码(sh/sz/bj)、板块和上市状态, 以数组形式提供给获取器和回测。
+
+代码到交易所前缀的映射只按代码前缀判断, 不需要加载列表也不访问网络:
+
+    to_symbol('600000')  -> 'sh600000'
+    to_symbol('688981')  -> 'sh688981'
+    to_symbol('300750')  -> 'sz300750'
+    to_symbol('430047')  -> 'bj430047'
+"""
+
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import DATA_CONFIG
+from src.data.market_clock import market_now
+
+logger = logging.getLogger(__name__)
+
+CSI300_FILE = './data/csi300_stocks.json'
+
+# 代码前缀 -> (交易所, 板块); 先匹配三位前缀, 再匹配两位前缀
+_PREFIX_RULES: Dict[str, Tuple[str, str]] = {
+    '688': ('sh', 'star'), '689': ('sh', 'star'),
+    '900': ('sh', 'b_share'),
+    '000': ('sz', 'main'), '001': ('sz', 'main'), '002': ('sz', 'main'), '003': ('sz', 'main'),
+    '300': ('sz', 'chinext'), '301': ('sz', 'chinext'),
+    '200': ('sz', 'b_share'),
+    '920': ('bj', 'bse'),
+    '60': ('sh', 'main'),
+    '43': ('bj', 'bse'), '83': ('bj', 'bse'), '87': ('bj', 'bse'),
+}
+# 无法识别前缀时按首位数字判断交易所
+_FIRST_DIGIT_EXCHANGE = {'6': 'sh', '9': 'sh', '4': 'bj', '8': 'bj'}
+
+BOARD_NAMES = {
+    'main': '主板',
+    'star': '科创板',
+    'chinext': '创业板',
+    'bse': '北交所',
+    'b_share': 'B股',
+    'unknown': '未知',
+}
+
+
+@lru_cache(maxsize=None)
+def classify(code: str) -> Tuple[str, str]:
+    """
+    按代码前缀判断交易所和板块
+
+    Returns:
+        (交易所前缀 sh/sz/bj, 板块 main/star/chinext/bse/b_share/unknown)
+    """
+    rule = _PREFIX_RULES.get(code[:3]) or _PREFIX_RULES.get(code[:2])
+    if rule:
+        return rule
+    return _FIRST_DIGIT_EXCHANGE.get(code[:1], 'sz'), 'unknown'
+
+
+def to_symbol(code: str) -> str:
+    """股票代码 -> 腾讯接口使用的带交易所前缀代码 (如 sh600000)"""
+    return classify(code)[0] + code
+
+
+def to_symbols(codes: List[str]) -> List[str]:
+    return [classify(code)[0] + code for code in codes]
+
+
+def listing_status(name: str) -> str:
+    """按股票简称判断上市状态: delisting(退市整理) / st(风险警示) / normal"""
+    name = (name or '').replace(' ', '')
+    if '退' in name:
+        return 'delisting'
+    if 'ST' in name.upper():
+        return 'st'
+    return 'normal'
+
+
+class UniverseRegistry:
+    """全部A股和沪深300成分股的列表及预计算字段"""
+
+    def __init__(self, cache_file: str = None, csi300_file: str = CSI300_FILE, max_age_days: int = 1):
+        """
+        Args:
+            cache_file: A股列表的本地缓存 (默认 DATA_CONFIG['universe_cache_file'])
+            csi300_file: 沪深300成分股文件 (由 update_csi300_stocks.py 维护)
+            max_age_days: A股列表缓存的有效天数
+        """
+        self.cache_file = cache_file or DATA_CONFIG.get(
+            'universe_cache_file', os.path.join(DATA_CONFIG['cache_dir'], 'a_share_list.json')
+        )
+        self.csi300_file = csi300_file
+        self.max_age_days = max_age_days
+        self.update_date: Optional[str] = None
+        self.source: Optional[str] = None
+        self._lock = threading.Lock()
+        self._csi300: Optional[pd.DataFrame] = None
+        self._csi300_names: Dict[str, str] = {}
+        self._csi300_date: Optional[date] = None
+        self._loaded_date: Optional[date] = None  # 加载时的日期 (北京时间), 日期变化后重新加载
+
+        # 预计算的数组, 顺序与A股列表一致
+        self.codes = np.array([], dtype=object)
+        self.names = np.array([], dtype=object)
+        self.symbols = np.array([], dtype=object)
+        self.exchanges = np.array([], dtype=object)
+        self.boards = np.array([], dtype=object)
+        self.statuses = np.array([], dtype=object)
+        self.in_csi300 = np.array([], dtype=bool)
+        self._positions: Dict[str, int] = {}
+
+    # ---------- 加载 ----------
+
+    def load(self, refresh: bool = False) -> 'UniverseRegistry':
+        """
+        加载A股列表并预计算各字段
+
+        当天已加载时直接返回; 日期变化后重新读取当天的缓存文件或akshare (沪深300成分股同样重新读取);
+        refresh=True 时忽略当天缓存
+        """
+        today = market_now().date()
+        with self._lock:
+            if self._loaded_date == today and not refresh:
+                return self
+            self._csi300_date = None
+            stocks = self._load_a_share_list(refresh, today)
+            csi300 = self._load_csi300()
+
+            # akshare和缓存都不可用时至少包含沪深300成分股
+            known = {s['code'] for s in stocks}
+            stocks += [s for s in csi300.to_dict('records') if s['code'] not in known]
+            self._build(stocks, set(csi300['code']))
+            self._loaded_date = today
+        logger.info(f"股票池已加载: {len(self.codes)} 只 (来源: {self.source}, 日期: {self.update_date})")
+        return self
+
+    def _build(self, stocks: List[Dict], csi300_codes: set):
+        codes = [str(s['code']) for s in stocks]
+        names = [str(s.get('name', '')) for s in stocks]
+        rules = [classify(code) for code in codes]
+
+        self.codes = np.array(codes, dtype=object)
+        self.names = np.array(names, dtype=object)
+        self.exchanges = np.array([r[0] for r in rules], dtype=object)
+        self.boards = np.array([r[1] for r in rules], dtype=object)
+        self.symbols = np.array([r[0] + code for r, code in zip(rules, codes)], dtype=object)
+        self.statuses = np.array([listing_status(name) for name in names], dtype=object)
+        self.in_csi300 = np.array([code in csi300_codes for code in codes], dtype=bool)
+        self._positions = {code: i for i, code in enumerate(codes)}
+
+    def _read_cache(self) -> Optional[Dict]:
+        if not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.debug(f"读取A股列表缓存失败: {e}")
+            return None
+
+    def _load_a_share_list(self, refresh: bool, today: date) -> List[Dict]:
+        """当天的本地缓存 -> akshare -> 过期的本地缓存 -> 空列表"""
+        cached = self._read_cache()
+        if cached and not refresh:
+            age = (today - date.fromisoformat(cached['update_date'])).days
+            if age < self.max_age_days:
+                self.update_date, self.source = cached['update_date'], '本地缓存'
+                return list(cached['stocks'])
+
+        try:
+            import akshare as ak
+
+            stock_info = ak.stock_info_a_code_name()
+            if not stock_info.empty:
+                stocks = stock_info[['code', 'name']].astype(str).to_dict('records')
+                self.update_date, self.source = today.isoformat(), 'akshare'
+                os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+                with open(self.cache_file, 'w', encoding='utf-8') as f:
+                    json.dump({'update_date': self.update_date, 'stocks': stocks}, f, ensure_ascii=False)
+                logger.info(f"A股列表已更新: {len(stocks)} 只")
+                return stocks
+        except Exception as e:
+            logger.warning(f"获取A股列表失败: {e}")
+
+        if cached:
+            logger.info(f"使用过期的A股列表缓存 ({cached.get('update_date')})")
+            self.update_date, self.source = cached.get('update_date'), '过期缓存'
+            return list(cached['stocks'])
+
+        logger.warning("无法获取A股列表, 股票池只包含沪深300成分股")
+        self.update_date, self.source = None, '沪深300'
+        return []
+
+    def _load_csi300(self) -> pd.DataFrame:
+        """沪深300成分股: 本地文件 -> akshare (获取成功后写入本地文件); 每天读取一次"""
+        today = market_now().date()
+        if self._csi300 is not None and self._csi300_date == today:
+            return self._csi300
+        self._csi300_date = today
+
+        if os.path.exists(self.csi300_file):
+            with open(self.csi300_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            logger.info(f"成功从本地加载 {len(data['stocks'])} 只沪深300成分股 "
+                        f"(更新日期: {data.get('update_date', '未知')})")
+            self._set_csi300(pd.DataFrame(data['stocks'], columns=['code', 'name']).astype(str))
+            return self._csi300
+
+        logger.warning("本地文件不存在,尝试在线获取沪深300成分股列表(可能较慢)...")
+        result = pd.DataFrame(columns=['code', 'name'])
+        try:
+            import akshare as ak
+
+            try:
+                csi300 = ak.index_stock_cons(symbol="000300")
+                result = pd.DataFrame({'code': csi300['品种代码'], 'name': csi300['品种名称']})
+            except Exception as e:
+                logger.warning(f"index_stock_cons 获取失败: {e}")
+                csi300 = ak.index_stock_cons_csindex(symbol="000300")
+                result = pd.DataFrame({'code': csi300['成分券代码'], 'name': csi300['成分券名称']})
+        except Exception as e:
+            logger.error(f"无法获取沪深300成分股列表: {e}")
+
+        result = result.astype(str).reset_index(drop=True)
+        if not result.empty:
+            logger.info(f"在线获取成功: {len(result)} 只")
+            os.makedirs(os.path.dirname(os.path.abspath(self.csi300_file)), exist_ok=True)
+            with open(self.csi300_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'update_date': today.isoformat(),
+                    'note': '沪深300成分股列表 - 自动生成',
+                    'stocks': result.to_dict('records')
+                }, f, ensure_ascii=False, indent=2)
+            logger.info(f"已保存到本地文件: {self.csi300_file}")
+        self._set_csi300(result)
+        return result
+
+    def _set_csi300(self, frame: pd.DataFrame):
+        self._csi300 = frame
+        self._csi300_names = dict(zip(frame['code'], frame['name']))
+
+    # ---------- 查询 ----------
+
+    def __len__(self) -> int:
+        return len(self.load().codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.load()._positions
+
+    def a_share_codes(self) -> List[str]:
+        """全部A股代码"""
+        return self.load().codes.tolist()
+
+    def csi300_frame(self) -> pd.DataFrame:
+        """沪深300成分股 (code、name 两列, 不需要加载全部A股列表)"""
+        with self._lock:
+            return self._load_csi300().copy()
+
+    def csi300_codes(self) -> List[str]:
+        return self.csi300_frame()['code'].tolist()
+
+    def name(self, code: str, default: Optional[str] = None) -> Optional[str]:
+        """股票简称; 优先使用已加载的A股列表, 否则只查沪深300成分股"""
+        if self._loaded_date is not None:
+            self.load()
+            position = self._positions.get(code)
+            return self.names[position] if position is not None else default
+        with self._lock:
+            self._load_csi300()
+        return self._csi300_names.get(code, default)
+
+    def info(self, code: str) -> Dict:
+        """单只股票的预计算字段; 不在列表中的代码只按前缀判断"""
+        self.load()
+        position = self._positions.get(code)
+        if position is None:
+            exchange, board = classify(code)
+            return {'code': code, 'name': None, 'symbol': exchange + code, 'exchange': exchange,
+                    'board': board, 'status': 'unknown', 'in_csi300': False}
+        return {
+            'code': code,
+            'name': self.names[position],
+            'symbol': self.symbols[position],
+            'exchange': self.exchanges[position],
+            'board': self.boards[position],
+            'status': self.statuses[position],
+            'in_csi300': bool(self.in_csi300[position]),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """全部字段的表格 (每只股票一行)"""
+        self.load()
+        return pd.DataFrame({
+            'code': self.codes, 'name': self.names, 'symbol': self.symbols, 'exchange': self.exchanges,
+            'board': self.boards, 'status': self.statuses, 'in_csi300': self.in_csi300,
+        })
+
+
+_universe: Optional[UniverseRegistry] = None
+_universe_lock = threading.Lock()
+
+
+def get_universe() -> UniverseRegistry:
+    """进程内共享的股票池 (首次使用时才加载)"""
+    global _universe
+    with _universe_lock:
+        if _universe is None:
+            _universe = UniverseRegistry()
+        return _universe
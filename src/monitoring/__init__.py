@@ -0,0 +1,3 @@
+from .tracing import trace, span, record, current_span
+
+__all__ = ['trace', 'span', 'record', 'current_span']
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+上游请求指标
+
+两个数据获取器的每次HTTP请求尝试都经过传输层的耗时回调, 在这里按主机累计:
+请求次数、重试次数、错误(超时/异常/状态码/校验失败)次数、响应字节数、状态码分布,
+以及延迟直方图和最近请求的 p50/p95/p99。
+
+- render_prometheus(): Prometheus 文本格式 (api_server.py 的 /api/metrics)
+- format_summary(): 按主机汇总的可读文本 (命令行运行结束时输出)
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import MONITORING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上界(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+class HostMetrics:
+    """单个主机的计数器和延迟分布"""
+
+    def __init__(self, reservoir_size: int = 2048):
+        self.attempts = 0
+        self.retries = 0
+        self.successes = 0
+        self.bytes = 0
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个为 +Inf
+        self.latency_sum = 0.0
+        self.recent = deque(maxlen=reservoir_size)  # 最近请求的延迟, 用于分位数
+
+    def observe(self, timing):
+        self.attempts += 1
+        if timing.attempt > 0:
+            self.retries += 1
+        if timing.ok:
+            self.successes += 1
+        else:
+            kind = _error_kind(timing)
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+        status = str(timing.status) if timing.status is not None else 'none'
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes += getattr(timing, 'bytes', 0) or 0
+
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, timing.latency)] += 1
+        self.latency_sum += timing.latency
+        self.recent.append(timing.latency)
+
+    def quantiles(self) -> Dict[float, float]:
+        values = sorted(self.recent)
+        return {q: _quantile(values, q) for q in QUANTILES}
+
+
+def _error_kind(timing) -> str:
+    """失败原因分类: timeout / exception / status / invalid(状态码200但响应校验未通过)"""
+    if timing.error == 'timeout':
+        return 'timeout'
+    if timing.error:
+        return 'exception'
+    if timing.status != 200:
+        return 'status'
+    return 'invalid'
+
+
+class RequestMetrics:
+    """进程级请求指标注册表 (线程安全)"""
+
+    def __init__(self):
+        self._hosts: Dict[str, HostMetrics] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, timing):
+        """传输层耗时回调: 记录一次请求尝试"""
+        with self._lock:
+            host = self._hosts.get(timing.host)
+            if host is None:
+                host = self._hosts[timing.host] = HostMetrics()
+            host.observe(timing)
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """按主机的统计快照"""
+        with self._lock:
+            result = {}
+            for name, host in sorted(self._hosts.items()):
+                quantiles = host.quantiles()
+                result[name] = {
+                    'attempts': host.attempts,
+                    'retries': host.retries,
+                    'successes': host.successes,
+                    'errors': dict(host.errors),
+                    'timeouts': host.errors.get('timeout', 0),
+                    'bytes': host.bytes,
+                    'statuses': dict(host.statuses),
+                    'latency_sum': host.latency_sum,
+                    'p50': quantiles[0.5],
+                    'p95': quantiles[0.95],
+                    'p99': quantiles[0.99],
+                }
+            return result
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式 (0.0.4)"""
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            hosts = sorted(self._hosts.items())
+
+            header('stock_fetch_requests_total', 'counter', 'HTTP request attempts to upstream hosts')
+            for name, host in hosts:
+                lines.append(f'stock_fetch_requests_total{{host="{name}"}} {host.attempts}')
+
+            header('stock_fetch_retries_total', 'counter', 'Request attempts that were retries')
+            for name, host in hosts:
+                lines.append(f'stock_fetch_retries_total{{host="{name}"}} {host.retries}')
+
+            header('stock_fetch_errors_total', 'counter', 'Failed request attempts by kind')
+            for name, host in hosts:
+                for kind, count in sorted(host.errors.items()):
+                    lines.append(f'stock_fetch_errors_total{{host="{name}",kind="{kind}"}} {count}')
+
+            header('stock_fetch_responses_total', 'counter', 'Responses by HTTP status')
+            for name, host in hosts:
+                for status, count in sorted(host.statuses.items()):
+                    lines.append(f'stock_fetch_responses_total{{host="{name}",status="{status}"}} {count}')
+
+            header('stock_fetch_response_bytes_total', 'counter', 'Response body bytes received')
+            for name, host in hosts:
+                lines.append(f'stock_fetch_response_bytes_total{{host="{name}"}} {host.bytes}')
+
+            header('stock_fetch_request_duration_seconds', 'histogram', 'Request attempt latency')
+            for name, host in hosts:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, host.bucket_counts):
+                    cumulative += count
+                    lines.append(f'stock_fetch_request_duration_seconds_bucket{{host="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'stock_fetch_request_duration_seconds_bucket{{host="{name}",le="+Inf"}} {host.attempts}')
+                lines.append(f'stock_fetch_request_duration_seconds_sum{{host="{name}"}} {host.latency_sum:.6f}')
+                lines.append(f'stock_fetch_request_duration_seconds_count{{host="{name}"}} {host.attempts}')
+
+            # 分位数只按最近的请求 (recent, 最多 reservoir_size 个) 计算;
+            # _sum/_count 必须单调递增 (rate() 依赖), 与直方图一样使用累计值
+            header('stock_fetch_request_latency_seconds', 'summary',
+                   'Latency quantiles over the most recent attempts; _sum/_count are cumulative')
+            for name, host in hosts:
+                for q, value in host.quantiles().items():
+                    lines.append(f'stock_fetch_request_latency_seconds{{host="{name}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'stock_fetch_request_latency_seconds_sum{{host="{name}"}} {host.latency_sum:.6f}')
+                lines.append(f'stock_fetch_request_latency_seconds_count{{host="{name}"}} {host.attempts}')
+
+        lines.extend(_component_metrics())
+        return '\n'.join(lines) + '\n'
+
+    def format_summary(self) -> str:
+        """按主机汇总的可读文本"""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "本次运行没有上游请求"
+
+        lines = [f"{'主机':<24}{'请求':>8}{'重试':>8}{'失败':>8}{'超时':>8}{'流量':>12}"
+                 f"{'p50':>10}{'p95':>10}{'p99':>10}"]
+        for name, stats in snapshot.items():
+            failures = sum(stats['errors'].values())
+            lines.append(
+                f"{name:<24}{stats['attempts']:>8}{stats['retries']:>8}{failures:>8}{stats['timeouts']:>8}"
+                f"{stats['bytes'] / 1024:>10.1f}KB"
+                f"{stats['p50'] * 1000:>8.0f}ms{stats['p95'] * 1000:>8.0f}ms{stats['p99'] * 1000:>8.0f}ms"
+            )
+        return '\n'.join(lines)
+
+
+def _component_metrics() -> List[str]:
+    """限流器、自适应并发窗口和历史K线缓存的状态 (按需导入, 避免循环依赖)"""
+    lines = []
+    try:
+        from src.data.rate_limiter import rate_limiter_stats
+
+        stats = rate_limiter_stats()
+        if stats:
+            lines.append("# HELP stock_rate_limiter_wait_seconds_total Time spent waiting for rate limiter tokens")
+            lines.append("# TYPE stock_rate_limiter_wait_seconds_total counter")
+            for host, bucket in sorted(stats.items()):
+                lines.append(f'stock_rate_limiter_wait_seconds_total{{host="{host}"}} {bucket["waited_seconds"]}')
+    except Exception as e:
+        logger.debug(f"读取限流器状态失败: {e}")
+
+    try:
+        from src.data.adaptive_limiter import adaptive_limiter_stats
+
+        stats = adaptive_limiter_stats()
+        for key, name, kind, help_text in (
+            ('limit', 'stock_concurrency_limit', 'gauge', 'Current adaptive concurrency window'),
+            ('in_flight', 'stock_concurrency_in_flight', 'gauge', 'Requests holding a concurrency slot'),
+            ('cuts', 'stock_concurrency_cuts_total', 'counter', 'Times the adaptive window was reduced'),
+        ) if stats else ():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for limiter_name, state in sorted(stats.items()):
+                lines.append(f'{name}{{limiter="{limiter_name}"}} {state[key]}')
+    except Exception as e:
+        logger.debug(f"读取并发窗口状态失败: {e}")
+
+    try:
+        from src.data.history_cache import get_history_cache
+
+        stats = get_history_cache().stats()
+        for key, kind, help_text in (
+            ('hits', 'counter', 'History cache hits'),
+            ('misses', 'counter', 'History cache misses'),
+            ('evictions', 'counter', 'History cache evictions'),
+            ('entries', 'gauge', 'History cache entries'),
+            ('bytes', 'gauge', 'History cache memory usage in bytes'),
+        ):
+            name = f"stock_history_cache_{key}{'_total' if kind == 'counter' else ''}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {stats[key]}")
+    except Exception as e:
+        logger.debug(f"读取历史缓存状态失败: {e}")
+    return lines
+
+
+_registry = RequestMetrics()
+
+
+def get_request_metrics() -> RequestMetrics:
+    """进程内共享的请求指标"""
+    return _registry
+
+
+def observe_request(timing):
+    """传输层默认注册的耗时回调"""
+    _registry.observe(timing)
+
+
+def dump_request_metrics(metrics_dir: str = None) -> Optional[str]:
+    """
+    命令行运行结束时调用: 输出按主机的汇总日志, 并把 Prometheus 文本写入文件
+
+    Returns:
+        写入的文件路径 (没有请求时为None)
+    """
+    if not _registry.snapshot():
+        return None
+
+    logger.info(f"上游请求统计:\n{_registry.format_summary()}")
+
+    metrics_dir = metrics_dir or MONITORING_CONFIG.get('metrics_dir', './logs/metrics')
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = os.path.join(metrics_dir, f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prom")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_registry.render_prometheus())
+        return path
+    except Exception as e:
+        logger.warning(f"保存请求指标失败: {e}")
+        return None
@@ -0,0 +1,308 @@
+"""
+阶段耗时追踪
+
+嵌套的计时区间(span), 用于定位盘后分析中哪个阶段变慢:
+
+    with trace('run_daily_analysis') as t:
+        with span('universe') as s:
+            stocks = load()
+            s.set(count=len(stocks))
+
+并发执行的细粒度操作 (每个行情批次、每只股票的K线请求) 不单独建span,
+而是用 record() 累加到当前span下的同名汇总节点: 次数、累计耗时以及计数/字节数。
+没有进行中的trace时 span()/record() 几乎没有开销。
+
+每次trace结束后写入一个JSON文件 (MONITORING_CONFIG['trace_dir']),
+可用 python -m src.monitoring.tracing [trace文件] 查看火焰图式的耗时汇总。
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import logging
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 添加config路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.config import MONITORING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+_lock = threading.Lock()
+
+
+class Span:
+    """一个计时区间"""
+
+    __slots__ = ('name', 'start', 'duration', 'attrs', 'children', 'calls', 'aggregate')
+
+    def __init__(self, name: str, start: float = 0.0, aggregate: bool = False, **attrs):
+        self.name = name
+        self.start = start  # 相对trace开始的秒数
+        self.duration = 0.0
+        self.attrs: Dict = dict(attrs)
+        self.children: List['Span'] = []
+        self.calls = 0
+        self.aggregate = aggregate  # 汇总节点: duration为各次调用耗时之和, 可能超过父节点的墙钟时间
+
+    def set(self, **attrs):
+        """设置属性 (如 count、bytes)"""
+        self.attrs.update(attrs)
+
+    def add(self, **counters):
+        """累加计数属性 (线程安全)"""
+        with _lock:
+            for key, value in counters.items():
+                self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def child(self, name: str) -> Optional['Span']:
+        for child in self.children:
+            if child.name == name:
+                return child
+        return None
+
+    def to_dict(self) -> Dict:
+        data = {
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration': round(self.duration, 6),
+        }
+        if self.aggregate:
+            data['aggregate'] = True
+            data['calls'] = self.calls
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.children:
+            data['children'] = [child.to_dict() for child in self.children]
+        return data
+
+
+class _NullSpan:
+    """没有进行中的trace时使用, 所有操作为空"""
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, **counters):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """一次完整运行的trace"""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.started_at = datetime.now()
+        self.origin = time.perf_counter()
+        self.root = Span(name, **attrs)
+        self.path: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace': self.name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'root': self.root.to_dict(),
+        }
+
+    def save(self, trace_dir: str, keep: int = 50) -> str:
+        """写入JSON文件, 只保留最近 keep 个"""
+        os.makedirs(trace_dir, exist_ok=True)
+        filename = f"trace_{self.name}_{self.started_at.strftime('%Y%m%d_%H%M%S')}.json"
+        self.path = os.path.join(trace_dir, filename)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+
+        old_files = sorted(glob.glob(os.path.join(trace_dir, 'trace_*.json')), key=os.path.getmtime)
+        for old in old_files[:-keep] if keep else []:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        return self.path
+
+
+_active_trace: Optional[Trace] = None
+
+
+def current_span():
+    """当前span (没有进行中的trace时返回空实现)"""
+    return _current_span.get() or _NULL_SPAN
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """在当前span下创建子span; 没有进行中的trace时不计时"""
+    parent = _current_span.get()
+    if parent is None or _active_trace is None:
+        yield _NULL_SPAN
+        return
+
+    t0 = time.perf_counter()
+    child = Span(name, start=t0 - _active_trace.origin, **attrs)
+    with _lock:
+        parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.duration = time.perf_counter() - t0
+        child.calls = 1
+        _current_span.reset(token)
+
+
+def record(name: str, seconds: float = 0.0, **counters):
+    """
+    把一次操作累加到当前span下的汇总节点
+
+    Args:
+        name: 汇总节点名称, 同名操作合并
+        seconds: 本次耗时
+        counters: 要累加的计数 (如 count=1, bytes=len(text))
+    """
+    parent = _current_span.get()
+    if parent is None or _active_trace is None:
+        return
+
+    with _lock:
+        node = parent.child(name)
+        if node is None:
+            node = Span(name, start=time.perf_counter() - _active_trace.origin - seconds, aggregate=True)
+            parent.children.append(node)
+        node.duration += seconds
+        node.calls += 1
+        for key, value in counters.items():
+            node.attrs[key] = node.attrs.get(key, 0) + value
+
+
+@contextmanager
+def trace(name: str, trace_dir: str = None, enabled: bool = None, **attrs):
+    """
+    开始一次trace, 结束时写入JSON文件并记录耗时汇总日志
+
+    Args:
+        name: trace名称 (也是根span名称)
+        trace_dir: 输出目录 (默认 MONITORING_CONFIG['trace_dir'])
+        enabled: 是否启用 (默认 MONITORING_CONFIG['trace_enabled'])
+
+    Yields:
+        Trace对象 (未启用或嵌套在其他trace中时为None)
+    """
+    global _active_trace
+    if enabled is None:
+        enabled = MONITORING_CONFIG.get('trace_enabled', True)
+    # 未启用时不计时; 已有进行中的trace时作为普通子span
+    if not enabled or _active_trace is not None:
+        with span(name, **attrs):
+            yield None
+        return
+
+    current = Trace(name, **attrs)
+    _active_trace = current
+    token = _current_span.set(current.root)
+    try:
+        yield current
+    finally:
+        current.root.duration = time.perf_counter() - current.origin
+        current.root.calls = 1
+        _current_span.reset(token)
+        _active_trace = None
+
+        try:
+            path = current.save(trace_dir or MONITORING_CONFIG.get('trace_dir', './logs/traces'),
+                                MONITORING_CONFIG.get('trace_keep', 50))
+            logger.info(f"阶段耗时 ({path}):\n{format_flame(current.to_dict())}")
+        except Exception as e:
+            logger.warning(f"保存trace失败: {e}")
+
+
+def _format_attrs(attrs: Dict) -> str:
+    parts = []
+    for key, value in attrs.items():
+        if key == 'bytes' or key.endswith('_bytes'):
+            value = f"{value / 1024:.1f}KB" if value < 1024 * 1024 else f"{value / 1024 / 1024:.1f}MB"
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        parts.append(f"{key}={value}")
+    return ' '.join(parts)
+
+
+def format_flame(trace_data: Dict, width: int = 30) -> str:
+    """
+    火焰图式的文本汇总: 每行一个span, 缩进表示层级, 条形长度为占根span耗时的比例。
+    汇总节点(Σ)的耗时是并发操作的累计时间, 可能超过父节点。
+    """
+    root = trace_data['root']
+    total = root['duration'] or 1e-9
+    lines = []
+
+    def walk(node: Dict, depth: int):
+        share = node['duration'] / total
+        bar = '█' * max(1, round(min(share, 1.0) * width)) if share > 0 else ''
+        label = ('  ' * depth + ('Σ ' if node.get('aggregate') else '') + node['name'])
+        calls = f" ×{node['calls']}" if node.get('aggregate') else ''
+        attrs = _format_attrs(node.get('attrs', {}))
+        lines.append(f"{label:<32} {node['duration'] * 1000:>10.1f}ms {share:>6.1%} {bar:<{width}}{calls} {attrs}".rstrip())
+        for child in node.get('children', []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return '\n'.join(lines)
+
+
+def load_trace(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def latest_trace_file(trace_dir: str = None) -> Optional[str]:
+    files = glob.glob(os.path.join(trace_dir or MONITORING_CONFIG.get('trace_dir', './logs/traces'), 'trace_*.json'))
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查看阶段耗时trace')
+    parser.add_argument('path', nargs='?', help='trace文件 (默认最新一个)')
+    parser.add_argument('--compare', help='与另一个trace文件对比各阶段耗时')
+    args = parser.parse_args()
+
+    path = args.path or latest_trace_file()
+    if not path:
+        print("没有找到trace文件")
+        sys.exit(1)
+
+    data = load_trace(path)
+    print(f"{path}  ({data.get('started_at', '')})")
+    print(format_flame(data))
+
+    if args.compare:
+        other = load_trace(args.compare)
+        before = _flatten(other['root'])
+        print(f"\n对比 {args.compare}:")
+        for key, duration in _flatten(data['root']).items():
+            if key in before and before[key] > 0:
+                print(f"{key:<48} {before[key] * 1000:>10.1f}ms -> {duration * 1000:>10.1f}ms "
+                      f"({duration / before[key] - 1:+.0%})")
+
+
+def _flatten(node: Dict, prefix: str = '') -> Dict[str, float]:
+    key = f"{prefix}/{node['name']}" if prefix else node['name']
+    result = {key: node['duration']}
+    for child in node.get('children', []):
+        result.update(_flatten(child, key))
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,8 @@ import json
 
 from src.analysis.market_analyzer import MarketAnalyzer
 from src.notification.email_sender import EmailSender
+from src.data.trading_calendar import get_trading_calendar
+from src.data.market_clock import market_now
 from config.config import SCHEDULE_CONFIG
 
 logger = logging.getLogger(__name__)
@@ -21,17 +23,8 @@ class TaskScheduler:
         self.task_history = []
 
     def is_trading_day(self) -> bool:
-        """判断是否为交易日"""
-        today = datetime.now()
-        weekday = today.weekday()
-
-        # 排除周末
-        if weekday >= 5:  # 5=Saturday, 6=Sunday
-            return False
-
-        # 这里可以进一步添加节假日判断
-        # 简化处理，仅排除周末
-        return True
+        """判断是否为交易日 (排除周末和交易所休市日, 见 data/trading_holidays.json)"""
+        return get_trading_calendar().is_trading_day(market_now())
 
     def run_daily_analysis(self):
         """执行每日分析任务"""
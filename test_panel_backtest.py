@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+面板回测测试脚本
+用合成日线 (停牌、节假日、1-3天持有期) 验证面板引擎与逐日逐只引擎的回测结果和因子记录完全一致
+
+日线由替身下载函数生成 (HistoryStore 的 downloader 参数), 不访问网络, 不读写本地缓存
+运行: python test_panel_backtest.py (或 python -m pytest test_panel_backtest.py)
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from run_backtest_optimized import OptimizedBacktest
+from src.data.factor_store import FactorStore
+from src.data.history_store import HistoryStore
+from src.data.trading_calendar import get_trading_calendar
+
+CODES = [f'{600000 + i:06d}' for i in range(40)] + [f'{1 + i:06d}' for i in range(40)]
+LONG_SUSPENSION = ('600005', '2024-03-01', '2024-05-01')
+
+# (开始, 结束, 持有天数): 覆盖春节、国庆长假以及长期停牌区间
+WINDOWS = [
+    ('2024-01-02', '2024-03-29', 1),
+    ('2024-09-16', '2024-10-31', 2),
+    ('2024-05-06', '2024-06-28', 3),
+]
+MIN_STRENGTH_SCORE = 20  # 合成数据的评分偏低, 放宽门槛保证每个区间都有交易
+
+
+def _synthetic_history(code: str) -> pd.DataFrame:
+    """
+    按交易日历生成一只股票的前复权日线 (同一代码每次相同):
+    约3%的交易日随机停牌, 600005 另有两个月的长期停牌, 约2%的交易日涨跌幅为0
+    """
+    days = pd.DatetimeIndex(get_trading_calendar().trading_days('2023-06-01', '2025-12-31'))
+    rng = np.random.default_rng(int(code))
+    n = len(days)
+    returns = rng.normal(0.001, 0.025, n)
+    close = 10 * np.exp(np.cumsum(returns))
+    frame = pd.DataFrame({
+        '日期': days.strftime('%Y-%m-%d'),
+        '收盘': close.round(2),
+        '涨跌幅': (returns * 100).round(2),
+        '换手率': rng.uniform(0.05, 6, n).round(2),
+        '成交量': rng.integers(10 ** 4, 10 ** 6, n),
+        '成交额': rng.uniform(1e6, 1e8, n),
+    })
+    frame.loc[rng.random(n) < 0.02, '涨跌幅'] = 0.0
+    keep = rng.random(n) > 0.03
+    if code == LONG_SUSPENSION[0]:
+        keep &= ~((days >= LONG_SUSPENSION[1]) & (days <= LONG_SUSPENSION[2]))
+    return frame[keep].reset_index(drop=True)
+
+
+HISTORIES = {code: _synthetic_history(code) for code in CODES}
+PE_RATIOS = {code: float(pe) for code, pe in zip(CODES, np.random.default_rng(1).uniform(-5, 40, len(CODES)))}
+PE_RATIOS[CODES[3]] = None
+
+
+class FakeDownloader:
+    """替身下载函数: 按区间截取合成日线, 记录下载次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, stock_code: str, start: np.datetime64, end: np.datetime64) -> pd.DataFrame:
+        self.calls += 1
+        frame = HISTORIES[stock_code]
+        dates = pd.to_datetime(frame['日期'])
+        return frame[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))].copy()
+
+
+def _run(engine: str, start: str, end: str, hold_days: int, factor_dir: str):
+    """用合成数据跑一次多日回测, 返回 (结果, 因子记录, 下载次数)"""
+    downloader = FakeDownloader()
+    backtest = OptimizedBacktest(use_cache=False)
+    backtest.history_store = HistoryStore(persist=False, downloader=downloader, pause_seconds=0)
+    backtest.factor_store = FactorStore(store_dir=factor_dir)
+    backtest.get_csi300_stocks = lambda: list(CODES)
+    backtest.get_stock_name = lambda code: f'股票{code}'
+    backtest.fetch_pe_ratios_batch = lambda codes: {c: PE_RATIOS[c] for c in codes if PE_RATIOS[c]}
+    backtest.stock_filter.config = dict(backtest.stock_filter.config, min_strength_score=MIN_STRENGTH_SCORE)
+    results = backtest.backtest_multi_days(start, end, hold_days, engine)
+    return results, backtest._factor_records, downloader.calls
+
+
+def _plain(value):
+    """numpy标量转为Python值 (逐只引擎保留numpy类型, 面板引擎为Python类型, 按值比较)"""
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def _dump(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=_plain)
+
+
+def test_panel_matches_loop():
+    """面板引擎与逐日逐只引擎的结果一致"""
+    print("=" * 60)
+    print("测试 1: 面板引擎与逐日逐只引擎")
+    print("=" * 60)
+
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix='panel_parity_')
+    try:
+        # 回测对象会在当前目录创建 ./cache, 放到临时目录中
+        os.chdir(work_dir)
+        factor_dir = os.path.join(work_dir, 'factors')
+        total_trades = 0
+        for start, end, hold_days in WINDOWS:
+            loop_results, loop_factors, loop_calls = _run('loop', start, end, hold_days, factor_dir)
+            panel_results, panel_factors, panel_calls = _run('panel', start, end, hold_days, factor_dir)
+
+            trades = sum(len(result['performance']) for result in loop_results)
+            print(f"{start} ~ {end} 持有{hold_days}天: {len(loop_results)} 个有效交易日, {trades} 笔交易, "
+                  f"下载 {loop_calls}/{panel_calls} 次")
+            assert trades > 0, "区间内没有交易, 无法比较"
+            assert _dump(panel_results) == _dump(loop_results), f"{start} ~ {end} 回测结果不一致"
+            assert _dump(panel_factors) == _dump(loop_factors), f"{start} ~ {end} 因子记录不一致"
+            assert loop_calls == panel_calls == len(CODES), "每只股票应只下载一次"
+            total_trades += trades
+        print(f"✅ {len(WINDOWS)} 个区间共 {total_trades} 笔交易结果一致\n")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    logging.disable(logging.CRITICAL)
+    print("\n" + "=" * 60)
+    print("           面板回测测试")
+    print("=" * 60 + "\n")
+
+    tests = [("面板/逐只一致", test_panel_matches_loop)]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except Exception as e:
+            print(f"❌ {name}失败: {e}\n")
+            results.append((name, False))
+
+    print("=" * 60)
+    print("           测试结果汇总")
+    print("=" * 60)
+
+    passed = sum(1 for _, result in results if result)
+    failed = len(results) - passed
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{name:15s} {status}")
+
+    print("=" * 60)
+    print(f"总计: {len(results)}个测试, {passed}个通过, {failed}个失败")
+    print("=" * 60)
+    return failed == 0
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+录制/回放测试脚本
+在已有本地缓存的目录中录制, 再在空目录中回放, 验证回放结果与录制一致且不依赖、不改动工作目录中的缓存
+
+运行: python test_replay.py (或 python -m pytest test_replay.py)
+"""
+
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.stub_server import start_stub_server, host_map, synthetic_codes
+from config.config import DATA_CONFIG
+from src.data import replay, trading_calendar
+from src.data.async_data_fetcher import AsyncStockDataFetcher
+from src.data.history_cache import HistoryCache
+from src.data.http_transport import AsyncHttpTransport
+
+CODES = synthetic_codes(6)
+DAYS = 30
+DIRTY_OVERVIEW = {'total_stocks': -1, 'source': '工作目录中的旧缓存'}
+
+
+def _without_time(overview: dict) -> dict:
+    """市场概况中除生成时间以外的字段 (取不到行情时的兜底数据以当前时间为 update_time)"""
+    return {key: value for key, value in overview.items() if key != 'update_time'}
+
+
+async def _collect(fetcher: AsyncStockDataFetcher):
+    """历史K线 + 批量行情 + 市场概况"""
+    async with fetcher.transport.create_session() as session:
+        histories = [await fetcher.get_stock_historical_data(session, code, DAYS) for code in CODES]
+        quotes = await fetcher.get_stocks_realtime_data_batch(session, CODES)
+    overview = await fetcher.get_market_overview_async()
+    return histories, quotes, overview
+
+
+def _make_dirty_tree(base_url: str):
+    """当前目录下生成本地缓存: K线存储的真实数据, 以及当天的A股列表和不会过期的旧市场概况"""
+    fetcher = AsyncStockDataFetcher(history_cache=HistoryCache(),
+                                    transport=AsyncHttpTransport(host_map=host_map(base_url)))
+
+    async def warm():
+        async with fetcher.transport.create_session() as session:
+            for code in CODES:
+                await fetcher.get_stock_historical_data(session, code, DAYS)
+
+    asyncio.run(warm())
+    with open('./data_cache/a_share_list.json', 'w', encoding='utf-8') as f:
+        json.dump({'update_date': datetime.now().strftime('%Y-%m-%d'),
+                   'stocks': [{'code': code, 'name': f'缓存{code}'} for code in CODES]}, f, ensure_ascii=False)
+    os.makedirs('./cache', exist_ok=True)
+    with open('./cache/market_overview.json', 'w', encoding='utf-8') as f:
+        json.dump({'expires_at': (datetime.now() + timedelta(days=365)).isoformat(), 'data': DIRTY_OVERVIEW}, f)
+
+
+def _snapshot_tree(path: str):
+    """目录下所有文件的 (相对路径, 修改时间, 大小)"""
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files.append((os.path.relpath(os.path.join(root, name), path), stat.st_mtime_ns, stat.st_size))
+    return sorted(files)
+
+
+def test_record_dirty_replay_clean():
+    """在有缓存的目录录制, 在空目录回放"""
+    print("=" * 60)
+    print("测试 1: 有缓存的目录录制, 空目录回放")
+    print("=" * 60)
+
+    server, base_url = start_stub_server()
+    cwd = os.getcwd()
+    dirty_dir = tempfile.mkdtemp(prefix='replay_dirty_')
+    clean_dir = tempfile.mkdtemp(prefix='replay_clean_')
+    archive = os.path.join(dirty_dir, 'fixture.jsonl.gz')
+    original_config = dict(DATA_CONFIG)
+    original_calendar = trading_calendar.CALENDAR_FILE
+    try:
+        os.chdir(dirty_dir)
+        _make_dirty_tree(base_url)
+        dirty_files = _snapshot_tree(dirty_dir)
+        assert any(name.startswith('data_cache') for name, _, _ in dirty_files), "K线存储未生成"
+
+        session = replay.activate_fixtures('record', archive)
+        record_root = session.state_dir
+        assert DATA_CONFIG['kline_store_dir'].startswith(record_root)
+        assert DATA_CONFIG['universe_cache_file'].startswith(record_root)
+        assert DATA_CONFIG['factor_store_dir'].startswith(record_root)
+        recorded = asyncio.run(_collect(AsyncStockDataFetcher(
+            history_cache=HistoryCache(), transport=session.async_transport(host_map=host_map(base_url)))))
+        replay.deactivate_fixtures()
+        server.shutdown()
+
+        assert not os.path.exists(record_root), "录制用的临时目录未删除"
+        assert DATA_CONFIG == original_config, "停用后配置未恢复"
+        assert trading_calendar.CALENDAR_FILE == original_calendar
+        assert [f for f in _snapshot_tree(dirty_dir) if f[0] != 'fixture.jsonl.gz'] == dirty_files, \
+            "录制改动了工作目录中的缓存"
+        assert recorded[2] != DIRTY_OVERVIEW, "录制读取了工作目录中的市场概况缓存"
+        assert all(len(history) == DAYS for history in recorded[0])
+        assert len(recorded[1]) == len(CODES)
+        print(f"录制: {len(recorded[0])} 只股票的K线, {len(recorded[1])} 条行情, 市场概况 {recorded[2].get('total_stocks')} 只")
+
+        # 替身服务器已关闭, 回放只能使用归档
+        os.chdir(clean_dir)
+        session = replay.activate_fixtures('replay', archive)
+        replay_root = session.state_dir
+        assert trading_calendar.CALENDAR_FILE.startswith(replay_root), "回放未使用录制的交易日历"
+        replayed = asyncio.run(_collect(AsyncStockDataFetcher(history_cache=HistoryCache())))
+        replay.deactivate_fixtures()
+
+        assert not os.path.exists(replay_root), "回放用的临时目录未删除"
+        assert os.listdir(clean_dir) == [], f"回放在工作目录中写入了文件: {os.listdir(clean_dir)}"
+        for expected, actual in zip(recorded[0], replayed[0]):
+            assert expected.equals(actual), "回放的K线与录制不一致"
+        assert replayed[1] == recorded[1], "回放的行情与录制不一致"
+        assert _without_time(replayed[2]) == _without_time(recorded[2]), "回放的市场概况与录制不一致"
+        print("✅ 回放结果与录制一致, 工作目录未被读写\n")
+    finally:
+        os.chdir(cwd)
+        replay.deactivate_fixtures()
+        server.shutdown()
+        shutil.rmtree(dirty_dir, ignore_errors=True)
+        shutil.rmtree(clean_dir, ignore_errors=True)
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("           录制/回放测试")
+    print("=" * 60 + "\n")
+
+    tests = [("有缓存录制/空目录回放", test_record_dirty_replay_clean)]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except Exception as e:
+            print(f"❌ {name}失败: {e}\n")
+            results.append((name, False))
+
+    print("=" * 60)
+    print("           测试结果汇总")
+    print("=" * 60)
+
+    passed = sum(1 for _, result in results if result)
+    failed = len(results) - passed
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{name:15s} {status}")
+
+    print("=" * 60)
+    print(f"总计: {len(results)}个测试, {passed}个通过, {failed}个失败")
+    print("=" * 60)
+    return failed == 0
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
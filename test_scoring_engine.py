@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+列式评分引擎测试脚本
+验证 scoring_engine 的评分和筛选结果与 StockFilter 逐只流程完全一致,
+覆盖 None、NaN、键不存在、PR分界点附近的取整等边界情况
+
+运行: python test_scoring_engine.py (或 python -m pytest test_scoring_engine.py)
+"""
+
+import os
+import sys
+import copy
+import random
+import logging
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from config.config import STOCK_FILTER_CONFIG
+from config.backtest_config import BACKTEST_FILTER_CONFIG
+from src.analysis.stock_filter import StockFilter
+from src.analysis.scoring_engine import ScoreColumns, score_columns, BREAKDOWN_KEYS
+
+SEEDS = range(20)
+STOCKS_PER_SEED = 1000
+CONFIGS = [
+    ('选股配置', STOCK_FILTER_CONFIG),
+    ('回测配置', BACKTEST_FILTER_CONFIG),
+    ('宽松配置', dict(STOCK_FILTER_CONFIG, min_strength_score=20, max_stocks=500)),
+]
+
+# 各评分子项的分界点及附近的值, 加上缺失值
+EDGE_VALUES = [None, float('nan'), 0, -1, -2, -9.8, 0.1, 0.5, 0.8, 1, 1.2, 1.5, 2, 2.5, 3, 4, 5, 7, 8,
+               9.99, 10, 15, 20, 30]
+FIELDS = ['change_pct', 'momentum_20d', 'turnover_rate', 'pe_ratio', 'pb_ratio', 'roe',
+          'profit_growth', 'dividend_yield', 'price']
+
+
+def _value(rng: random.Random):
+    x = rng.random()
+    if x < 0.35:
+        return rng.choice(EDGE_VALUES)
+    return round(rng.uniform(-12, 60), rng.choice([0, 1, 2, 3]))
+
+
+def make_stocks(seed: int, count: int):
+    """随机股票数据: 约3%的字段不存在, 约5%的股票 PE/ROE 使 PR 恰好落在分界点附近"""
+    rng = random.Random(seed)
+    stocks = []
+    for i in range(count):
+        stock = {'code': f'{i:06d}', 'name': f'股票{i}'}
+        for field in FIELDS:
+            if rng.random() < 0.03:
+                continue
+            stock[field] = _value(rng)
+        if rng.random() < 0.05:
+            roe = rng.choice([5, 7.3, 8, 12.5, 15])
+            stock['roe'] = roe
+            stock['pe_ratio'] = round(roe * 100 * rng.choice([0.0005, 0.7995, 0.8, 0.8005, 1.0, 1.2]), 4)
+        stocks.append(stock)
+    return stocks
+
+
+def _columnar_scores(stocks):
+    scores = score_columns(ScoreColumns.from_records(stocks))
+    return [
+        {'total': int(scores['total'][i]),
+         'breakdown': {key: int(scores[key][i]) for key in BREAKDOWN_KEYS},
+         'grade': str(scores['grade'][i])}
+        for i in range(len(stocks))
+    ]
+
+
+def _assert_same_scores(stocks):
+    reference = StockFilter()
+    for stock, actual in zip(stocks, _columnar_scores(stocks)):
+        expected = reference.calculate_strength_score(stock)
+        assert actual == expected, f"评分不一致: {stock}\n逐只: {expected}\n列式: {actual}"
+
+
+def test_edge_cases():
+    """逐个构造的边界情况"""
+    print("=" * 60)
+    print("测试 1: 边界情况评分")
+    print("=" * 60)
+
+    base = {'code': '600000', 'change_pct': 3.0, 'momentum_20d': 12.0, 'turnover_rate': 2.0,
+            'pe_ratio': 10.0, 'pb_ratio': 1.2, 'roe': 12.5, 'profit_growth': 15.0,
+            'dividend_yield': 3.0, 'price': 10.0}
+    cases = [base]
+    for field in FIELDS:
+        cases.append(dict(base, **{field: None}))
+        cases.append(dict(base, **{field: float('nan')}))
+        cases.append({key: value for key, value in base.items() if key != field})
+    # PR = PE / (100 * ROE) 经 round(pr, 3) 后恰好落在 0.8 / 1.0 / 1.2 上下
+    for roe in (5, 7.3, 12.5):
+        for pr in (0.7995, 0.7994, 0.8005, 0.9995, 1.0005, 1.1995, 1.2005):
+            cases.append(dict(base, roe=roe, pe_ratio=pr * 100 * roe))
+    cases.append(dict(base, pe_ratio=-5.0))
+    cases.append(dict(base, roe=-3.0))
+
+    _assert_same_scores(cases)
+    print(f"✅ {len(cases)} 个边界情况评分一致\n")
+
+
+def test_random_scores():
+    """随机数据评分"""
+    print("=" * 60)
+    print("测试 2: 随机数据评分")
+    print("=" * 60)
+
+    for seed in SEEDS:
+        _assert_same_scores(make_stocks(seed, STOCKS_PER_SEED))
+    print(f"✅ {len(SEEDS)} 组 × {STOCKS_PER_SEED} 只股票评分一致\n")
+
+
+def test_select_top_stocks():
+    """列式筛选与逐只筛选: 结果、排名顺序以及写入股票字典的字段都一致"""
+    print("=" * 60)
+    print("测试 3: 筛选结果")
+    print("=" * 60)
+
+    for name, config in CONFIGS:
+        selected = 0
+        for seed in SEEDS:
+            stocks = make_stocks(seed, STOCKS_PER_SEED)
+            per_stock_input, columnar_input = copy.deepcopy(stocks), copy.deepcopy(stocks)
+            stock_filter = StockFilter(dict(config))
+            expected = stock_filter._select_top_stocks_per_stock(per_stock_input)
+            actual = stock_filter._select_top_stocks_columnar(columnar_input, ScoreColumns.from_records(columnar_input))
+            assert repr(actual) == repr(expected), f"{name} 第{seed}组筛选结果不一致"
+            assert repr(columnar_input) == repr(per_stock_input), f"{name} 第{seed}组写入的评分字段不一致"
+            selected += len(actual)
+        print(f"{name}: 筛选结果一致 (共选出 {selected} 只)")
+    print("✅ 筛选结果一致\n")
+
+
+def test_non_numeric_fallback():
+    """存在非数值字段时改用逐只流程, 结果不变"""
+    print("=" * 60)
+    print("测试 4: 非数值字段")
+    print("=" * 60)
+
+    stocks = make_stocks(99, 50)
+    stocks[3]['pe_ratio'] = '12'
+    assert ScoreColumns.from_records(stocks) is None
+    stock_filter = StockFilter()
+    expected = stock_filter._select_top_stocks_per_stock(copy.deepcopy(stocks))
+    actual = stock_filter.select_top_stocks(copy.deepcopy(stocks))
+    assert [s['code'] for s in actual] == [s['code'] for s in expected]
+    print("✅ 非数值字段按逐只流程筛选\n")
+
+
+def main():
+    """主测试函数"""
+    logging.disable(logging.CRITICAL)
+    print("\n" + "=" * 60)
+    print("           列式评分引擎测试")
+    print("=" * 60 + "\n")
+
+    tests = [
+        ("边界情况评分", test_edge_cases),
+        ("随机数据评分", test_random_scores),
+        ("筛选结果", test_select_top_stocks),
+        ("非数值字段", test_non_numeric_fallback),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except Exception as e:
+            print(f"❌ {name}失败: {e}\n")
+            results.append((name, False))
+
+    print("=" * 60)
+    print("           测试结果汇总")
+    print("=" * 60)
+
+    passed = sum(1 for _, result in results if result)
+    failed = len(results) - passed
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{name:15s} {status}")
+
+    print("=" * 60)
+    print(f"总计: {len(results)}个测试, {passed}个通过, {failed}个失败")
+    print("=" * 60)
+    return failed == 0
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)